@@ -0,0 +1,170 @@
+"""
+HTTP API for the Tamil AI assistant.
+
+    python api.py --port 8000 --workers 4
+    uvicorn api:app --port 8000 --workers 4
+
+Serves the same pipeline as the Streamlit page over JSON and server-sent
+events, so several worker processes can answer questions behind a load
+balancer while the page (with API_URL set) only renders them. Workers
+keep no per-user state: a request carries its conversation history, and
+the caches and quotas are shared through their SQLite files. Keys come
+from GEMINI_API_KEY, GOOGLE_API_KEY and GOOGLE_CX in the environment.
+
+    POST /answer          {"query": ..., "bypass_cache": false, "conversation": {...}}
+                          -> {"response", "source_used", "wiki_url"}
+    POST /answer/stream   same body; events "meta" ({"source_used", "wiki_url"}),
+                          then "chunk" ({"text"}) as Gemini streams, then "done"
+    GET  /health          {"status", "missing_keys"}
+    GET  /stats           retrieval cache counters and per-stage latency
+"""
+import argparse
+import json
+import logging
+from contextlib import asynccontextmanager
+
+from starlette.applications import Starlette
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+import config
+import pipeline
+import warmer
+from conversation import Conversation
+
+logger = logging.getLogger("api")
+
+# Longest question accepted, in characters
+MAX_QUERY_CHARS = 1000
+
+
+class BadRequest(Exception):
+    """The request body is not a valid question"""
+
+
+def parse_request(body):
+    """(query, bypass_cache, conversation) from a decoded request body"""
+    if not isinstance(body, dict):
+        raise BadRequest("body must be a JSON object")
+    query = body.get('query')
+    if not isinstance(query, str) or not query.strip():
+        raise BadRequest("query is required")
+    if len(query) > MAX_QUERY_CHARS:
+        raise BadRequest(f"query is longer than {MAX_QUERY_CHARS} characters")
+    conversation = None
+    if body.get('conversation'):
+        conversation = Conversation.from_dict(
+            body['conversation'], config.CONVERSATION_TURNS, config.CONVERSATION_SUMMARY_CHARS
+        )
+    return query.strip(), bool(body.get('bypass_cache')), conversation
+
+
+async def read_request(request):
+    try:
+        body = await request.json()
+    except ValueError:
+        raise BadRequest("body is not valid JSON")
+    try:
+        return parse_request(body)
+    except (AttributeError, TypeError, ValueError):
+        raise BadRequest("conversation is malformed")
+
+
+def sse_event(event, data):
+    """One server-sent event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def sse_stream(query, chunks, source_used, wiki_url):
+    """Events for an answer; runs in Starlette's thread pool as Gemini streams"""
+    try:
+        yield sse_event('meta', {'source_used': source_used, 'wiki_url': wiki_url})
+        for chunk in chunks:
+            yield sse_event('chunk', {'text': chunk})
+        yield sse_event('done', {})
+    finally:
+        # A client that hangs up must not keep others waiting on this answer
+        chunks.close()
+    warmer.prefetch_related(query)
+
+
+# -----------------------------
+# Endpoints
+async def answer(request):
+    try:
+        query, bypass_cache, conversation = await read_request(request)
+    except BadRequest as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+    response_text, source_used, wiki_url = await run_in_threadpool(
+        pipeline.generate_response, query, bypass_cache, conversation
+    )
+    warmer.prefetch_related(query)
+    return JSONResponse({'response': response_text, 'source_used': source_used, 'wiki_url': wiki_url})
+
+
+async def answer_stream(request):
+    try:
+        query, bypass_cache, conversation = await read_request(request)
+    except BadRequest as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+    # Retrieval happens here, so the sources are known before the first event
+    chunks, source_used, wiki_url = await run_in_threadpool(
+        pipeline.stream_response, query, bypass_cache, conversation
+    )
+    return StreamingResponse(
+        sse_stream(query, chunks, source_used, wiki_url),
+        media_type="text/event-stream",
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+        # Also closes the answer when the client leaves before the first event
+        background=BackgroundTask(chunks.close)
+    )
+
+
+async def health(request):
+    return JSONResponse({'status': 'ok', 'missing_keys': pipeline.missing_keys()})
+
+
+async def stats(request):
+    return JSONResponse(await run_in_threadpool(pipeline.stats))
+
+
+@asynccontextmanager
+async def lifespan(app):
+    if not pipeline.setup_genai():
+        logger.warning("GEMINI_API_KEY is not set; questions will be answered with an error")
+    else:
+        # Ready to serve right away; the SDK loads in the background
+        pipeline.preload_genai()
+        if config.WARM_INTERVAL:
+            warmer.start_warmer(config.QUICK_ACTIONS + config.HOT_TOPICS)
+    yield
+
+
+app = Starlette(
+    routes=[
+        Route("/answer", answer, methods=["POST"]),
+        Route("/answer/stream", answer_stream, methods=["POST"]),
+        Route("/health", health),
+        Route("/stats", stats),
+    ],
+    lifespan=lifespan
+)
+
+
+def main(argv=None):
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve the Tamil AI assistant over HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1, help="worker processes")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    uvicorn.run("api:app", host=args.host, port=args.port, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Client for the HTTP API in api.py.
+
+ApiClient offers the pipeline functions the Streamlit page calls
+(setup_genai, stream_response, generate_response, missing_keys, stats)
+with the same return values, so the page can answer through a remote
+service by swapping the object it calls. It imports nothing heavier than
+requests, which keeps the page light when the service does the work.
+"""
+import json
+import logging
+import time
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Seconds a /health reply is reused; the page asks on every rerun
+HEALTH_TTL = 5.0
+
+APOLOGY = "மன்னிக்கவும், பதில் உருவாக்குவதில் பிழை ஏற்பட்டது. மீண்டும் முயற்சிக்கவும்."
+
+
+def iter_events(lines):
+    """Yield (event, data) from the lines of a server-sent event stream"""
+    event, data = 'message', []
+    for line in lines:
+        if line.startswith('event:'):
+            event = line[6:].strip()
+        elif line.startswith('data:'):
+            data.append(line[5:].strip())
+        elif not line and data:
+            yield event, json.loads("\n".join(data))
+            event, data = 'message', []
+
+
+class ApiClient:
+    """Answers questions through a running api.py service"""
+
+    def __init__(self, base_url, timeout=60.0, report_error=logger.error):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.report_error = report_error
+        self.session = requests.Session()
+        self._health = (0.0, None)
+
+    def _body(self, query, bypass_cache, conversation):
+        body = {'query': query, 'bypass_cache': bypass_cache}
+        if conversation is not None:
+            body['conversation'] = conversation.to_dict()
+        return body
+
+    def _failed(self, error):
+        self.report_error(f"பதில் சேவையை அணுகுவதில் பிழை: {str(error)}")
+        return iter([APOLOGY]), None, None
+
+    def health(self):
+        """The service's /health reply, or None when it cannot be reached"""
+        checked_at, status = self._health
+        if time.monotonic() - checked_at < HEALTH_TTL:
+            return status
+        try:
+            response = self.session.get(f"{self.base_url}/health", timeout=self.timeout)
+            response.raise_for_status()
+            status = response.json()
+        except (requests.RequestException, ValueError) as e:
+            logger.warning("API health check failed: %s", e)
+            status = None
+        self._health = (time.monotonic(), status)
+        return status
+
+    def setup_genai(self):
+        """Whether the service is up and can call Gemini"""
+        status = self.health()
+        return bool(status) and 'gemini_api_key' not in status['missing_keys']
+
+    def missing_keys(self):
+        status = self.health()
+        return status['missing_keys'] if status else ['gemini_api_key', 'google_api_key', 'google_cx']
+
+    def stats(self):
+        try:
+            response = self.session.get(f"{self.base_url}/stats", timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()
+        except (requests.RequestException, ValueError) as e:
+            logger.warning("API stats request failed: %s", e)
+            return {'cache': {'hits': 0, 'misses': 0}, 'stages': {}}
+
+    def stream_response(self, query, bypass_cache=False, conversation=None):
+        """Same as pipeline.stream_response, answered by the service"""
+        try:
+            response = self.session.post(
+                f"{self.base_url}/answer/stream",
+                json=self._body(query, bypass_cache, conversation),
+                stream=True,
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+            # chunk_size=None hands over each chunk as it arrives; lines are
+            # split as bytes so no Unicode line separator can split an event
+            lines = (line.decode('utf-8') for line in response.iter_lines(chunk_size=None))
+            events = iter_events(lines)
+            event, meta = next(events)
+            if event != 'meta':
+                raise ValueError(f"unexpected {event!r} event before the answer")
+        except (requests.RequestException, ValueError, StopIteration) as e:
+            return self._failed(e)
+        return self._chunks(response, events), meta['source_used'], meta['wiki_url']
+
+    def _chunks(self, response, events):
+        try:
+            for event, data in events:
+                if event == 'chunk':
+                    yield data['text']
+                elif event == 'done':
+                    return
+            raise ValueError("answer stream ended early")
+        except (requests.RequestException, ValueError) as e:
+            self.report_error(f"பதில் சேவையை அணுகுவதில் பிழை: {str(e)}")
+            yield APOLOGY
+        finally:
+            response.close()
+
+    def generate_response(self, query, bypass_cache=False, conversation=None):
+        """Same as pipeline.generate_response, answered by the service"""
+        try:
+            response = self.session.post(
+                f"{self.base_url}/answer",
+                json=self._body(query, bypass_cache, conversation),
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+            result = response.json()
+        except (requests.RequestException, ValueError) as e:
+            chunks, source_used, wiki_url = self._failed(e)
+            return "".join(chunks), source_used, wiki_url
+        return result['response'], result['source_used'], result['wiki_url']
@@ -1,12 +1,17 @@
 import streamlit as st
-import wikipediaapi
-import requests
 import json
+import os
 import re
 import time
+import uuid
 from datetime import datetime
-import google.generativeai as genai
-from google.generativeai.types import HarmCategory, HarmBlockThreshold
+
+import config
+from api_client import ApiClient
+from conversation import Conversation
+from history import ChatHistory
+
+STYLESHEET = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'style.css')
 
 # -----------------------------
 # Streamlit page configuration
@@ -18,143 +23,14 @@ st.set_page_config(
 )
 
 # -----------------------------
-# Custom CSS for better UI
-st.markdown("""
-<style>
-    /* Main container styling */
-    .main {
-        padding: 1rem;
-    }
-    
-    /* Chat message styling */
-    .stChatMessage {
-        background-color: rgba(255, 255, 255, 0.05);
-        border-radius: 10px;
-        padding: 10px;
-        margin-bottom: 10px;
-    }
-    
-    /* Header styling */
-    .header-container {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        padding: 2rem;
-        border-radius: 15px;
-        margin-bottom: 2rem;
-        text-align: center;
-        box-shadow: 0 10px 30px rgba(0,0,0,0.1);
-    }
-    
-    .header-title {
-        color: white;
-        font-size: 2.5rem;
-        font-weight: bold;
-        margin-bottom: 0.5rem;
-    }
-    
-    .header-subtitle {
-        color: rgba(255,255,255,0.9);
-        font-size: 1.1rem;
-    }
-    
-    /* Sidebar styling */
-    .sidebar-info {
-        background-color: rgba(102, 126, 234, 0.1);
-        padding: 15px;
-        border-radius: 10px;
-        margin: 10px 0;
-    }
-    
-    /* Status indicator */
-    .status-indicator {
-        display: inline-block;
-        width: 10px;
-        height: 10px;
-        border-radius: 50%;
-        margin-right: 5px;
-    }
-    
-    .status-active {
-        background-color: #4ade80;
-        animation: pulse 2s infinite;
-    }
-    
-    .status-inactive {
-        background-color: #f87171;
-    }
-    
-    @keyframes pulse {
-        0% {
-            box-shadow: 0 0 0 0 rgba(74, 222, 128, 0.7);
-        }
-        70% {
-            box-shadow: 0 0 0 10px rgba(74, 222, 128, 0);
-        }
-        100% {
-            box-shadow: 0 0 0 0 rgba(74, 222, 128, 0);
-        }
-    }
-    
-    /* Source badge styling */
-    .source-badge {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        color: white;
-        padding: 5px 15px;
-        border-radius: 20px;
-        font-size: 0.85rem;
-        display: inline-block;
-        margin-top: 10px;
-    }
-    
-    /* Quick action buttons */
-    .quick-action-btn {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        color: white;
-        padding: 10px 20px;
-        border-radius: 25px;
-        border: none;
-        cursor: pointer;
-        margin: 5px;
-        transition: transform 0.3s;
-    }
-    
-    .quick-action-btn:hover {
-        transform: translateY(-2px);
-    }
-    
-    /* Loading animation */
-    .loading-dots {
-        display: inline-flex;
-        align-items: center;
-    }
-    
-    .loading-dots span {
-        display: inline-block;
-        width: 8px;
-        height: 8px;
-        border-radius: 50%;
-        background-color: #667eea;
-        margin: 0 3px;
-        animation: bounce 1.4s infinite ease-in-out both;
-    }
-    
-    .loading-dots span:nth-child(1) {
-        animation-delay: -0.32s;
-    }
-    
-    .loading-dots span:nth-child(2) {
-        animation-delay: -0.16s;
-    }
-    
-    @keyframes bounce {
-        0%, 80%, 100% {
-            transform: scale(0);
-        }
-        40% {
-            transform: scale(1);
-        }
-    }
-</style>
-""", unsafe_allow_html=True)
+# Custom CSS for better UI, read once per process
+@st.cache_resource
+def load_css(path=STYLESHEET):
+    """The page stylesheet as a <style> element"""
+    with open(path, encoding='utf-8') as f:
+        return f"<style>\n{f.read()}</style>"
+
+st.markdown(load_css(), unsafe_allow_html=True)
 
 # -----------------------------
 # Load API keys from Streamlit secrets
@@ -175,265 +51,56 @@ def load_api_keys():
             'google_cx': ""
         }
 
-# Load keys at startup
-API_KEYS = load_api_keys()
-
-# -----------------------------
-# Initialize Wikipedia API for Tamil with a proper User-Agent
+# Questions go to the API service when API_URL is set; ApiClient offers
+# the same functions as the pipeline, which otherwise runs in this process
 @st.cache_resource
-def get_wiki_instances():
-    """Initialize Wikipedia API instances"""
-    wiki_ta = wikipediaapi.Wikipedia(
-        language='ta',
-        extract_format=wikipediaapi.ExtractFormat.WIKI,
-        user_agent='TamilAIAssistant/2.0 (streamlit.app)'
-    )
+def get_api_client(url):
+    """One client per process, sharing its connections and health check"""
+    return ApiClient(url, config.API_TIMEOUT, report_error=st.error)
+
+if config.API_URL:
+    # The pipeline and its SDKs are never imported in client mode
+    backend = get_api_client(config.API_URL)
+else:
+    import pipeline
+    import warmer
     
-    wiki_en = wikipediaapi.Wikipedia(
-        language='en',
-        extract_format=wikipediaapi.ExtractFormat.WIKI,
-        user_agent='TamilAIAssistant/2.0 (streamlit.app)'
-    )
+    # Load keys at startup; environment variables fill in missing secrets
+    pipeline.set_api_keys(load_api_keys())
     
-    return wiki_ta, wiki_en
-
-wiki_ta, wiki_en = get_wiki_instances()
+    # Pipeline errors are shown in the chat of the session that hit them
+    pipeline.set_error_reporter(st.error)
+    backend = pipeline
 
 # -----------------------------
-# System Instructions for Gemini AI (Enhanced)
-SYSTEM_INSTRUCTIONS = """
-நீங்கள் ஒரு மேம்பட்ட தமிழ் தகவல் மேலாண்மை உதவியாளர். உங்கள் பணி பயனருக்கு துல்லியமான, நம்பகமான மற்றும் விரிவான தகவல்களை வழங்குவதாகும்.
-
-முக்கிய விதிமுறைகள்:
-
-1. **மொழி**: எல்லா பதில்களையும் தூய தமிழில் மட்டுமே வழங்கவும். தேவைப்பட்டால் அடைப்புக்குறிக்குள் ஆங்கில சொற்களை குறிப்பிடலாம்.
-
-2. **தேடல் வரிசை**:
-   - முதலில் விக்கிப்பீடியா தேடல் செய்யவும்
-   - தகவல் போதுமானதாக இல்லாவிட்டால் கூகுள் தேடல் செய்யவும்
-   - இரண்டு ஆதாரங்களையும் ஒப்பிட்டு சிறந்த தகவலை தேர்வு செய்யவும்
-
-3. **பதில் அமைப்பு**:
-   - தெளிவான தலைப்பு
-   - விரிவான விளக்கம்
-   - முக்கிய அம்சங்கள் (bullet points)
-   - தகவல் ஆதாரம்
-
-4. **சிறப்பு கவனம்**:
-   - தமிழ் இலக்கியம், வரலாறு, பண்பாடு தொடர்பான கேள்விகளுக்கு விரிவான விளக்கம்
-   - சங்க இலக்கியம், பக்தி இலக்கியம், நவீன இலக்கியம் போன்றவற்றிற்கு காலக்கிரம விளக்கம்
-   - தமிழ் மன்னர்கள், போர்கள், வரலாற்று நிகழ்வுகளுக்கு தேதி மற்றும் இடம் குறிப்பிடவும்
-
-5. **வாழ்த்துகள் மற்றும் உரையாடல்**:
-   - பயனர் வணக்கம் சொன்னால் அன்புடன் பதில் வணக்கம் சொல்லவும்
-   - உரையாடலை இனிமையாகவும் மரியாதையுடனும் நடத்தவும்
-
-6. **துல்லியம்**:
-   - கிடைத்த தகவலை மட்டும் பயன்படுத்தவும்
-   - கற்பனை தகவலை (hallucination) தவிர்க்கவும்
-   - தெரியாத விஷயங்களுக்கு "துல்லியமான தகவல் கிடைக்கவில்லை" என குறிப்பிடவும்
-
-7. **முக்கிய தலைப்புகள்**:
-   - திருக்குறள் மற்றும் திருவள்ளுவர்
-   - சங்க இலக்கியம் (எட்டுத்தொகை, பத்துப்பாட்டு)
-   - சிலப்பதிகாரம், மணிமேகலை போன்ற காப்பியங்கள்
-   - பக்தி இலக்கிய ஆழ்வார்கள், நாயன்மார்கள்
-   - தமிழ் மன்னர்கள் (சோழர், பாண்டியர், பல்லவர், சேரர்)
-   - தமிழ் பண்பாடு மற்றும் பாரம்பரியம்
-"""
+# Chat history, kept outside the session
+@st.cache_resource
+def get_chat_history():
+    """One append-only history store per process, shared by all sessions"""
+    return ChatHistory(config.HISTORY_PATH, config.HISTORY_MAX_AGE)
 
-# -----------------------------
-# Enhanced Wikipedia search with better error handling
-def get_wikipedia_content(query):
-    """Fetch Wikipedia content with enhanced search strategies"""
-    try:
-        # Strategy 1: Direct search in Tamil
-        page = wiki_ta.page(query)
-        if page.exists():
-            summary = page.summary.strip()
-            if len(summary) > 100:
-                return {
-                    'content': summary[:2000],
-                    'title': page.title,
-                    'url': page.fullurl,
-                    'language': 'தமிழ்'
-                }
-        
-        # Strategy 2: Search with Tamil keywords
-        tamil_keywords = ['தமிழ்', 'இலக்கியம்', 'வரலாறு', 'பண்பாடு', 'கவிதை', 'சங்க இலக்கியம்']
-        for keyword in tamil_keywords:
-            combined_query = f"{query} {keyword}"
-            page = wiki_ta.page(combined_query)
-            if page.exists():
-                summary = page.summary.strip()
-                if len(summary) > 100:
-                    return {
-                        'content': summary[:2000],
-                        'title': page.title,
-                        'url': page.fullurl,
-                        'language': 'தமிழ்'
-                    }
-        
-        # Strategy 3: English Wikipedia as fallback
-        eng_page = wiki_en.page(query)
-        if eng_page.exists():
-            summary = eng_page.summary.strip()
-            if len(summary) > 100:
-                return {
-                    'content': f"[தமிழ் விக்கிப்பீடியாவில் இல்லை. ஆங்கில விக்கிப்பீடியா:]\n{summary[:1500]}",
-                    'title': eng_page.title,
-                    'url': eng_page.fullurl,
-                    'language': 'ஆங்கிலம்'
-                }
-        
-        return None
-        
-    except Exception as e:
-        st.error(f"விக்கிப்பீடியா பிழை: {str(e)}")
-        return None
+chat_history = get_chat_history()
 
-# -----------------------------
-# Enhanced Google Search with rate limiting
-def get_google_content(query):
-    """Fetch Google Search content with enhanced error handling"""
-    try:
-        if not API_KEYS['google_api_key'] or not API_KEYS['google_cx']:
-            return None
-            
-        url = "https://www.googleapis.com/customsearch/v1"
-        params = {
-            "q": query + " தமிழ்",  # Add Tamil to prioritize Tamil results
-            "key": API_KEYS['google_api_key'],
-            "cx": API_KEYS['google_cx'],
-            "lr": "lang_ta",  # Tamil language preference
-            "num": 5  # Get top 5 results
-        }
-        
-        response = requests.get(url, params=params, timeout=10)
-        response.raise_for_status()
-        
-        data = response.json()
-        
-        if "items" in data:
-            results = []
-            for item in data["items"][:3]:  # Use top 3 results
-                result = {
-                    'title': item.get("title", ""),
-                    'snippet': item.get("snippet", ""),
-                    'link': item.get("link", "")
-                }
-                results.append(result)
-            
-            combined = "\n\n".join([f"**{r['title']}**\n{r['snippet']}" for r in results])
-            return combined[:2000] if combined else None
-        
-        return None
-        
-    except requests.exceptions.RequestException as e:
-        st.error(f"கூகுள் தேடல் பிழை: {str(e)}")
-        return None
-    except Exception as e:
-        st.error(f"எதிர்பாராத பிழை: {str(e)}")
-        return None
+# Initialize session state; only the session ID and how many messages
+# to show are kept per session. The ID is also kept in the page URL, so
+# reloading the page continues the same conversation
+if 'session_id' not in st.session_state:
+    session_id = st.query_params.get('session', '')
+    if not re.fullmatch(r'[0-9a-f]{32}', session_id):
+        session_id = uuid.uuid4().hex
+    st.session_state.session_id = session_id
+    st.session_state.history_shown = config.HISTORY_PAGE_SIZE
+if st.query_params.get('session') != st.session_state.session_id:
+    st.query_params['session'] = st.session_state.session_id
 
-# -----------------------------
-# Setup Gemini API with caching
-@st.cache_resource
-def setup_genai():
-    """Initialize Gemini AI configuration"""
-    try:
-        if not API_KEYS['gemini_api_key']:
-            return False
-        genai.configure(api_key=API_KEYS['gemini_api_key'])
-        return True
-    except Exception as e:
-        st.error(f"Gemini API துவக்க பிழை: {str(e)}")
-        return False
-
-# -----------------------------
-# Enhanced response generation with better context
-def generate_response(query):
-    """Generate response using Gemini AI with enhanced context and error handling"""
-    try:
-        # Fetch content from both sources
-        wiki_data = get_wikipedia_content(query)
-        google_content = get_google_content(query) if not wiki_data or len(wiki_data.get('content', '')) < 300 else None
-        
-        # Build enhanced prompt
-        full_prompt = SYSTEM_INSTRUCTIONS + "\n\n"
-        full_prompt += f"பயனர் கேள்வி: {query}\n\n"
-        
-        if wiki_data:
-            full_prompt += f"விக்கிப்பீடியா தகவல் ({wiki_data['language']}):\n"
-            full_prompt += f"தலைப்பு: {wiki_data['title']}\n"
-            full_prompt += f"{wiki_data['content']}\n\n"
-        
-        if google_content:
-            full_prompt += f"கூகுள் தேடல் தகவல்:\n{google_content}\n\n"
-        
-        full_prompt += """
-        மேற்கண்ட தகவல்களை பயன்படுத்தி:
-        1. தெளிவான மற்றும் விரிவான பதிலை தமிழில் வழங்கவும்
-        2. முக்கிய அம்சங்களை புள்ளிகளாக (bullet points) குறிப்பிடவும்
-        3. தகவல் ஆதாரத்தை குறிப்பிடவும்
-        4. பயனருக்கு பயனுள்ள கூடுதல் தகவல்களையும் சேர்க்கவும்
-        """
-        
-        # Safety settings
-        safety_settings = {
-            HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-            HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
-            HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
-            HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
-        }
-        
-        # Initialize Gemini model
-        model = genai.GenerativeModel(
-            model_name="gemini-1.5-flash",
-            generation_config={
-                "temperature": 0.3,
-                "top_p": 0.95,
-                "top_k": 40,
-                "max_output_tokens": 3000,
-            },
-            safety_settings=safety_settings
-        )
-        
-        # Generate response
-        response = model.generate_content(full_prompt)
-        response_text = response.text
-        
-        # Determine sources used
-        sources = []
-        if wiki_data:
-            sources.append(f"விக்கிப்பீடியா ({wiki_data['language']})")
-        if google_content:
-            sources.append("கூகுள் தேடல்")
-        
-        source_used = " மற்றும் ".join(sources) if sources else "தகவல் ஆதாரம் இல்லை"
-        
-        # Add wiki URL if available
-        wiki_url = wiki_data['url'] if wiki_data else None
-        
-        return response_text, source_used, wiki_url
-        
-    except Exception as e:
-        error_msg = f"பதில் உருவாக்குவதில் பிழை: {str(e)}"
-        st.error(error_msg)
-        return "மன்னிக்கவும், பதில் உருவாக்குவதில் பிழை ஏற்பட்டது. மீண்டும் முயற்சிக்கவும்.", None, None
+if 'start_time' not in st.session_state:
+    st.session_state.start_time = time.time()
 
 # -----------------------------
 # Quick action examples
 def get_quick_actions():
     """Return quick action examples"""
-    return [
-        "திருக்குறள் பற்றி",
-        "சங்க இலக்கியம்",
-        "சோழர் வரலாறு",
-        "தமிழ் எழுத்துகள்",
-        "சிலப்பதிகாரம்",
-        "பல்லவர் கட்டிடக்கலை"
-    ]
+    return list(config.QUICK_ACTIONS)
 
 # -----------------------------
 # Main UI
@@ -450,7 +117,8 @@ with st.sidebar:
     st.header("📊 பயன்பாட்டு நிலை")
     
     # Check API status
-    api_status = all([API_KEYS['gemini_api_key'], API_KEYS['google_api_key'], API_KEYS['google_cx']])
+    missing = backend.missing_keys()
+    api_status = not missing
     
     if api_status:
         st.markdown("""
@@ -467,13 +135,8 @@ with st.sidebar:
         </div>
         """, unsafe_allow_html=True)
         
-        missing_keys = []
-        if not API_KEYS['gemini_api_key']:
-            missing_keys.append("Gemini API")
-        if not API_KEYS['google_api_key']:
-            missing_keys.append("Google Search API")
-        if not API_KEYS['google_cx']:
-            missing_keys.append("Google CX")
+        key_labels = {'gemini_api_key': "Gemini API", 'google_api_key': "Google Search API", 'google_cx': "Google CX"}
+        missing_keys = [key_labels.get(name, name) for name in missing]
         
         if missing_keys:
             st.error(f"இல்லாத விசைகள்: {', '.join(missing_keys)}")
@@ -484,10 +147,31 @@ with st.sidebar:
     st.markdown("### 📈 புள்ளிவிவரங்கள்")
     col1, col2 = st.columns(2)
     with col1:
-        st.metric("மொத்த கேள்விகள்", len(st.session_state.get('messages', [])) // 2)
+        # Each answered question is stored as a question and an answer
+        st.metric("மொத்த கேள்விகள்", chat_history.count(st.session_state.session_id) // 2)
     with col2:
         st.metric("அமர்வு நேரம்", f"{int((time.time() - st.session_state.get('start_time', time.time())) / 60)} நிமிடங்கள்")
     
+    # Retrieval cache counters are shared by all sessions
+    backend_stats = backend.stats()
+    cache_stats = backend_stats['cache']
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("சேமிப்பு வெற்றி", cache_stats['hits'])
+    with col2:
+        st.metric("சேமிப்பு தவறல்", cache_stats['misses'])
+    
+    # Per-stage latency across all sessions of this process
+    with st.expander("⏱️ நேர அளவீடுகள் (p50 / p95)"):
+        stage_stats = backend_stats['stages']
+        if stage_stats:
+            rows = ["| நிலை | p50 (ms) | p95 (ms) | எண்ணிக்கை |", "|---|---:|---:|---:|"]
+            for stage, stats in stage_stats.items():
+                rows.append(f"| {stage} | {stats['p50'] * 1000:.0f} | {stats['p95'] * 1000:.0f} | {stats['count']} |")
+            st.markdown("\n".join(rows))
+        else:
+            st.caption("இன்னும் அளவீடுகள் இல்லை")
+    
     st.markdown("---")
     
     # About section
@@ -508,95 +192,156 @@ with st.sidebar:
         - பண்பாட்டு மரபுகள்
         """)
     
+    # Skip cached answers for this session's next questions
+    st.checkbox("🔁 புதிய பதிலை உருவாக்கு (சேமித்ததைத் தவிர்)", key="bypass_answer_cache")
+    
     # Clear chat button
     if st.button("🔄 புதிய உரையாடல் தொடங்கு", use_container_width=True):
-        st.session_state.messages = []
+        # The old session's messages stay in the store; a new ID starts afresh
+        st.session_state.pop('session_id', None)
+        st.session_state.pop('conversation', None)
+        st.query_params.pop('session', None)
         st.rerun()
 
-# Initialize session state
-if 'messages' not in st.session_state:
-    st.session_state.messages = []
-    st.session_state.start_time = time.time()
+# Bounded memory of this session for follow-up questions
+def restore_conversation(session_id):
+    """The conversation of a session's stored messages, for a reloaded page"""
+    conversation = Conversation(config.CONVERSATION_TURNS, config.CONVERSATION_SUMMARY_CHARS)
+    question = None
+    for message in chat_history.recent(session_id, 2 * config.CONVERSATION_TURNS):
+        if message["role"] == "user":
+            question = message["content"]
+        elif question is not None and message.get("source_type"):
+            conversation.add_turn(question, message["content"])
+            question = None
+    return conversation
 
-if 'start_time' not in st.session_state:
-    st.session_state.start_time = time.time()
+if 'conversation' not in st.session_state:
+    st.session_state.conversation = restore_conversation(st.session_state.session_id)
+
+# Questions waiting to be answered; buttons and the chat input add to it
+# from their callbacks, so a click is answered in the run it triggers
+if 'pending_queries' not in st.session_state:
+    st.session_state.pending_queries = []
+
+def enqueue_query(query):
+    """Queue a question to be answered in the current script run"""
+    st.session_state.pending_queries.append(query)
+
+def load_earlier():
+    """Show one more page of older messages"""
+    st.session_state.history_shown += config.HISTORY_PAGE_SIZE
+
+message_count = chat_history.count(st.session_state.session_id)
 
 # Quick actions (only show if no messages)
-if len(st.session_state.messages) == 0:
+if message_count == 0 and not st.session_state.pending_queries:
     st.markdown("### 🚀 விரைவு தொடக்கம்")
     st.markdown("கீழ்க்கண்ட பொத்தான்களை அழுத்தி உடனடியாக தகவல் பெறுங்கள்:")
     
     cols = st.columns(3)
     for i, action in enumerate(get_quick_actions()):
         with cols[i % 3]:
-            if st.button(action, key=f"quick_{i}", use_container_width=True):
-                st.session_state.quick_query = action
+            st.button(action, key=f"quick_{i}", use_container_width=True,
+                      on_click=enqueue_query, args=(action,))
+
+# Display the most recent chat messages; older ones are read from the
+# store a page at a time
+if message_count > st.session_state.history_shown:
+    st.button(f"⬆️ முந்தைய செய்திகளைக் காட்டு ({message_count - st.session_state.history_shown})",
+              key="load_earlier", on_click=load_earlier)
 
-# Display chat messages
-for message in st.session_state.messages:
+for message in chat_history.recent(st.session_state.session_id, st.session_state.history_shown):
     with st.chat_message(message["role"], avatar="🧑" if message["role"] == "user" else "🤖"):
         st.markdown(message["content"])
-        if "source_type" in message and message["source_type"]:
+        if message.get("source_type"):
             st.markdown(f'<span class="source-badge">📚 {message["source_type"]}</span>', unsafe_allow_html=True)
-        if "wiki_url" in message and message.get("wiki_url"):
+        if message.get("wiki_url"):
             st.markdown(f"[🔗 விக்கிப்பீடியா பக்கம்]({message['wiki_url']})")
 
-# Handle quick query
-if 'quick_query' in st.session_state:
-    query = st.session_state.quick_query
-    del st.session_state.quick_query
-    st.session_state.messages.append({"role": "user", "content": query})
-    st.rerun()
-
-# User input
-if query := st.chat_input("உங்கள் கேள்வியை தமிழில் கேளுங்கள்... (எ.கா: திருக்குறள் பற்றி சொல்லுங்கள்)"):
-    if not API_KEYS['gemini_api_key']:
+# -----------------------------
+# Answering queued questions
+def answer_query(query):
+    """Show a question and stream its answer into the chat"""
+    if 'gemini_api_key' in backend.missing_keys():
         st.error("⚠️ Gemini API key கிடைக்கவில்லை. Streamlit secrets-ல் சரிபார்க்கவும்.")
-    else:
-        # Add user message
-        st.session_state.messages.append({"role": "user", "content": query})
-        with st.chat_message("user", avatar="🧑"):
-            st.markdown(query)
+        return
+    
+    # Add user message
+    session_id = st.session_state.session_id
+    chat_history.append(session_id, {"role": "user", "content": query})
+    with st.chat_message("user", avatar="🧑"):
+        st.markdown(query)
+    
+    # Generate and display assistant response
+    with st.chat_message("assistant", avatar="🤖"):
+        # Show custom loading animation
+        loading_placeholder = st.empty()
+        loading_placeholder.markdown("""
+        <div class="loading-dots">
+            பதில் தயாராகிறது
+            <span></span>
+            <span></span>
+            <span></span>
+        </div>
+        """, unsafe_allow_html=True)
         
-        # Generate and display assistant response
-        with st.chat_message("assistant", avatar="🤖"):
-            # Show custom loading animation
-            loading_placeholder = st.empty()
-            loading_placeholder.markdown("""
-            <div class="loading-dots">
-                பதில் தயாராகிறது
-                <span></span>
-                <span></span>
-                <span></span>
-            </div>
-            """, unsafe_allow_html=True)
-            
-            # Setup Gemini and generate response
-            if setup_genai():
-                response, source_used, wiki_url = generate_response(query)
+        # Setup Gemini and generate response
+        if backend.setup_genai():
+            bypass_cache = st.session_state.get('bypass_answer_cache', False)
+            conversation = st.session_state.conversation
+            if config.STREAM_RESPONSES:
+                # Replace the loading animation with text as it arrives
+                chunks, source_used, wiki_url = backend.stream_response(query, bypass_cache, conversation)
+                response = ""
+                try:
+                    for chunk in chunks:
+                        response += chunk
+                        loading_placeholder.markdown(response + "▌")
+                finally:
+                    # A rerun or a closed tab stops the loop mid-answer
+                    chunks.close()
+                loading_placeholder.markdown(response)
+            else:
+                response, source_used, wiki_url = backend.generate_response(query, bypass_cache, conversation)
                 
                 # Clear loading animation
                 loading_placeholder.empty()
                 
                 # Display response
                 st.markdown(response)
-                
-                if source_used:
-                    st.markdown(f'<span class="source-badge">📚 {source_used}</span>', unsafe_allow_html=True)
-                
-                if wiki_url:
-                    st.markdown(f"[🔗 விக்கிப்பீடியா பக்கம்]({wiki_url})")
-                
-                # Save to session state
-                st.session_state.messages.append({
-                    "role": "assistant",
-                    "content": response,
-                    "source_type": source_used,
-                    "wiki_url": wiki_url
-                })
-            else:
-                loading_placeholder.empty()
-                st.error("API அமைப்பில் பிழை. மீண்டும் முயற்சிக்கவும்.")
+            
+            if source_used:
+                st.markdown(f'<span class="source-badge">📚 {source_used}</span>', unsafe_allow_html=True)
+            
+            if wiki_url:
+                st.markdown(f"[🔗 விக்கிப்பீடியா பக்கம்]({wiki_url})")
+            
+            # Save to the history store
+            chat_history.append(session_id, {
+                "role": "assistant",
+                "content": response,
+                "source_type": source_used,
+                "wiki_url": wiki_url
+            })
+            if source_used:
+                conversation.add_turn(query, response)
+            
+            # Fetch the pages the answer's article links to before the
+            # user asks about them (the API service prefetches for itself)
+            if not config.API_URL:
+                warmer.prefetch_related(query)
+        else:
+            loading_placeholder.empty()
+            st.error("API அமைப்பில் பிழை. மீண்டும் முயற்சிக்கவும்.")
+
+# User input joins the queue like a quick action, and everything queued
+# is answered in this same run
+if query := st.chat_input("உங்கள் கேள்வியை தமிழில் கேளுங்கள்... (எ.கா: திருக்குறள் பற்றி சொல்லுங்கள்)"):
+    enqueue_query(query)
+
+while st.session_state.pending_queries:
+    answer_query(st.session_state.pending_queries.pop(0))
 
 # Footer
 st.markdown("---")
@@ -606,3 +351,11 @@ st.markdown("""
     Powered by Gemini AI & Wikipedia
 </div>
 """, unsafe_allow_html=True)
+
+# Once the page is drawn, load the Gemini SDK in the background and keep
+# answers to the quick actions and hot topics cached for every session;
+# neither delays the first paint (the API service does both itself)
+if not config.API_URL and pipeline.setup_genai():
+    pipeline.preload_genai()
+    if config.WARM_INTERVAL:
+        warmer.start_warmer(tuple(get_quick_actions()) + config.HOT_TOPICS)
@@ -0,0 +1,142 @@
+"""
+Answer a file of questions without the Streamlit UI.
+
+    python batch.py questions.jsonl answers.jsonl --workers 4 --rate google=1 --rate gemini=2
+
+Each input line is a JSON object with an id ("id" or "request_id") and a
+question ("query", "question" or "title"). Answers are appended to the
+output file as JSON lines as soon as each one is ready; running the same
+command again skips ids already present in the output, so an interrupted
+run resumes where it stopped; questions whose answer failed, or that
+only got retrieved text while Gemini was unavailable, are tried again.
+Keys come from GEMINI_API_KEY, GOOGLE_API_KEY and GOOGLE_CX in the
+environment (or a .env file).
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import config
+import pipeline
+
+logger = logging.getLogger("batch")
+
+
+def read_questions(path):
+    """Yield (id, query) pairs from a JSONL file"""
+    with open(path, encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            question_id = str(item.get('id') or item.get('request_id') or line_number)
+            query = item.get('query') or item.get('question') or item.get('title')
+            if query:
+                yield question_id, query
+
+
+def completed_ids(path):
+    """Ids already answered in an existing output file"""
+    if not os.path.exists(path):
+        return set()
+    done = set()
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                # A line cut short by an interruption is answered again
+                continue
+            if not result.get('failed'):
+                done.add(result['id'])
+    return done
+
+
+def answer(question_id, query, bypass_cache=False):
+    """Run one question through the pipeline and describe the result"""
+    started = time.monotonic()
+    chunks, source_used, wiki_url = pipeline.stream_response(query, bypass_cache)
+    response_text = "".join(chunks)
+    return {
+        'id': question_id,
+        'query': query,
+        'response': response_text,
+        'source_used': source_used,
+        'wiki_url': wiki_url,
+        'status': chunks.status,
+        # Apologies and retrieved text shown while Gemini was unavailable
+        # are not answers, so a resumed run tries them again
+        'failed': chunks.status != pipeline.ANSWERED,
+        'seconds': round(time.monotonic() - started, 3)
+    }
+
+
+def run(input_path, output_path, workers=4, bypass_cache=False):
+    """Answer every pending question with a bounded worker pool; returns the count"""
+    done = completed_ids(output_path)
+    pending = ((qid, query) for qid, query in read_questions(input_path) if qid not in done)
+    answered = 0
+
+    with open(output_path, 'a', encoding='utf-8') as out, ThreadPoolExecutor(max_workers=workers) as pool:
+        in_flight = set()
+
+        def drain(return_when):
+            nonlocal answered, in_flight
+            finished, in_flight = wait(in_flight, return_when=return_when)
+            for future in finished:
+                result = future.result()
+                out.write(json.dumps(result, ensure_ascii=False) + '\n')
+                out.flush()
+                answered += 1
+                logger.info("%s answered in %.2fs", result['id'], result['seconds'])
+
+        # Keep only a couple of questions per worker queued so memory
+        # stays flat however long the input is
+        for question_id, query in pending:
+            in_flight.add(pool.submit(answer, question_id, query, bypass_cache))
+            if len(in_flight) >= workers * 2:
+                drain(FIRST_COMPLETED)
+        if in_flight:
+            drain(ALL_COMPLETED)
+
+    return answered
+
+
+def parse_rate(value):
+    """Parse a --rate argument of the form source=calls_per_second"""
+    source, _, rate = value.partition('=')
+    if source not in config.RATE_LIMITS:
+        raise argparse.ArgumentTypeError(f"unknown source {source!r}")
+    try:
+        return source, float(rate)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid rate {rate!r}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of Tamil questions")
+    parser.add_argument("input", help="JSONL file of questions")
+    parser.add_argument("output", help="JSONL file answers are appended to")
+    parser.add_argument("--workers", type=int, default=4, help="questions answered at once")
+    parser.add_argument("--rate", type=parse_rate, action='append', default=[],
+                        help="per-source limit, e.g. google=1 (wiki_ta, wiki_en, google, gemini)")
+    parser.add_argument("--fresh", action='store_true', help="ignore cached answers")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    for source, rate in args.rate:
+        pipeline.set_rate_limit(source, rate)
+    if not pipeline.setup_genai():
+        parser.exit(1, "GEMINI_API_KEY is not set\n")
+
+    answered = run(args.input, args.output, args.workers, args.fresh)
+    print(f"Answered {answered} questions into {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Checks of the shared cache backends against a local Redis stand-in.
+
+    python -m benchmarks.check_cache
+    python -m benchmarks.check_cache --redis-url redis://localhost:6379/15
+
+Covers RESP encoding and parsing, RedisCache values, expiry and SCAN
+paging, SET NX PX locks, misses while the server is unreachable, and
+single-flight across processes: several processes start the same work
+at once against the Redis and the SQLite backend, and it must run once.
+The stand-in of benchmarks/redis_standin.py is used unless --redis-url
+names a real server (whose database is flushed). Every check is an
+assert; the run fails (exit status 1) when any of them does.
+"""
+import argparse
+import io
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Run in each process of the single-flight check: wait for the common
+# start time, then ask for the work under SingleFlight and print the result
+FLIGHT_WORKER = """
+import sys, time
+from cache import MISSING, RedisCache, SingleFlight, SQLiteCache
+kind, target, start = sys.argv[1], sys.argv[2], float(sys.argv[3])
+backend = RedisCache(target, 'check:') if kind == 'redis' else SQLiteCache(target, 100)
+flight = SingleFlight(backend, lock_ttl=10, poll_interval=0.02)
+
+def work():
+    time.sleep(0.5)
+    backend.set('result', 'done', time.time() + 60)
+    return 'worked'
+
+def lookup():
+    value, _ = backend.get('result')
+    return 'waited' if value == 'done' else MISSING
+
+time.sleep(max(0, start - time.time()))
+print(flight.run('question', work, lookup, 10))
+"""
+
+
+def check_resp(checks):
+    from resp import RespError, encode_command, read_reply
+
+    with checks.check("commands are encoded as arrays of bulk strings"):
+        encoded = encode_command('SET', 'தமிழ்', 5)
+        assert encoded == b"*3\r\n$3\r\nSET\r\n$15\r\n" + 'தமிழ்'.encode() + b"\r\n$1\r\n5\r\n", \
+            f"encoded as {encoded!r}"
+    stream = io.BytesIO(b"+OK\r\n-ERR wrong\r\n:42\r\n$5\r\nhe\r\nl\r\n$-1\r\n*2\r\n$1\r\na\r\n*1\r\n:1\r\n*-1\r\n")
+    replies = [read_reply(stream) for _ in range(7)]
+    expected = ['OK', 'ERR wrong', 42, b'he\r\nl', None, [b'a', [1]], None]
+    shown = [str(reply) if isinstance(reply, RespError) else reply for reply in replies]
+    with checks.check("every reply type is parsed"):
+        assert shown == expected, f"parsed {shown}"
+    with checks.check("a truncated reply is an error"):
+        try:
+            read_reply(io.BytesIO(b"$5\r\nab"))
+        except ConnectionError:
+            pass
+        else:
+            raise AssertionError("nothing was raised")
+
+
+def check_redis_cache(url, checks):
+    from cache import MISSING, RedisCache
+
+    cache = RedisCache(url, 'check:')
+    cache.client.execute('FLUSHDB')
+    cache.set('அ', {'text': 'தமிழ்', 'n': [1, 2]}, time.time() + 60)
+    value, expires_at = cache.get('அ')
+    with checks.check("values round-trip with their expiry"):
+        assert value == {'text': 'தமிழ்', 'n': [1, 2]} and 55 < expires_at - time.time() <= 60, \
+            f"got {value!r}, expiring in {expires_at - time.time():.1f}s"
+    with checks.check("unknown keys miss"):
+        assert cache.get('missing')[0] is MISSING, "a value was returned"
+
+    cache.set('short', 1, time.time() + 0.2)
+    time.sleep(0.3)
+    with checks.check("entries expire"):
+        assert cache.get('short')[0] is MISSING, "the entry outlived its TTL"
+
+    # More keys than one SCAN page, plus keys of another namespace and a lock
+    for i in range(2500):
+        cache.client.execute('SET', f'check:k{i}', '1', 'PX', 120000 + 100 * i)
+    cache.client.execute('SET', 'other:k', '1')
+    cache.try_lock('k1', 5)
+    keys = cache.keys()
+    with checks.check("keys() pages through SCAN within the namespace, soonest to expire first"):
+        assert len(keys) == 2501 and keys[0] == 'அ' and keys[1] == 'k0' and keys[-1] == 'k2499', \
+            f"{len(keys)} keys, starting {keys[:2]}"
+    cache.unlock('k1')
+
+    first, second = RedisCache(url, 'check:'), RedisCache(url, 'check:')
+    taken = first.try_lock('q', 0.3), second.try_lock('q', 0.3)
+    with checks.check("SET NX grants a lock once"):
+        assert taken == (True, False), f"try_lock gave {taken}"
+    second.unlock('q')
+    with checks.check("a lock is only released by its owner"):
+        assert first.locked('q'), "another cache released it"
+    time.sleep(0.4)
+    with checks.check("a lock expires after its TTL (PX)"):
+        assert not first.locked('q') and second.try_lock('q', 1), "the lock outlived its TTL"
+    second.unlock('q')
+    with checks.check("the owner releases its lock"):
+        assert not second.locked('q'), "the lock is still held"
+
+    down = RedisCache('redis://127.0.0.1:1', 'check:', timeout=0.5)
+    with checks.check("an unreachable server is a miss, not an error"):
+        assert down.get('a')[0] is MISSING and down.keys() == [] and not down.try_lock('a', 1), \
+            "an unreachable server returned data"
+
+
+def check_single_flight(kind, target, checks, processes=4):
+    """The same work started in several processes at once runs in one of them"""
+    start = time.time() + 1.0
+    workers = [
+        subprocess.Popen([sys.executable, '-c', FLIGHT_WORKER, kind, target, str(start)],
+                         cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        for _ in range(processes)
+    ]
+    results = []
+    for worker in workers:
+        out, err = worker.communicate(timeout=60)
+        results.append(out.strip() or err.strip().splitlines()[-1])
+    with checks.check(f"single flight across {processes} processes ({kind})"):
+        assert sorted(results) == ['waited'] * (processes - 1) + ['worked'], f"results {results}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the shared cache backends against a Redis stand-in")
+    parser.add_argument("--redis-url", help="real server to check instead of the stand-in (its database is flushed)")
+    args = parser.parse_args(argv)
+
+    from benchmarks.checks import Checks
+    from benchmarks.redis_standin import RedisStandin
+
+    # The unreachable-server check logs a warning per call by design
+    logging.getLogger('cache').setLevel(logging.ERROR)
+
+    checks = Checks('cache')
+    standin = None if args.redis_url else RedisStandin().start()
+    url = args.redis_url or standin.url + "/3"
+
+    from cache import RedisCache
+
+    check_resp(checks)
+    check_redis_cache(url, checks)
+    RedisCache(url, 'check:').client.execute('FLUSHDB')
+    check_single_flight('redis', url, checks)
+    with tempfile.TemporaryDirectory() as workdir:
+        check_single_flight('sqlite', os.path.join(workdir, 'cache.sqlite'), checks)
+    if standin is not None:
+        standin.shutdown()
+    checks.finish()
+
+
+if __name__ == "__main__":
+    main()
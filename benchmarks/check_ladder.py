@@ -0,0 +1,159 @@
+"""
+Checks of the model ladder with stub model clients.
+
+    python -m benchmarks.check_ladder
+
+Each scenario gives the two models of a flash,pro ladder stub clients
+with a canned answer or error, and checks which model answers, the text
+that comes out, the output budget asked for, and that streams which are
+not used are stopped. No API key or network is needed. Every check is
+an assert; the run fails (exit status 1) when any of them does.
+"""
+import argparse
+import os
+
+TAMIL = "திருக்குறள் திருவள்ளுவர் இயற்றிய அறநூல். " * 10
+ENGLISH = "Thirukkural is a classic Tamil text on ethics. " * 10
+
+
+def isolate():
+    """One attempt per model and no quota file; must run before pipeline is imported"""
+    os.environ['MODEL_LADDER'] = 'flash,pro'
+    os.environ['GEMINI_RETRIES'] = '0'
+    os.environ['QUOTA_PATH'] = ''
+
+
+class Chunk:
+    def __init__(self, text):
+        self.text = text
+        self.parts = [text]
+
+
+class StubResponse:
+    """A streamed answer, recording how many chunks were read and whether it was cancelled"""
+
+    def __init__(self, text, chunk_size=40):
+        self.chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+        self.read = 0
+        self.cancelled = False
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            self.read += 1
+            yield Chunk(chunk)
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class StubModel:
+    """Answers every prompt with `answer`, or raises `error`"""
+
+    def __init__(self, answer='', error=None):
+        self.answer = answer
+        self.error = error
+        self.budgets = []
+        self.responses = []
+
+    def generate_content(self, prompt, stream=False, generation_config=None, **kwargs):
+        self.budgets.append((generation_config or {}).get('max_output_tokens'))
+        if self.error:
+            raise self.error
+        self.responses.append(StubResponse(self.answer))
+        return self.responses[-1]
+
+
+def run(pipeline, flash, pro, query_class='known_topic', has_sources=True):
+    """Answer with stub models; returns (text, decision)"""
+    # Every scenario starts with a closed circuit
+    pipeline.get_breaker('gemini').record_success()
+    pipeline.set_model_client({'flash': flash, 'pro': pro})
+    try:
+        texts, _, decision = pipeline.generate_answer("கேள்வி", query_class, has_sources)
+        return "".join(texts), decision
+    finally:
+        pipeline.set_model_client(None)
+
+
+def check_scenarios(pipeline, checks):
+    """Check each scenario of the ladder"""
+    import config
+    from google.api_core import exceptions
+
+    def expect(text, decision, model, answer=None):
+        assert decision['model'] == model, f"answered by {decision['model']}, expected {model}"
+        assert answer is None or text == answer, f"answer {text[:30]!r}... is not the whole {model} answer"
+
+    with checks.check("Tamil answer is kept"):
+        flash, pro = StubModel(TAMIL), StubModel(TAMIL.upper())
+        text, decision = run(pipeline, flash, pro)
+        expect(text, decision, 'flash', TAMIL)
+        assert not pro.budgets, "the second model was asked"
+
+    with checks.check("answer not in Tamil escalates"):
+        flash, pro = StubModel(ENGLISH), StubModel(TAMIL)
+        text, decision = run(pipeline, flash, pro)
+        expect(text, decision, 'pro', TAMIL)
+        assert flash.responses[0].cancelled, "the first model's stream was left open"
+
+    with checks.check("empty answer escalates"):
+        text, decision = run(pipeline, StubModel(''), StubModel(TAMIL), 'greeting', False)
+        expect(text, decision, 'pro', TAMIL)
+
+    no_information = pipeline.NO_INFORMATION + "."
+    with checks.check("no information with sources escalates"):
+        text, decision = run(pipeline, StubModel(no_information), StubModel(TAMIL), 'long_tail', True)
+        expect(text, decision, 'pro', TAMIL)
+
+    with checks.check("no information without sources is kept"):
+        text, decision = run(pipeline, StubModel(no_information), StubModel(TAMIL), 'long_tail', False)
+        expect(text, decision, 'flash', no_information)
+
+    for error in (exceptions.TooManyRequests('quota'), exceptions.NotFound('no such model'),
+                  exceptions.PermissionDenied('denied'), exceptions.InvalidArgument('bad request')):
+        with checks.check(f"{type(error).__name__} on escalation keeps the first answer"):
+            text, decision = run(pipeline, StubModel(ENGLISH), StubModel(error=error))
+            expect(text, decision, 'flash', ENGLISH)
+
+    if config.ESCALATION_PEEK_CHARS == 0:
+        with checks.check("first chunk is checked without holding back the rest"):
+            flash = StubModel(TAMIL)
+            pipeline.set_model_client({'flash': flash, 'pro': StubModel(TAMIL)})
+            try:
+                pipeline.generate_answer("கேள்வி", 'known_topic', True)
+            finally:
+                pipeline.set_model_client(None)
+            read = flash.responses[0].read
+            assert read == 1, f"{read} chunks read before the answer was returned"
+
+    with checks.check("output budget follows the query class"):
+        flash = StubModel(TAMIL)
+        run(pipeline, flash, StubModel(TAMIL), 'greeting')
+        expected = config.OUTPUT_TOKENS['greeting']
+        assert flash.budgets == [expected], f"asked for {flash.budgets}, expected [{expected}]"
+
+    with checks.check("error of the first model is raised"):
+        try:
+            run(pipeline, StubModel(error=exceptions.NotFound('gone')), StubModel(TAMIL))
+        except exceptions.NotFound:
+            pass
+        else:
+            raise AssertionError("nothing was raised")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the model ladder with stub model clients")
+    parser.parse_args(argv)
+
+    from benchmarks.checks import Checks
+
+    isolate()
+    import pipeline
+
+    checks = Checks('ladder')
+    check_scenarios(pipeline, checks)
+    checks.finish()
+
+
+if __name__ == "__main__":
+    main()
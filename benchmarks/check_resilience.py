@@ -0,0 +1,168 @@
+"""
+Checks of the upstream protection against the local stand-ins.
+
+    python -m benchmarks.check_resilience
+
+The pipeline calls the stand-ins of benchmarks/standin.py over real
+HTTP, with failures injected per upstream. It checks that a daily quota
+lets exactly its calls through, persists them and warns once when it is
+spent, that sources without a quota are never refused, that a circuit
+breaker opens after its failures, lets one trial call through once it
+has cooled down and closes again on success, and that answers fall back
+to the retrieved text while Gemini is failing. Every check is an
+assert; the run fails (exit status 1) when any of them does.
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+QUERY = "திருக்குறள் பற்றி"
+FAILURES = 3
+RESET = 0.5
+GOOGLE_QUOTA = 3
+
+
+def isolate(standin, workdir):
+    """Point the pipeline at the stand-ins with small limits; must run before pipeline is imported"""
+    os.environ.update(standin.environment())
+    os.environ.update({
+        'GEMINI_API_KEY': 'check', 'GOOGLE_API_KEY': 'check', 'GOOGLE_CX': 'check',
+        'API_URL': '',
+        'RETRIEVAL_CACHE_PATH': '', 'ANSWER_CACHE_PATH': '', 'ANSWER_CACHE_ENABLED': '0',
+        'CORPUS_PATH': '', 'HISTORY_PATH': '',
+        'TTL_WIKI_TA': '0', 'TTL_WIKI_EN': '0', 'TTL_GOOGLE': '0', 'TTL_NEGATIVE': '0',
+        'QUOTA_PATH': os.path.join(workdir, 'quota.sqlite'),
+        'DAILY_QUOTA_GOOGLE': str(GOOGLE_QUOTA),
+        'BREAKER_FAILURES': str(FAILURES), 'BREAKER_RESET': str(RESET),
+        'HTTP_RETRIES': '0', 'GEMINI_RETRIES': '0',
+    })
+    for name in ('DAILY_QUOTA_WIKI_TA', 'DAILY_QUOTA_WIKI_EN', 'DAILY_QUOTA_GEMINI'):
+        os.environ.pop(name, None)
+
+
+class Records(logging.Handler):
+    """Keeps the messages logged while attached"""
+
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def calls(fn, times):
+    """Call fn() `times` times; returns the exception type name (or 'ok') of each call"""
+    outcomes = []
+    for _ in range(times):
+        try:
+            fn()
+            outcomes.append('ok')
+        except Exception as e:
+            outcomes.append(type(e).__name__)
+    return outcomes
+
+
+def check_quota(pipeline, standin, checks):
+    import config
+    from resilience import DailyQuota
+
+    records = Records()
+    logging.getLogger('resilience').addHandler(records)
+    try:
+        before = standin.requests['google']
+        outcomes = calls(lambda: pipeline.search_google(QUERY), GOOGLE_QUOTA + 2)
+    finally:
+        logging.getLogger('resilience').removeHandler(records)
+    sent = standin.requests['google'] - before
+    with checks.check(f"a quota of {GOOGLE_QUOTA} lets {GOOGLE_QUOTA} calls through, then refuses"):
+        assert sent == GOOGLE_QUOTA and outcomes[GOOGLE_QUOTA:] == ['QuotaExceededError'] * 2, \
+            f"{sent} requests sent, outcomes {outcomes}"
+    warnings = [message for message in records.messages if 'quota' in message]
+    with checks.check("a spent quota is logged once as a warning"):
+        assert len(warnings) == 1, f"{len(warnings)} warnings: {warnings}"
+    used = DailyQuota(config.DAILY_QUOTAS, config.QUOTA_PATH).used('google')
+    with checks.check("quota counts persist for other processes"):
+        assert used == GOOGLE_QUOTA, f"a new DailyQuota counts {used} calls"
+
+    before = standin.requests['wiki']
+    outcomes = calls(lambda: pipeline.query_wiki_titles('ta', [QUERY]), 10)
+    sent = standin.requests['wiki'] - before
+    with checks.check("sources without a configured quota are never refused"):
+        assert sent == 10 and outcomes == ['ok'] * 10, f"{sent} requests sent, outcomes {outcomes}"
+
+
+def check_breaker(pipeline, standin, checks):
+    breaker = pipeline.get_breaker('wiki_en')
+    lookup = lambda: pipeline.query_wiki_titles('en', ["Thirukkural"])
+
+    standin.error_rates['wiki'] = 1.0
+    before = standin.requests['wiki']
+    outcomes = calls(lookup, FAILURES + 2)
+    sent = standin.requests['wiki'] - before
+    with checks.check(f"the circuit opens after {FAILURES} failures and stops calling"):
+        assert sent == FAILURES and outcomes[FAILURES:] == ['CircuitOpenError'] * 2 and breaker.state == 'open', \
+            f"{sent} requests sent, outcomes {outcomes}, state {breaker.state}"
+
+    time.sleep(RESET + 0.1)
+    before = standin.requests['wiki']
+    outcomes = calls(lookup, 2)
+    sent = standin.requests['wiki'] - before
+    with checks.check("a failed trial call reopens the circuit"):
+        assert sent == 1 and outcomes[1] == 'CircuitOpenError' and breaker.state == 'open', \
+            f"{sent} requests sent, outcomes {outcomes}, state {breaker.state}"
+
+    standin.error_rates['wiki'] = 0.0
+    time.sleep(RESET + 0.1)
+    before = standin.requests['wiki']
+    outcomes = calls(lookup, 3)
+    sent = standin.requests['wiki'] - before
+    with checks.check("a successful trial call closes the circuit"):
+        assert sent == 3 and outcomes == ['ok'] * 3 and breaker.state == 'closed', \
+            f"{sent} requests sent, outcomes {outcomes}, state {breaker.state}"
+
+
+def check_gemini_down(pipeline, standin, checks):
+    standin.error_rates['gemini'] = 1.0
+    before = standin.requests['gemini']
+    answers = [pipeline.generate_response(QUERY, bypass_cache=True) for _ in range(FAILURES + 2)]
+    sent = standin.requests['gemini'] - before
+    standin.error_rates['gemini'] = 0.0
+    degraded = [text for text, source_used, _ in answers if 'AI சேவை தற்காலிகமாக' in text and source_used]
+    with checks.check("answers fall back to the retrieved text while Gemini fails"):
+        assert len(degraded) == len(answers), f"{len(degraded)} of {len(answers)} answers fell back"
+    with checks.check("Gemini is not called while its circuit is open"):
+        assert sent == FAILURES, f"{sent} requests sent for {len(answers)} answers"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check quotas and circuit breakers against the local stand-ins")
+    parser.parse_args(argv)
+
+    from benchmarks.checks import Checks
+    from benchmarks.replay import Latency, UpstreamFixtures
+    from benchmarks.run import DEFAULT_FIXTURES
+    from benchmarks.standin import StandinServer
+
+    checks = Checks('resilience')
+    standin = StandinServer(UpstreamFixtures.load(DEFAULT_FIXTURES), Latency(0, 0, 0, 0, jitter=0)).start()
+    with tempfile.TemporaryDirectory() as workdir:
+        isolate(standin, workdir)
+        import pipeline
+
+        # Failures are expected here; only the checks' own output is of interest
+        logging.getLogger('pipeline').setLevel(logging.CRITICAL)
+        pipeline.set_error_reporter(lambda message: None)
+
+        check_quota(pipeline, standin, checks)
+        check_breaker(pipeline, standin, checks)
+        check_gemini_down(pipeline, standin, checks)
+        pipeline.get_quota()._conn.close()
+    standin.shutdown()
+    checks.finish()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""
+Reporting for the runnable checks of benchmarks/check_*.py.
+
+Each check is a block of asserts under `with checks.check(name):`. A
+failed assertion is printed with its message and the run goes on to the
+next check; finish() then exits with status 1, so the scripts can gate
+CI.
+"""
+import sys
+from contextlib import contextmanager
+
+
+class Checks:
+    """Named assert-based checks, reported as each one finishes"""
+
+    def __init__(self, subject):
+        if not __debug__:
+            sys.exit("the checks are asserts and cannot run under python -O")
+        self.subject = subject
+        self.failures = 0
+
+    @contextmanager
+    def check(self, name):
+        """Report the asserts of a with-block as one check called name"""
+        try:
+            yield
+        except AssertionError as e:
+            self.failures += 1
+            print(f"{'FAIL':<5} {name}" + (f": {e}" if str(e) else ""))
+        else:
+            print(f"{'ok':<5} {name}")
+
+    def finish(self):
+        """Exit with status 1 if any check failed"""
+        if self.failures:
+            print(f"{self.failures} {self.subject} checks failed", file=sys.stderr)
+            sys.exit(1)
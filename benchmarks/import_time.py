@@ -0,0 +1,116 @@
+"""
+Import-time budget for a cold start.
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --budget 0.5 --json imports.json
+
+The modules the Streamlit page imports before its first paint are
+imported in fresh interpreters with -X importtime, and the report lists
+the median total and the slowest imports. The run fails (exit status 1)
+when the median exceeds the budget, or when a module that is meant to be
+imported on first use only (the Gemini SDK and grpc) was loaded at
+startup.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# What app.py imports before drawing the page (streamlit itself aside)
+STARTUP_MODULES = ('config', 'api_client', 'conversation', 'pipeline', 'warmer')
+
+# Imported when the first answer needs them, never at startup
+DEFERRED_MODULES = ('google.generativeai', 'google.api_core', 'grpc')
+
+# Written to stderr before the measured imports, so the interpreter's own
+# startup imports are left out
+MARKER = '-- startup imports --'
+
+
+def measure(modules):
+    """Import modules in a fresh interpreter; returns {top-level module: seconds}
+    and the names of every module loaded"""
+    code = f"import sys; sys.stderr.write({MARKER!r} + '\\n'); import {', '.join(modules)}"
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-W', 'ignore', '-c', code],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if result.returncode:
+        raise RuntimeError(f"importing {', '.join(modules)} failed:\n{result.stderr}")
+    lines = result.stderr.split(MARKER, 1)[-1].splitlines()
+    top_level, loaded = {}, []
+    for line in lines:
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line.split('|')
+        if not cumulative.strip().isdigit():
+            continue  # the column header
+        loaded.append(name.strip())
+        # Nested imports are indented below the module that caused them
+        if not name[1:].startswith(' '):
+            top_level[name.strip()] = int(cumulative) / 1e6
+    return top_level, loaded
+
+
+def build_report(runs, deferred):
+    totals = sorted(sum(top_level.values()) for top_level, _ in runs)
+    slowest = max(runs, key=lambda run: sum(run[0].values()))[0]
+    loaded = set().union(*(set(names) for _, names in runs))
+    return {
+        'runs': len(runs),
+        'total_median': round(statistics.median(totals), 4),
+        'total_max': round(totals[-1], 4),
+        'slowest_imports': {
+            name: round(seconds, 4)
+            for name, seconds in sorted(slowest.items(), key=lambda item: -item[1])[:10]
+        },
+        'deferred_loaded': sorted(
+            name for name in deferred
+            if any(module == name or module.startswith(name + '.') for module in loaded)
+        ),
+    }
+
+
+def print_report(report, out=sys.stdout):
+    print(f"startup imports    median {report['total_median']:.3f}s, max {report['total_max']:.3f}s over {report['runs']} runs", file=out)
+    print("slowest imports                  seconds", file=out)
+    for name, seconds in report['slowest_imports'].items():
+        print(f"  {name:<30} {seconds:7.3f}", file=out)
+    if report['deferred_loaded']:
+        print(f"loaded at startup  {', '.join(report['deferred_loaded'])}", file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the import time of the page's startup modules")
+    parser.add_argument("--module", action='append', dest='modules', help="module to import (repeatable)")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters to measure")
+    parser.add_argument("--budget", type=float, default=0.5, help="allowed median import time in seconds")
+    parser.add_argument("--json", help="write the report as JSON to this file")
+    args = parser.parse_args(argv)
+
+    modules = args.modules or STARTUP_MODULES
+    runs = [measure(modules) for _ in range(args.repeat)]
+    report = build_report(runs, DEFERRED_MODULES)
+    print_report(report)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+            f.write('\n')
+
+    failures = []
+    if report['total_median'] > args.budget:
+        failures.append(f"median import time {report['total_median']:.3f}s is over the {args.budget}s budget")
+    if report['deferred_loaded']:
+        failures.append(f"imported at startup: {', '.join(report['deferred_loaded'])}")
+    if failures:
+        print("Import budget exceeded:", *failures, sep='\n  ', file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
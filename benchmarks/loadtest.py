@@ -0,0 +1,504 @@
+"""
+Load test of the Streamlit page with many simulated browser sessions.
+
+    python -m benchmarks.loadtest --sessions 100 --concurrency 20 --questions 3
+    python -m benchmarks.loadtest --sessions 500 --concurrency 50 --latency gemini_first_token=1.5 --error-rate gemini=0.05
+
+app.py is started with `streamlit run` against the local stand-ins of
+benchmarks/standin.py, so its Wikipedia, Custom Search and Gemini
+traffic gets the configured latency and failure rates. Each simulated
+session is a headless client speaking the browser's websocket protocol:
+it loads the page, then asks questions from the benchmark corpus through
+the chat input, and reads the page updates the server streams back.
+Every session is therefore a real server session, with its own script
+reruns and session state, contending for the shared caches, breaker
+and connection pools as in production. (streamlit.testing's AppTest
+cannot stand in here: it swaps process-wide state on every run, so
+concurrent AppTests break each other.)
+
+The report covers throughput, page-load, first-text and answer latency
+percentiles, answer outcomes (answered, sources shown without an
+answer, apologised, errors shown on the page, exceptions), the server's
+CPU time and memory per open session, and the upstream requests and
+injected failures. With --max-error-rate or --max-p95 the run fails
+(exit status 1) when the share of failed answers or the p95 answer
+latency is over the limit.
+"""
+import argparse
+import base64
+import json
+import os
+import random
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.run import DEFAULT_CORPUS, DEFAULT_FIXTURES, parse_latency, read_corpus
+from benchmarks.standin import parse_rate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Dummy keys for the stand-ins, given to the page as Streamlit secrets
+SECRETS = {'GEMINI_API_KEY': 'loadtest', 'GOOGLE_API_KEY': 'loadtest', 'GOOGLE_CX': 'loadtest'}
+
+# The pipeline's apologies when no answer could be generated, and the
+# notice above retrieved text shown in place of an answer while Gemini is down
+APOLOGY = 'மன்னிக்கவும்'
+DEGRADED = 'AI சேவை தற்காலிகமாக கிடைக்கவில்லை'
+
+# Class of the animation shown until the first answer text arrives
+LOADING = 'loading-dots'
+
+
+# -----------------------------
+# Streamlit server
+def server_environment(standin, answer_cache=False):
+    """Settings that point the page at the stand-ins and away from on-disk state"""
+    return dict(
+        os.environ,
+        **standin.environment(),
+        API_URL='',
+        ANSWER_CACHE_ENABLED='1' if answer_cache else '0',
+        RETRIEVAL_CACHE_PATH='',
+        ANSWER_CACHE_PATH='',
+        QUOTA_PATH='',
+        CORPUS_PATH='',
+        HISTORY_PATH='',
+        WARM_INTERVAL='0',
+    )
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(env, workdir, port, timeout=60.0):
+    """Run app.py under `streamlit run`; returns the process once it is healthy"""
+    secrets = os.path.join(workdir, 'secrets.toml')
+    with open(secrets, 'w', encoding='utf-8') as f:
+        f.writelines(f'{name} = "{value}"\n' for name, value in SECRETS.items())
+    log = open(os.path.join(workdir, 'server.log'), 'wb')
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'streamlit', 'run', 'app.py',
+         '--server.headless', 'true', '--server.address', '127.0.0.1', '--server.port', str(port),
+         '--server.fileWatcherType', 'none', '--browser.gatherUsageStats', 'false',
+         '--secrets.files', secrets],
+        cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            break
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1).close()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    with open(log.name, encoding='utf-8', errors='replace') as f:
+        raise RuntimeError(f"streamlit did not start:\n{f.read()[-2000:]}")
+
+
+def rss_bytes(pid):
+    """Resident memory of a process, or None where /proc is unavailable"""
+    try:
+        with open(f'/proc/{pid}/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+def cpu_seconds(pid):
+    """User plus system CPU time of a process, or None where /proc is unavailable"""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            # Fields after the parenthesised command name; utime and stime are 14 and 15
+            fields = f.read().rsplit(')', 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class MemorySampler:
+    """Peak resident memory of a process, sampled in the background"""
+
+    def __init__(self, pid, interval=0.1):
+        self.pid = pid
+        self.interval = interval
+        self.peak = rss_bytes(pid)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="memory-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            rss = rss_bytes(self.pid)
+            if rss is not None:
+                self.peak = max(self.peak or 0, rss)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+# -----------------------------
+# Headless browser session
+class WebSocket:
+    """Just enough of a websocket client (RFC 6455) for Streamlit's stream"""
+
+    def __init__(self, host, port, path, timeout):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        key = base64.b64encode(os.urandom(16)).decode()
+        self.sock.sendall((
+            f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\nUpgrade: websocket\r\n"
+            f"Connection: Upgrade\r\nSec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n"
+        ).encode())
+        self.buffer = b''
+        while b'\r\n\r\n' not in self.buffer:
+            self.buffer += self._recv_some()
+        head, self.buffer = self.buffer.split(b'\r\n\r\n', 1)
+        if b' 101 ' not in head.split(b'\r\n', 1)[0]:
+            raise ConnectionError(head.split(b'\r\n', 1)[0].decode(errors='replace'))
+
+    def _recv_some(self):
+        data = self.sock.recv(65536)
+        if not data:
+            raise ConnectionError("connection closed")
+        return data
+
+    def _read(self, size):
+        while len(self.buffer) < size:
+            self.buffer += self._recv_some()
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def _send_frame(self, opcode, payload):
+        # Client frames are always masked
+        mask = os.urandom(4)
+        length = len(payload)
+        if length < 126:
+            header = struct.pack('!BB', 0x80 | opcode, 0x80 | length)
+        elif length < 1 << 16:
+            header = struct.pack('!BBH', 0x80 | opcode, 0x80 | 126, length)
+        else:
+            header = struct.pack('!BBQ', 0x80 | opcode, 0x80 | 127, length)
+        masked = bytes(byte ^ mask[i % 4] for i, byte in enumerate(payload))
+        self.sock.sendall(header + mask + masked)
+
+    def send(self, payload):
+        self._send_frame(0x2, payload)
+
+    def recv(self):
+        """The next complete data message"""
+        message = b''
+        while True:
+            first, second = self._read(2)
+            opcode, length = first & 0x0F, second & 0x7F
+            if length == 126:
+                length = struct.unpack('!H', self._read(2))[0]
+            elif length == 127:
+                length = struct.unpack('!Q', self._read(8))[0]
+            payload = self._read(length)
+            if opcode == 0x8:
+                raise ConnectionError("closed by server")
+            if opcode == 0x9:
+                self._send_frame(0xA, payload)
+                continue
+            if opcode == 0xA:
+                continue
+            message += payload
+            if first & 0x80:
+                return message
+
+    def close(self):
+        try:
+            self._send_frame(0x8, struct.pack('!H', 1000))
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class Session:
+    """One simulated browser session and its timings"""
+
+    def __init__(self, port, questions, timeout, think):
+        self.port = port
+        self.questions = questions
+        self.timeout = timeout
+        self.think = think
+        self.chat_input = None
+        self.page_load = None
+        self.latencies = []
+        self.first_text = []
+        self.outcomes = Counter()
+
+    def run(self, rng, open_sessions):
+        try:
+            ws = WebSocket('127.0.0.1', self.port, '/_stcore/stream', self.timeout)
+        except OSError:
+            self.outcomes['exception'] += len(self.questions) or 1
+            return
+        with open_sessions:
+            try:
+                started = time.perf_counter()
+                if self.rerun(ws, None)['status'] != 'ok' or self.chat_input is None:
+                    self.outcomes['exception'] += len(self.questions) or 1
+                    return
+                self.page_load = time.perf_counter() - started
+                for question in self.questions:
+                    if self.think:
+                        time.sleep(rng.uniform(0, 2 * self.think))
+                    self.ask(ws, question)
+            except OSError:
+                # Everything not asked yet is lost with the connection
+                self.outcomes['exception'] += len(self.questions) - len(self.latencies)
+            finally:
+                ws.close()
+
+    def ask(self, ws, question):
+        started = time.perf_counter()
+        run = self.rerun(ws, question)
+        elapsed = time.perf_counter() - started
+        self.latencies.append(elapsed)
+        if run['first_text'] is not None:
+            self.first_text.append(run['first_text'] - started)
+        # Everything drawn after the question: the answer as it grew, its
+        # source badge and link
+        answer = '\n'.join(run['answer'])
+        if run['status'] != 'ok':
+            self.outcomes[run['status']] += 1
+        elif APOLOGY in answer:
+            self.outcomes['apology'] += 1
+        elif DEGRADED in answer:
+            self.outcomes['degraded'] += 1
+        else:
+            self.outcomes['answered'] += 1
+
+    def rerun(self, ws, question):
+        """Run the script once, with `question` in the chat input, until it finishes"""
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        message = BackMsg()
+        message.rerun_script.query_string = ''
+        if question is not None:
+            widget = message.rerun_script.widget_states.widgets.add()
+            widget.id = self.chat_input
+            # Streamlit releases before 1.4x take chat input as a string trigger
+            if 'chat_input_value' in widget.DESCRIPTOR.fields_by_name:
+                widget.chat_input_value.data = question
+            else:
+                widget.string_trigger_value.data = question
+        ws.send(message.SerializeToString())
+
+        run = {'status': 'ok', 'first_text': None, 'answer': []}
+        asked = question is None
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(ws.recv())
+            kind = forward.WhichOneof('type')
+            if kind == 'script_finished':
+                # 0 is FINISHED_SUCCESSFULLY
+                if forward.script_finished != 0 and run['status'] == 'ok':
+                    run['status'] = 'exception'
+                return run
+            if kind != 'delta' or forward.delta.WhichOneof('type') != 'new_element':
+                continue
+            element = forward.delta.new_element
+            kind = element.WhichOneof('type')
+            if kind == 'chat_input':
+                self.chat_input = element.chat_input.id
+            elif kind == 'exception':
+                run['status'] = 'exception'
+            elif kind == 'alert' and run['status'] == 'ok' and asked:
+                run['status'] = 'error_shown'
+            elif kind == 'markdown':
+                text = element.markdown.body
+                if not asked:
+                    # Past messages are drawn first; the answer follows the question
+                    asked = text == question
+                    continue
+                if LOADING in text:
+                    continue
+                if run['first_text'] is None:
+                    run['first_text'] = time.perf_counter()
+                run['answer'].append(text)
+
+
+class OpenSessions:
+    """Count of connected sessions and its peak"""
+
+    def __init__(self):
+        self.current = self.peak = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        with self._lock:
+            self.current += 1
+            self.peak = max(self.peak, self.current)
+
+    def __exit__(self, *exc):
+        with self._lock:
+            self.current -= 1
+
+
+def run_sessions(sessions, concurrency, seed):
+    """Run every session, at most `concurrency` at a time; returns the wall
+    time and the peak number of connected sessions"""
+    open_sessions = OpenSessions()
+
+    def one(item):
+        index, session = item
+        session.run(random.Random(seed + index), open_sessions)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, enumerate(sessions)))
+    return time.perf_counter() - started, open_sessions.peak
+
+
+# -----------------------------
+# Report
+def build_report(sessions, wall, peak_sessions, memory, server_cpu, standin):
+    from metrics import percentile
+
+    latencies = sorted(latency for session in sessions for latency in session.latencies)
+    first_text = sorted(latency for session in sessions for latency in session.first_text)
+    page_loads = sorted(session.page_load for session in sessions if session.page_load is not None)
+    outcomes = sum((session.outcomes for session in sessions), Counter())
+    asked = sum(outcomes.values())
+    baseline, peak = memory
+
+    def seconds(values, q):
+        return round(percentile(values, q) or 0, 4)
+
+    return {
+        'sessions': len(sessions),
+        'peak_open_sessions': peak_sessions,
+        'questions': asked,
+        'wall_seconds': round(wall, 3),
+        'throughput_qps': round(len(latencies) / wall, 3) if wall else None,
+        'page_load_p50': seconds(page_loads, 50),
+        'page_load_p95': seconds(page_loads, 95),
+        'first_text_p50': seconds(first_text, 50),
+        'first_text_p95': seconds(first_text, 95),
+        'latency_p50': seconds(latencies, 50),
+        'latency_p95': seconds(latencies, 95),
+        'latency_p99': seconds(latencies, 99),
+        'latency_max': round(latencies[-1], 4) if latencies else 0,
+        'outcomes': dict(outcomes),
+        'error_rate': round((asked - outcomes['answered']) / asked, 4) if asked else 0,
+        'server_cpu_seconds': round(server_cpu, 2) if server_cpu is not None else None,
+        'server_rss_mb': round(baseline / 2**20, 1) if baseline else None,
+        'server_rss_peak_mb': round(peak / 2**20, 1) if peak else None,
+        'rss_per_session_kb': (round((peak - baseline) / peak_sessions / 1024, 1)
+                               if baseline and peak and peak_sessions else None),
+        'upstream_requests': dict(standin.requests),
+        'upstream_failures': dict(standin.failures),
+    }
+
+
+def print_report(report, out=sys.stdout):
+    print(f"sessions           {report['sessions']} ({report['peak_open_sessions']} open at peak,"
+          f" {report['questions']} questions)", file=out)
+    print(f"throughput         {report['throughput_qps']} answers/s over {report['wall_seconds']}s", file=out)
+    print(f"page load p50/95   {report['page_load_p50']:.3f} / {report['page_load_p95']:.3f} s", file=out)
+    print(f"first text p50/95  {report['first_text_p50']:.3f} / {report['first_text_p95']:.3f} s", file=out)
+    print(f"answer p50/95/99   {report['latency_p50']:.3f} / {report['latency_p95']:.3f} / {report['latency_p99']:.3f} s"
+          f" (max {report['latency_max']:.3f})", file=out)
+    print(f"outcomes           {report['outcomes']}", file=out)
+    print(f"error rate         {report['error_rate']:.2%}", file=out)
+    if report['server_cpu_seconds'] is not None and report['wall_seconds']:
+        print(f"server cpu         {report['server_cpu_seconds']}s"
+              f" ({report['server_cpu_seconds'] / report['wall_seconds']:.0%} of one core)", file=out)
+    if report['rss_per_session_kb'] is not None:
+        print(f"server memory      {report['server_rss_mb']} MB idle, {report['server_rss_peak_mb']} MB peak,"
+              f" {report['rss_per_session_kb']} KB per open session", file=out)
+    print("upstream           requests  injected failures", file=out)
+    for name, count in sorted(report['upstream_requests'].items()):
+        print(f"  {name:<16} {count:9d} {report['upstream_failures'].get(name, 0):9d}", file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the Streamlit page against stand-in upstreams")
+    parser.add_argument("--sessions", type=int, default=50, help="simulated browser sessions")
+    parser.add_argument("--concurrency", type=int, default=10, help="sessions connected at once")
+    parser.add_argument("--questions", type=int, default=3, help="questions asked per session")
+    parser.add_argument("--think", type=float, default=0.0, help="mean pause in seconds before each question")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="file with one query per line")
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES, help="recorded upstream responses")
+    parser.add_argument("--latency", type=parse_latency, action='append', default=[],
+                        help="upstream latency in seconds: wiki=, google=, gemini_first_token=, gemini_chunk=")
+    parser.add_argument("--jitter", type=float, default=0.2, help="relative latency spread")
+    parser.add_argument("--error-rate", type=parse_rate, action='append', default=[],
+                        help="share of failing upstream requests: wiki=, google=, gemini=")
+    parser.add_argument("--answer-cache", action='store_true', help="allow cached answers")
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds to wait for the server")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the report as JSON to this file")
+    parser.add_argument("--max-error-rate", type=float, help="fail when more answers than this share fail")
+    parser.add_argument("--max-p95", type=float, help="fail when the p95 answer latency is over this")
+    args = parser.parse_args(argv)
+
+    from benchmarks.replay import Latency, UpstreamFixtures
+    from benchmarks.standin import StandinServer
+
+    standin = StandinServer(UpstreamFixtures.load(args.fixtures),
+                            Latency(jitter=args.jitter, seed=args.seed, **dict(args.latency)),
+                            dict(args.error_rate), seed=args.seed).start()
+    corpus = read_corpus(args.corpus)
+    rng = random.Random(args.seed)
+    port = free_port()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        server = start_server(server_environment(standin, args.answer_cache), workdir, port, args.timeout)
+        try:
+            # One warm-up session, so imports and shared caches are neither
+            # counted as per-session memory nor charged to the first sessions
+            Session(port, corpus[:1], args.timeout, 0).run(rng, OpenSessions())
+            standin.requests.clear()
+            standin.failures.clear()
+            sessions = [Session(port, rng.sample(corpus, min(args.questions, len(corpus))), args.timeout, args.think)
+                        for _ in range(args.sessions)]
+            baseline, cpu_before = rss_bytes(server.pid), cpu_seconds(server.pid)
+            with MemorySampler(server.pid) as sampler:
+                wall, peak_sessions = run_sessions(sessions, args.concurrency, args.seed)
+            cpu_after = cpu_seconds(server.pid)
+        finally:
+            server.terminate()
+            server.wait()
+            standin.shutdown()
+
+    server_cpu = cpu_after - cpu_before if cpu_before is not None and cpu_after is not None else None
+    report = build_report(sessions, wall, peak_sessions, (baseline, sampler.peak), server_cpu, standin)
+    print_report(report)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+            f.write('\n')
+
+    failures = []
+    if args.max_error_rate is not None and report['error_rate'] > args.max_error_rate:
+        failures.append(f"error rate {report['error_rate']:.2%} is over {args.max_error_rate:.2%}")
+    if args.max_p95 is not None and report['latency_p95'] > args.max_p95:
+        failures.append(f"p95 answer latency {report['latency_p95']:.3f}s is over {args.max_p95}s")
+    if failures:
+        print("Load test limits exceeded:", *failures, sep='\n  ', file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
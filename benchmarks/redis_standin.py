@@ -0,0 +1,160 @@
+"""
+In-memory stand-in for a Redis server, for the cache checks.
+
+    python -m benchmarks.redis_standin --port 6390
+
+It speaks RESP2 and implements the commands the cache uses, with the
+Redis semantics they rely on: GET, SET (with NX and PX), PTTL, DEL,
+EXISTS, SCAN (cursor paging with MATCH and COUNT), SELECT, AUTH, PING,
+FLUSHDB and FLUSHALL. Keys expire lazily, and each database number has
+its own keyspace. It is not a Redis replacement: there is no
+persistence, eviction or other command.
+"""
+import argparse
+import fnmatch
+import socketserver
+import threading
+import time
+from collections import Counter
+
+from resp import RespError, read_reply
+
+
+def encode_reply(value):
+    """Encode a Python value as a RESP2 reply"""
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, RespError):
+        return b"-%s\r\n" % str(value).encode('utf-8')
+    if isinstance(value, bool):
+        value = int(value)
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, str):
+        return b"+%s\r\n" % value.encode('utf-8')
+    if isinstance(value, bytes):
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+    return b"*%d\r\n" % len(value) + b"".join(encode_reply(item) for item in value)
+
+
+class RedisStandinHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        db = 0
+        while True:
+            try:
+                command = read_reply(self.rfile)
+            except (ConnectionError, ValueError):
+                return
+            name, args = command[0].decode().upper(), command[1:]
+            if name == 'SELECT':
+                db, reply = int(args[0]), 'OK'
+            else:
+                reply = self.server.execute(db, name, args)
+            self.wfile.write(encode_reply(reply))
+            self.wfile.flush()
+
+
+class RedisStandin(socketserver.ThreadingTCPServer):
+    """RESP server on a local port; `commands` counts the commands received"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port=0):
+        super().__init__(('127.0.0.1', port), RedisStandinHandler)
+        self.data = {}  # (db, key) -> (value, expires_at or None)
+        self.commands = Counter()
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"redis://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="redis-standin", daemon=True).start()
+        return self
+
+    def _live(self, db, key):
+        entry = self.data.get((db, key))
+        if entry is not None and entry[1] is not None and entry[1] <= time.time():
+            del self.data[(db, key)]
+            return None
+        return entry
+
+    def execute(self, db, name, args):
+        with self._lock:
+            self.commands[name] += 1
+            handler = getattr(self, '_' + name.lower(), None)
+            if handler is None:
+                return RespError(f"ERR unknown command '{name}'")
+            return handler(db, *args)
+
+    def _ping(self, db):
+        return 'PONG'
+
+    def _auth(self, db, *args):
+        return 'OK'
+
+    def _flushall(self, db):
+        self.data.clear()
+        return 'OK'
+
+    def _flushdb(self, db):
+        for key in [key for key in self.data if key[0] == db]:
+            del self.data[key]
+        return 'OK'
+
+    def _get(self, db, key):
+        entry = self._live(db, key)
+        return entry[0] if entry else None
+
+    def _set(self, db, key, value, *options):
+        options = [option.decode().upper() for option in options]
+        expires_at = None
+        if 'PX' in options:
+            expires_at = time.time() + int(options[options.index('PX') + 1]) / 1000
+        elif 'EX' in options:
+            expires_at = time.time() + int(options[options.index('EX') + 1])
+        if 'NX' in options and self._live(db, key):
+            return None
+        self.data[(db, key)] = (value, expires_at)
+        return 'OK'
+
+    def _pttl(self, db, key):
+        entry = self._live(db, key)
+        if entry is None:
+            return -2
+        return -1 if entry[1] is None else int((entry[1] - time.time()) * 1000)
+
+    def _del(self, db, *keys):
+        return sum(self.data.pop((db, key), None) is not None for key in keys)
+
+    def _exists(self, db, *keys):
+        return sum(self._live(db, key) is not None for key in keys)
+
+    def _scan(self, db, cursor, *options):
+        options = [option.decode() for option in options]
+        pattern = options[options.index('MATCH') + 1] if 'MATCH' in options else '*'
+        count = int(options[options.index('COUNT') + 1]) if 'COUNT' in options else 10
+        keys = sorted(key for key_db, key in list(self.data) if key_db == db and self._live(db, key))
+        start = int(cursor)
+        page = keys[start:start + count]
+        following = start + count if start + count < len(keys) else 0
+        return [str(following).encode(), [key for key in page if fnmatch.fnmatchcase(key.decode(), pattern)]]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve an in-memory stand-in for Redis")
+    parser.add_argument("--port", type=int, default=6390)
+    args = parser.parse_args(argv)
+
+    server = RedisStandin(args.port)
+    print(f"REDIS_URL={server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+"""
+Replay and recording of upstream traffic for offline benchmarks.
+
+ReplayAdapter is mounted on the pipeline's HTTP session and answers
+MediaWiki and Custom Search requests from a fixture file, sleeping for a
+configurable latency first. ReplayModel stands in for Gemini the same
+way. The Recording* variants wrap the real upstreams and fill a fixture
+file, so fixtures can be refreshed whenever network access and API keys
+are available.
+
+Wikipedia fixtures store pages and redirects rather than raw responses:
+replies are assembled per request, so changes to how the pipeline batches
+or orders its title candidates do not invalidate a recording.
+"""
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import Counter
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+
+# Query parameters that identify a caller, not a request
+SECRET_PARAMS = {'key', 'cx'}
+
+
+class UpstreamFixtures:
+    """Recorded Wikipedia pages, Custom Search results and Gemini answers"""
+
+    def __init__(self, data=None):
+        data = data or {}
+        self.wikipedia = data.get('wikipedia', {})
+        self.google = data.get('google', {})
+        self.gemini = data.get('gemini', {'answers': {}, 'default': []})
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'wikipedia': self.wikipedia, 'google': self.google, 'gemini': self.gemini},
+                      f, ensure_ascii=False, indent=2, sort_keys=True)
+            f.write('\n')
+
+    def _wiki(self, lang):
+        return self.wikipedia.setdefault(lang, {'pages': {}, 'redirects': {}})
+
+    # -----------------------------
+    # MediaWiki
+    def wiki_response(self, lang, params):
+        """Assemble an action=query reply (formatversion=2) from stored pages"""
+        wiki = self.wikipedia.get(lang, {'pages': {}, 'redirects': {}})
+        if params.get('generator') == 'links':
+            # Pages linked from the requested one; recordings carry no page views
+            title = params.get('titles', '')
+            linked = wiki['pages'].get(wiki['redirects'].get(title, title), {}).get('links', [])
+            pages = [{'ns': 0, 'title': link, 'missing': link not in wiki['pages']} for link in linked]
+            return {'batchcomplete': True, 'query': {'pages': pages}}
+        props = set(params.get('prop', '').split('|'))
+        normalized, redirects, pages, seen = [], [], [], set()
+        for title in filter(None, params.get('titles', '').split('|')):
+            target = title.replace('_', ' ').strip()
+            if lang != 'ta' and target:
+                target = target[0].upper() + target[1:]
+            if target != title:
+                normalized.append({'from': title, 'to': target})
+            if target in wiki['redirects']:
+                redirects.append({'from': target, 'to': wiki['redirects'][target]})
+                target = wiki['redirects'][target]
+            if target in seen:
+                continue
+            seen.add(target)
+            stored = wiki['pages'].get(target)
+            if stored is None:
+                pages.append({'ns': 0, 'title': target, 'missing': True})
+                continue
+            page = {'ns': 0, 'title': target}
+            if 'extracts' in props:
+                page['extract'] = stored.get('extract', '') if params.get('exintro') else stored.get('text') or stored.get('extract', '')
+            if 'info' in props:
+                page['fullurl'] = stored.get('fullurl', f"https://{lang}.wikipedia.org/wiki/{target.replace(' ', '_')}")
+            if 'links' in props:
+                page['links'] = [{'ns': 0, 'title': link} for link in stored.get('links', [])]
+            pages.append(page)
+        query = {'pages': pages}
+        if normalized:
+            query['normalized'] = normalized
+        if redirects:
+            query['redirects'] = redirects
+        return {'batchcomplete': True, 'query': query}
+
+    def record_wiki(self, lang, params, data):
+        """Store the pages and redirects found in a real action=query reply"""
+        query = data.get('query', {})
+        with self._lock:
+            wiki = self._wiki(lang)
+            if params.get('generator') == 'links':
+                title = params.get('titles', '')
+                stored = wiki['pages'].setdefault(wiki['redirects'].get(title, title), {})
+                stored['links'] = [page['title'] for page in query.get('pages', []) if not page.get('missing')]
+                return
+            for item in query.get('redirects', []):
+                wiki['redirects'][item['from']] = item['to']
+            for page in query.get('pages', []):
+                if page.get('missing') or page.get('invalid'):
+                    continue
+                stored = wiki['pages'].setdefault(page['title'], {})
+                if 'extract' in page:
+                    stored['extract' if params.get('exintro') else 'text'] = page['extract']
+                if 'fullurl' in page:
+                    stored['fullurl'] = page['fullurl']
+                if 'links' in page:
+                    stored['links'] = [link['title'] for link in page['links']]
+
+    # -----------------------------
+    # Custom Search
+    def google_response(self, params):
+        return {'items': self.google.get(params.get('q', ''), [])}
+
+    def record_google(self, params, data):
+        with self._lock:
+            self.google[params.get('q', '')] = data.get('items', [])
+
+    # -----------------------------
+    # Gemini
+    def answer_for(self, prompt):
+        """Recorded answer whose question appears in the prompt, else a stable default"""
+        answers = self.gemini.get('answers', {})
+        matches = [question for question in answers if question in prompt]
+        if matches:
+            return answers[max(matches, key=len)]
+        defaults = self.gemini.get('default') or ["பதில்"]
+        digest = int(hashlib.sha1(prompt.encode('utf-8')).hexdigest(), 16)
+        return defaults[digest % len(defaults)]
+
+    def record_answer(self, question, text):
+        with self._lock:
+            self.gemini.setdefault('answers', {})[question] = text
+
+
+def _split_request(request):
+    """(upstream, lang, params) for a prepared request"""
+    parts = urlsplit(request.url)
+    params = {name: values[-1] for name, values in parse_qs(parts.query).items()}
+    if parts.netloc.endswith('wikipedia.org'):
+        return 'wiki', parts.netloc.split('.')[0], params
+    return 'google', None, params
+
+
+def _json_response(request, data, status=200):
+    response = requests.Response()
+    response.status_code = status
+    response._content = json.dumps(data, ensure_ascii=False).encode('utf-8')
+    response.headers['Content-Type'] = 'application/json; charset=UTF-8'
+    response.encoding = 'utf-8'
+    response.url = request.url
+    response.request = request
+    return response
+
+
+class Latency:
+    """Artificial upstream latency in seconds, with +/- `jitter` spread"""
+
+    def __init__(self, wiki=0.15, google=0.3, gemini_first_token=0.8, gemini_chunk=0.05, jitter=0.2, seed=0):
+        self.values = {
+            'wiki': wiki,
+            'google': google,
+            'gemini_first_token': gemini_first_token,
+            'gemini_chunk': gemini_chunk,
+        }
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sleep(self, name):
+        base = self.values[name]
+        with self._lock:
+            spread = self._random.uniform(-self.jitter, self.jitter)
+        if base > 0:
+            time.sleep(base * (1 + spread))
+
+
+class ReplayAdapter(BaseAdapter):
+    """Transport adapter serving Wikipedia and Custom Search from fixtures"""
+
+    def __init__(self, fixtures, latency):
+        super().__init__()
+        self.fixtures = fixtures
+        self.latency = latency
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        upstream, lang, params = _split_request(request)
+        with self._lock:
+            self.calls[upstream] += 1
+        self.latency.sleep(upstream)
+        if upstream == 'wiki':
+            return _json_response(request, self.fixtures.wiki_response(lang, params))
+        return _json_response(request, self.fixtures.google_response(params))
+
+    def close(self):
+        pass
+
+
+class RecordingAdapter(HTTPAdapter):
+    """Real transport that copies every successful reply into fixtures"""
+
+    def __init__(self, fixtures, **kwargs):
+        super().__init__(**kwargs)
+        self.fixtures = fixtures
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        if response.status_code == 200:
+            upstream, lang, params = _split_request(request)
+            params = {name: value for name, value in params.items() if name not in SECRET_PARAMS}
+            if upstream == 'wiki':
+                self.fixtures.record_wiki(lang, params, response.json())
+            else:
+                self.fixtures.record_google(params, response.json())
+        return response
+
+
+class ReplayModel:
+    """Gemini stand-in streaming recorded answers with artificial latency"""
+
+    # Characters per streamed chunk
+    CHUNK_SIZE = 120
+
+    def __init__(self, fixtures, latency):
+        self.fixtures = fixtures
+        self.latency = latency
+        self.prompts = []
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        prompt = prompt if isinstance(prompt, str) else json.dumps(prompt, ensure_ascii=False, default=str)
+        with self._lock:
+            self.prompts.append(prompt)
+        text = self.fixtures.answer_for(prompt)
+        pieces = [text[i:i + self.CHUNK_SIZE] for i in range(0, len(text), self.CHUNK_SIZE)] or ['']
+        if not stream:
+            self.latency.sleep('gemini_first_token')
+            return SimpleNamespace(text=text, parts=[text])
+        return self._stream(pieces)
+
+    def _stream(self, pieces):
+        self.latency.sleep('gemini_first_token')
+        for i, piece in enumerate(pieces):
+            if i:
+                self.latency.sleep('gemini_chunk')
+            yield SimpleNamespace(text=piece, parts=[piece])
+
+
+class RecordingModel:
+    """Real model wrapper storing each full answer under the current question"""
+
+    def __init__(self, model, fixtures):
+        self.model = model
+        self.fixtures = fixtures
+        self.current_question = None
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        response = self.model.generate_content(prompt, stream=stream, **kwargs)
+        if not stream:
+            self.fixtures.record_answer(self.current_question, response.text)
+            return response
+        return self._stream(response)
+
+    def _stream(self, response):
+        parts = []
+        for chunk in response:
+            if chunk.parts:
+                parts.append(chunk.text)
+            yield chunk
+        self.fixtures.record_answer(self.current_question, ''.join(parts))
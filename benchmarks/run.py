@@ -0,0 +1,216 @@
+"""
+Offline benchmark of the answer pipeline.
+
+    python -m benchmarks.run --concurrency 4 --json bench.json
+    python -m benchmarks.run --compare bench.json --tolerance 0.15
+
+Wikipedia, Custom Search and Gemini are replayed from
+benchmarks/fixtures/upstream.json with artificial latency, so no network
+or API key is needed. generate_response is driven over the query corpus
+and the report covers throughput, p50/p95/p99 latency, HTTP calls per
+query, prompt sizes and per-stage timings. With --compare the run fails
+(exit status 1) when a tracked number is worse than the baseline by more
+than the tolerance.
+
+With --record the real upstreams are called instead (keys from the
+environment) and the fixture file is updated from their replies.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CORPUS = os.path.join(HERE, 'queries.txt')
+DEFAULT_FIXTURES = os.path.join(HERE, 'fixtures', 'upstream.json')
+
+# Numbers compared against a baseline; all are "lower is better"
+TRACKED = ('latency_p50', 'latency_p95', 'http_calls_per_query', 'prompt_chars_mean')
+
+
+def read_corpus(path):
+    with open(path, encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+
+def parse_latency(value):
+    name, _, seconds = value.partition('=')
+    try:
+        return name, float(seconds)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid latency {value!r}")
+
+
+def isolate_caches(args):
+    """Keep benchmark runs away from the app's on-disk caches.
+
+    Must run before pipeline (and therefore config) is imported.
+    """
+    os.environ['RETRIEVAL_CACHE_PATH'] = ''
+    os.environ['ANSWER_CACHE_PATH'] = ''
+    os.environ['ANSWER_CACHE_ENABLED'] = '1' if args.answer_cache else '0'
+    os.environ['QUOTA_PATH'] = ''
+    os.environ['CORPUS_PATH'] = ''
+    os.environ['DAILY_QUOTA_GOOGLE'] = '0'
+    if not args.retrieval_cache:
+        os.environ['TTL_WIKI_TA'] = os.environ['TTL_WIKI_EN'] = os.environ['TTL_GOOGLE'] = '0'
+        os.environ['TTL_NEGATIVE'] = '0'
+
+
+def run_queries(pipeline, queries, concurrency, before_query=None):
+    """Answer every query; returns per-query latencies and the wall time"""
+    latencies = []
+    lock = threading.Lock()
+
+    def one(query):
+        if before_query:
+            before_query(query)
+        started = time.perf_counter()
+        pipeline.generate_response(query)
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, queries))
+    return latencies, time.perf_counter() - started
+
+
+def build_report(latencies, wall, http_calls, prompts, stages):
+    from metrics import percentile
+
+    ordered = sorted(latencies)
+    prompt_chars = sorted(len(prompt) for prompt in prompts)
+    count = len(latencies)
+    return {
+        'queries': count,
+        'wall_seconds': round(wall, 3),
+        'throughput_qps': round(count / wall, 3) if wall else None,
+        'latency_p50': round(percentile(ordered, 50), 4),
+        'latency_p95': round(percentile(ordered, 95), 4),
+        'latency_p99': round(percentile(ordered, 99), 4),
+        'http_calls': dict(http_calls),
+        'http_calls_per_query': round(sum(http_calls.values()) / count, 3),
+        'model_calls_per_query': round(len(prompts) / count, 3),
+        'prompt_chars_mean': round(statistics.mean(prompt_chars), 1) if prompt_chars else 0,
+        'prompt_chars_p95': percentile(prompt_chars, 95) or 0,
+        'prompt_bytes_mean': round(statistics.mean(len(p.encode('utf-8')) for p in prompts), 1) if prompts else 0,
+        'stages': {
+            stage: {'p50': round(stats['p50'], 4), 'p95': round(stats['p95'], 4), 'count': stats['count']}
+            for stage, stats in stages.items()
+        },
+    }
+
+
+def print_report(report, out=sys.stdout):
+    print(f"queries            {report['queries']}", file=out)
+    print(f"throughput         {report['throughput_qps']} q/s over {report['wall_seconds']}s", file=out)
+    print(f"latency p50/95/99  {report['latency_p50']:.3f} / {report['latency_p95']:.3f} / {report['latency_p99']:.3f} s", file=out)
+    print(f"http calls/query   {report['http_calls_per_query']} {report['http_calls']}", file=out)
+    print(f"model calls/query  {report['model_calls_per_query']}", file=out)
+    print(f"prompt chars       mean {report['prompt_chars_mean']}, p95 {report['prompt_chars_p95']}", file=out)
+    print("stage                          p50 ms   p95 ms  count", file=out)
+    for stage, stats in report['stages'].items():
+        print(f"  {stage:<28} {stats['p50'] * 1000:7.1f} {stats['p95'] * 1000:8.1f} {stats['count']:6d}", file=out)
+    if report.get('source_success'):
+        print("source success rate            rate  samples", file=out)
+        for route, (rate, samples) in report['source_success'].items():
+            print(f"  {route:<28} {rate:5.2f} {samples:8d}", file=out)
+
+
+def compare(report, baseline, tolerance):
+    """Names of tracked numbers that regressed beyond the tolerance"""
+    regressions = []
+    for name in TRACKED:
+        old, new = baseline.get(name), report.get(name)
+        if old and new is not None and new > old * (1 + tolerance):
+            regressions.append(f"{name}: {old} -> {new}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the answer pipeline against recorded upstreams")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="file with one query per line")
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES, help="recorded upstream responses")
+    parser.add_argument("--concurrency", type=int, default=1, help="queries in flight at once")
+    parser.add_argument("--repeat", type=int, default=1, help="passes over the corpus")
+    parser.add_argument("--latency", type=parse_latency, action='append', default=[],
+                        help="upstream latency in seconds: wiki=, google=, gemini_first_token=, gemini_chunk=")
+    parser.add_argument("--jitter", type=float, default=0.2, help="relative latency spread")
+    parser.add_argument("--answer-cache", action='store_true', help="allow cached answers")
+    parser.add_argument("--no-retrieval-cache", dest='retrieval_cache', action='store_false',
+                        help="expire retrieval results immediately")
+    parser.add_argument("--json", help="write the report as JSON to this file")
+    parser.add_argument("--compare", help="baseline report to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative regression")
+    parser.add_argument("--record", action='store_true', help="call the real upstreams and update the fixtures")
+    args = parser.parse_args(argv)
+
+    isolate_caches(args)
+    import metrics
+    import pipeline
+    from benchmarks.replay import (Latency, RecordingAdapter, RecordingModel, ReplayAdapter, ReplayModel,
+                                   UpstreamFixtures)
+
+    queries = read_corpus(args.corpus) * args.repeat
+    fixtures = UpstreamFixtures.load(args.fixtures) if os.path.exists(args.fixtures) else UpstreamFixtures()
+    session = pipeline.get_http_session()
+
+    if args.record:
+        if not pipeline.setup_genai():
+            parser.exit(1, "GEMINI_API_KEY is required for --record\n")
+        adapter = RecordingAdapter(fixtures)
+        model = RecordingModel(pipeline.get_gemini_model(), fixtures)
+
+        def before_query(query):
+            model.current_question = query
+
+        session.mount("https://", adapter)
+        pipeline.set_model_client(model)
+        # One query at a time so each answer is stored under its question
+        run_queries(pipeline, queries, 1, before_query)
+        fixtures.save(args.fixtures)
+        print(f"Recorded fixtures for {len(queries)} queries into {args.fixtures}", file=sys.stderr)
+        return
+
+    latency = Latency(jitter=args.jitter, **dict(args.latency))
+    adapter = ReplayAdapter(fixtures, latency)
+    model = ReplayModel(fixtures, latency)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    pipeline.set_model_client(model)
+    # Custom Search is skipped without keys; the replayed one needs none
+    pipeline.set_api_keys({'google_api_key': 'benchmark', 'google_cx': 'benchmark'})
+    # Modules imported on the first answer are a cold-start cost, which
+    # benchmarks/import_time.py measures; keep them out of query latency
+    pipeline.gemini_retryable()
+    metrics.RECORDER.reset()
+
+    latencies, wall = run_queries(pipeline, queries, args.concurrency)
+    report = build_report(latencies, wall, adapter.calls, model.prompts, metrics.RECORDER.summary())
+    report['source_success'] = {
+        f"{query_class}/{source}": [round(rate, 3), samples]
+        for (query_class, source), (rate, samples) in pipeline.get_router().stats().items()
+    }
+    print_report(report)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+            f.write('\n')
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print("Regressions beyond tolerance:", *regressions, sep='\n  ', file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
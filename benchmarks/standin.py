@@ -0,0 +1,174 @@
+"""
+Local stand-in servers for Wikipedia, Custom Search and Gemini.
+
+    python -m benchmarks.standin --port 8090 --latency gemini_first_token=0.8 --error-rate google=0.05
+
+Unlike ReplayAdapter, which replaces the transport inside the process,
+these are real HTTP servers: the pipeline's connection pools, timeouts,
+retries and the Gemini SDK's REST transport all run as in production.
+Point the app at them with
+
+    WIKI_API_URL=http://127.0.0.1:8090/{lang}/w/api.php
+    GOOGLE_SEARCH_URL=http://127.0.0.1:8090/customsearch/v1
+    GEMINI_API_ENDPOINT=http://127.0.0.1:8090
+
+Replies come from the benchmark fixtures, after the configured latency.
+A configured share of requests fails instead: 500 from Wikipedia, 429
+from Custom Search and Gemini.
+"""
+import argparse
+import json
+import random
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from benchmarks.replay import Latency, UpstreamFixtures
+
+# Status of an injected failure, per upstream
+ERROR_STATUS = {'wiki': 500, 'google': 429, 'gemini': 429}
+
+# Characters per streamed Gemini chunk
+CHUNK_SIZE = 120
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps connections alive like the real services
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, data, status=200):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _fail(self, upstream):
+        status = ERROR_STATUS[upstream]
+        self._send_json({'error': {'code': status, 'message': 'injected failure',
+                                   'status': 'RESOURCE_EXHAUSTED' if status == 429 else 'INTERNAL'}}, status)
+
+    def do_GET(self):
+        server = self.server
+        parts = urlsplit(self.path)
+        params = {name: values[-1] for name, values in parse_qs(parts.query).items()}
+        prefix = parts.path.strip('/').split('/', 1)[0]
+        upstream = 'google' if prefix == 'customsearch' else 'wiki'
+        server.latency.sleep(upstream)
+        if server.should_fail(upstream):
+            return self._fail(upstream)
+        if upstream == 'google':
+            return self._send_json(server.fixtures.google_response(params))
+        self._send_json(server.fixtures.wiki_response(prefix, params))
+
+    def do_POST(self):
+        server = self.server
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        server.latency.sleep('gemini_first_token')
+        if server.should_fail('gemini'):
+            return self._fail('gemini')
+        prompt = request['contents'][-1]['parts'][0]['text']
+        text = server.fixtures.answer_for(prompt)
+        pieces = [text[i:i + CHUNK_SIZE] for i in range(0, len(text), CHUNK_SIZE)] or ['']
+        # The REST transport reads streamed answers as one JSON array,
+        # parsed element by element as it arrives
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for i, piece in enumerate(pieces):
+            if i:
+                server.latency.sleep('gemini_chunk')
+            chunk = {'candidates': [{'content': {'parts': [{'text': piece}], 'role': 'model'}, 'index': 0}]}
+            self._write_chunk(('[' if i == 0 else ',') + json.dumps(chunk, ensure_ascii=False))
+        self._write_chunk(']')
+        self.wfile.write(b'0\r\n\r\n')
+
+    def _write_chunk(self, text):
+        data = text.encode('utf-8')
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+        self.wfile.flush()
+
+
+class StandinServer(ThreadingHTTPServer):
+    """Wikipedia, Custom Search and Gemini on one local port.
+
+    `error_rates` maps 'wiki', 'google' and 'gemini' to the share of
+    requests that fail. `requests` and `failures` count per upstream.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, fixtures, latency, error_rates=None, port=0, seed=0):
+        super().__init__(('127.0.0.1', port), StandinHandler)
+        self.fixtures = fixtures
+        self.latency = latency
+        self.error_rates = dict(error_rates or {})
+        self.requests = Counter()
+        self.failures = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def environment(self):
+        """Settings that point the app's upstream calls at this server"""
+        return {
+            'WIKI_API_URL': self.base_url + "/{lang}/w/api.php",
+            'GOOGLE_SEARCH_URL': self.base_url + "/customsearch/v1",
+            'GEMINI_API_ENDPOINT': self.base_url,
+        }
+
+    def should_fail(self, upstream):
+        with self._lock:
+            self.requests[upstream] += 1
+            failed = self._random.random() < self.error_rates.get(upstream, 0.0)
+            if failed:
+                self.failures[upstream] += 1
+        return failed
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="standin", daemon=True).start()
+        return self
+
+
+def parse_rate(value):
+    name, _, rate = value.partition('=')
+    try:
+        return name, float(rate)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid rate {value!r}")
+
+
+def main(argv=None):
+    from benchmarks.run import DEFAULT_FIXTURES, parse_latency
+
+    parser = argparse.ArgumentParser(description="Serve stand-ins for Wikipedia, Custom Search and Gemini")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES, help="recorded upstream responses")
+    parser.add_argument("--latency", type=parse_latency, action='append', default=[],
+                        help="upstream latency in seconds: wiki=, google=, gemini_first_token=, gemini_chunk=")
+    parser.add_argument("--jitter", type=float, default=0.2, help="relative latency spread")
+    parser.add_argument("--error-rate", type=parse_rate, action='append', default=[],
+                        help="share of failing requests: wiki=, google=, gemini=")
+    args = parser.parse_args(argv)
+
+    server = StandinServer(UpstreamFixtures.load(args.fixtures), Latency(jitter=args.jitter, **dict(args.latency)),
+                           dict(args.error_rate), args.port)
+    for name, value in server.environment().items():
+        print(f"{name}={value}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,463 @@
+"""
+Two-tier caches for retrieval results and generated answers.
+
+Lookups are served from a bounded in-memory LRU first and from a shared
+backend second: a SQLite file (every session and process on the host,
+surviving restarts) or Redis (every replica). Backends implement get,
+set and keys over (value, expires_at) pairs, plus try_lock, locked and
+unlock, which SingleFlight uses so that identical lookups running at the
+same time share one upstream call.
+"""
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+import uuid
+from collections import OrderedDict
+
+from resp import RespClient, RespError
+from tamil_text import char_ngrams, normalize_query, similarity
+
+logger = logging.getLogger(__name__)
+
+# Returned by get() when a key is absent or expired; None is a valid
+# cached value (a lookup that found nothing)
+MISSING = object()
+
+
+def normalize_key(text):
+    """Normalise a query for use as a cache key"""
+    text = unicodedata.normalize('NFC', text)
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+class LRUCache:
+    """Thread-safe in-memory LRU map with per-entry expiry"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING, None
+            value, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return MISSING, None
+            self._entries.move_to_end(key)
+            return value, expires_at
+
+    def set(self, key, value, expires_at):
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCache:
+    """JSON values in a SQLite table, safe to share between processes"""
+
+    # Expired rows are purged and the table trimmed every this many writes
+    PRUNE_INTERVAL = 200
+
+    def __init__(self, path, max_entries):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS locks (key TEXT PRIMARY KEY, expires_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ? AND expires_at > ?",
+                (key, time.time())
+            ).fetchone()
+        if row is None:
+            return MISSING, None
+        return json.loads(row[0]), row[1]
+
+    def set(self, key, value, expires_at):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), expires_at)
+            )
+            self._writes += 1
+            if self._writes % self.PRUNE_INTERVAL == 0:
+                self._prune()
+            self._conn.commit()
+
+    def keys(self):
+        """Keys of all unexpired entries, soonest to expire first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key FROM cache WHERE expires_at > ? ORDER BY expires_at",
+                (time.time(),)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def try_lock(self, key, ttl):
+        """Take the lock on key for ttl seconds unless another process holds it"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("DELETE FROM locks WHERE key = ? AND expires_at <= ?", (key, now))
+            taken = self._conn.execute(
+                "INSERT OR IGNORE INTO locks (key, expires_at) VALUES (?, ?)", (key, now + ttl)
+            ).rowcount == 1
+            self._conn.commit()
+        return taken
+
+    def locked(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM locks WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        return row is not None
+
+    def unlock(self, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM locks WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def _prune(self):
+        self._conn.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+        self._conn.execute("DELETE FROM locks WHERE expires_at <= ?", (time.time(),))
+        self._conn.execute(
+            "DELETE FROM cache WHERE key IN ("
+            "SELECT key FROM cache ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+
+
+class RedisCache:
+    """JSON values in Redis, shared by every replica that uses the server.
+
+    Keys are prefixed with `namespace`; Redis expires entries itself, and
+    its maxmemory policy bounds the size. Network errors are logged and
+    treated as misses, so an unreachable server only costs the cache.
+    """
+
+    def __init__(self, url, namespace, timeout=2.0):
+        self.namespace = namespace
+        self.client = RespClient(url, timeout)
+        # Lock values owned by this process, so unlock never frees another's lock
+        self._tokens = {}
+
+    def _run(self, commands, default):
+        try:
+            return self.client.pipeline(commands)
+        except (OSError, RespError) as e:
+            logger.warning("Redis cache unavailable: %s", e)
+            return default
+
+    def get(self, key):
+        value, ttl_ms = self._run(
+            [('GET', self.namespace + key), ('PTTL', self.namespace + key)], (None, -2)
+        )
+        if value is None:
+            return MISSING, None
+        expires_at = time.time() + ttl_ms / 1000 if ttl_ms >= 0 else float('inf')
+        return json.loads(value), expires_at
+
+    def set(self, key, value, expires_at):
+        ttl_ms = int((expires_at - time.time()) * 1000)
+        if ttl_ms > 0:
+            self._run([('SET', self.namespace + key, json.dumps(value, ensure_ascii=False), 'PX', ttl_ms)], None)
+
+    def keys(self):
+        """Keys of all unexpired entries, soonest to expire first"""
+        keys, cursor = [], '0'
+        while True:
+            reply = self._run([('SCAN', cursor, 'MATCH', self.namespace + '*', 'COUNT', 1000)], None)
+            if reply is None:
+                return []
+            cursor, batch = reply[0]
+            keys.extend(key.decode('utf-8') for key in batch)
+            if cursor in (b'0', '0'):
+                break
+        ttls = self._run([('PTTL', key) for key in keys], [-2] * len(keys)) if keys else []
+        live = sorted((ttl, key) for ttl, key in zip(ttls, keys) if ttl != -2)
+        return [key[len(self.namespace):] for _, key in live]
+
+    def _lock_key(self, key):
+        # Outside the namespace, so keys() never sees locks
+        return f"lock:{self.namespace}{key}"
+
+    def try_lock(self, key, ttl):
+        token = uuid.uuid4().hex
+        reply = self._run([('SET', self._lock_key(key), token, 'NX', 'PX', int(ttl * 1000))], [None])
+        if reply[0] is None:
+            return False
+        self._tokens[key] = token
+        return True
+
+    def locked(self, key):
+        return bool(self._run([('EXISTS', self._lock_key(key))], [0])[0])
+
+    def unlock(self, key):
+        token = self._tokens.pop(key, None)
+        lock_key = self._lock_key(key)
+        if token is not None and self._run([('GET', lock_key)], [None])[0] == token.encode():
+            self._run([('DEL', lock_key)], None)
+
+
+def open_backend(kind, path=None, redis_url=None, namespace='', max_entries=50000):
+    """Shared tier for a cache: SQLiteCache at path, RedisCache, or None for memory only"""
+    if kind == 'redis':
+        return RedisCache(redis_url, namespace)
+    if kind not in ('sqlite', 'memory'):
+        raise ValueError(f"unknown cache backend {kind!r}")
+    return SQLiteCache(path, max_entries) if kind == 'sqlite' and path else None
+
+
+class SingleFlight:
+    """Lets one caller at a time do the work for a key.
+
+    Callers in this process wait for the leader on an event; with a shared
+    backend, a lock held there makes callers in other processes wait too
+    (polling every `poll_interval` seconds). Leadership expires after
+    `lock_ttl` seconds in case its holder dies or never releases it.
+    """
+
+    def __init__(self, shared=None, lock_ttl=30.0, poll_interval=0.05):
+        self.shared = shared
+        self.lock_ttl = lock_ttl
+        self.poll_interval = poll_interval
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, key):
+        """Whether the caller leads the work for key; leaders must release() it"""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None and flight[1] > time.monotonic():
+                return False
+            self._flights[key] = (threading.Event(), time.monotonic() + self.lock_ttl)
+        if self.shared is not None and not self.shared.try_lock(key, self.lock_ttl):
+            self._finish(key)
+            return False
+        return True
+
+    def release(self, key):
+        if self.shared is not None:
+            self.shared.unlock(key)
+        self._finish(key)
+
+    def _finish(self, key):
+        with self._lock:
+            flight = self._flights.pop(key, None)
+        if flight is not None:
+            flight[0].set()
+
+    def wait(self, key, timeout):
+        """Block until nobody leads the work for key, or timeout seconds pass"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                flight = self._flights.get(key)
+            if flight is not None and flight[1] > time.monotonic():
+                flight[0].wait(min(deadline, flight[1]) - time.monotonic())
+            elif self.shared is not None and self.shared.locked(key):
+                time.sleep(self.poll_interval)
+            else:
+                return
+
+    def run(self, key, work, lookup, timeout):
+        """work() unless another caller is doing it; then wait and return lookup().
+
+        lookup returns MISSING when the leader left nothing behind (it
+        failed or timed out), and the work is done after all.
+        """
+        if self.acquire(key):
+            try:
+                return work()
+            finally:
+                self.release(key)
+        self.wait(key, timeout)
+        value = lookup()
+        return work() if value is MISSING else value
+
+
+class RetrievalCache:
+    """Per-source lookup cache with TTLs and hit/miss counters.
+
+    `ttls` maps a source name to the lifetime of its results in seconds;
+    empty results use `negative_ttl` instead so that new pages are picked
+    up sooner. `shared` is the second tier (see open_backend); without it
+    only the in-memory tier is used. `flight` coalesces identical fetches.
+    """
+
+    def __init__(self, ttls, negative_ttl, max_entries, shared=None, lock_ttl=30.0):
+        self.ttls = ttls
+        self.negative_ttl = negative_ttl
+        self.memory = LRUCache(max_entries)
+        self.shared = shared
+        self.flight = SingleFlight(shared, lock_ttl)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def key(self, source, query):
+        return f"{source}:{normalize_key(query)}"
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, source, query):
+        """Return the cached result for a lookup, or MISSING"""
+        key = self.key(source, query)
+        value, expires_at = self.memory.get(key)
+        if value is MISSING and self.shared is not None:
+            value, expires_at = self.shared.get(key)
+            if value is not MISSING:
+                self.memory.set(key, value, expires_at)
+        self._count(value is not MISSING)
+        return value
+
+    def set(self, source, query, value):
+        """Store a lookup result; None records that nothing was found"""
+        ttl = self.ttls[source] if value else min(self.ttls[source], self.negative_ttl)
+        expires_at = time.time() + ttl
+        key = self.key(source, query)
+        self.memory.set(key, value, expires_at)
+        if self.shared is not None:
+            self.shared.set(key, value, expires_at)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+class AnswerCache:
+    """Generated answers keyed by the topic words of the question.
+
+    Questions are reduced with normalize_query, so spelling variants in
+    punctuation, spacing and politeness words share an entry. With
+    `min_similarity` set, a question whose grapheme trigrams are at least
+    that similar (Jaccard) to a cached one reuses its answer as well.
+    """
+
+    def __init__(self, ttl, max_entries, shared=None, min_similarity=None, lock_ttl=30.0):
+        self.ttl = ttl
+        self.min_similarity = min_similarity
+        self.memory = LRUCache(max_entries)
+        self.shared = shared
+        self.flight = SingleFlight(shared, lock_ttl)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Near-duplicate index: key -> n-grams and n-gram -> keys
+        self._max_indexed = max_entries
+        self._grams = OrderedDict()
+        self._postings = {}
+        if self.shared is not None and min_similarity:
+            for key in self.shared.keys()[-max_entries:]:
+                self._index(key)
+
+    def _index(self, key):
+        with self._lock:
+            if key in self._grams:
+                self._grams.move_to_end(key)
+                return
+            grams = char_ngrams(key)
+            self._grams[key] = grams
+            for gram in grams:
+                self._postings.setdefault(gram, set()).add(key)
+            while len(self._grams) > self._max_indexed:
+                self._unindex(next(iter(self._grams)))
+
+    def _unindex(self, key):
+        for gram in self._grams.pop(key, ()):
+            keys = self._postings.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._postings[gram]
+
+    def _nearest(self, key):
+        """Most similar indexed key above the similarity threshold"""
+        grams = char_ngrams(key)
+        with self._lock:
+            candidates = set()
+            for gram in grams:
+                candidates |= self._postings.get(gram, set())
+            scored = [(similarity(grams, self._grams[other]), other) for other in candidates]
+        scored = [item for item in scored if item[0] >= self.min_similarity]
+        return max(scored)[1] if scored else None
+
+    def _lookup(self, key):
+        value, expires_at = self.memory.get(key)
+        if value is MISSING and self.shared is not None:
+            value, expires_at = self.shared.get(key)
+            if value is not MISSING:
+                self.memory.set(key, value, expires_at)
+        return value
+
+    def key(self, query):
+        return normalize_query(query)
+
+    def get(self, query):
+        """Return the cached (response_text, source_used, wiki_url), or MISSING"""
+        key = self.key(query)
+        value = self._lookup(key)
+        if value is MISSING and self.min_similarity:
+            nearest = self._nearest(key)
+            if nearest is not None:
+                value = self._lookup(nearest)
+                if value is MISSING:
+                    with self._lock:
+                        self._unindex(nearest)
+        with self._lock:
+            if value is MISSING:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value if value is MISSING else tuple(value)
+
+    def expires_at(self, query):
+        """Expiry time of the cached answer to exactly this question, or None"""
+        key = self.key(query)
+        value, expires_at = self.memory.get(key)
+        if value is MISSING and self.shared is not None:
+            value, expires_at = self.shared.get(key)
+        return None if value is MISSING else expires_at
+
+    def set(self, query, answer):
+        """Store a (response_text, source_used, wiki_url) answer"""
+        key = self.key(query)
+        expires_at = time.time() + self.ttl
+        self.memory.set(key, list(answer), expires_at)
+        if self.shared is not None:
+            self.shared.set(key, list(answer), expires_at)
+        if self.min_similarity:
+            self._index(key)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,281 @@
+"""
+Runtime settings for the Tamil AI assistant.
+
+Every value can be overridden with an environment variable of the same
+name; a local .env file is loaded first if present.
+"""
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _get_int(name, default):
+    """Read an integer setting from the environment"""
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def _get_float(name, default):
+    """Read a float setting from the environment"""
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+# -----------------------------
+# Concurrent retrieval
+RETRIEVAL_WORKERS = _get_int("RETRIEVAL_WORKERS", 12)
+
+# Seconds each source may take, measured from the start of retrieval
+RETRIEVAL_DEADLINES = {
+    'wiki_ta': _get_float("DEADLINE_WIKI_TA", 8.0),
+    'wiki_en': _get_float("DEADLINE_WIKI_EN", 8.0),
+    'google': _get_float("DEADLINE_GOOGLE", 10.0),
+}
+
+# Wikipedia content shorter than this also pulls in Google results
+MIN_WIKI_CONTENT = _get_int("MIN_WIKI_CONTENT", 300)
+
+# -----------------------------
+# Query routing
+# A source is skipped for a query class once it has at least
+# ROUTER_MIN_SAMPLES outcomes among its last ROUTER_WINDOW lookups for
+# that class and fewer than ROUTER_MIN_SUCCESS of them found anything...
+ROUTER_WINDOW = _get_int("ROUTER_WINDOW", 200)
+ROUTER_MIN_SAMPLES = _get_int("ROUTER_MIN_SAMPLES", 20)
+ROUTER_MIN_SUCCESS = _get_float("ROUTER_MIN_SUCCESS", 0.05)
+
+# ...except on every Nth query of the class, which tries every source
+ROUTER_EXPLORE_EVERY = _get_int("ROUTER_EXPLORE_EVERY", 10)
+
+# -----------------------------
+# Shared cache backend
+# Second cache tier behind each process's in-memory LRU: "sqlite" (the
+# *_CACHE_PATH files, shared on one host), "redis" (REDIS_URL, shared by
+# every replica) or "memory" (no second tier)
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "sqlite")
+REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+
+# Seconds an identical lookup or question waits for the one already in
+# flight (in any session, or any process sharing the backend) before
+# doing the work itself
+SINGLE_FLIGHT_TIMEOUT = _get_float("SINGLE_FLIGHT_TIMEOUT", 30)
+
+# -----------------------------
+# Retrieval cache
+RETRIEVAL_CACHE_SIZE = _get_int("RETRIEVAL_CACHE_SIZE", 1024)
+
+# SQLite file shared by restarts and sessions; set to "" for memory only
+RETRIEVAL_CACHE_PATH = os.environ.get("RETRIEVAL_CACHE_PATH", ".cache/retrieval.sqlite")
+RETRIEVAL_CACHE_DISK_ENTRIES = _get_int("RETRIEVAL_CACHE_DISK_ENTRIES", 50000)
+
+# Seconds a result stays fresh, per source
+RETRIEVAL_TTLS = {
+    'wiki_ta': _get_float("TTL_WIKI_TA", 7 * 24 * 3600),
+    'wiki_en': _get_float("TTL_WIKI_EN", 7 * 24 * 3600),
+    'google': _get_float("TTL_GOOGLE", 24 * 3600),
+}
+
+# Lookups that found nothing are retried sooner
+RETRIEVAL_NEGATIVE_TTL = _get_float("TTL_NEGATIVE", 3600)
+
+# -----------------------------
+# Local search corpus
+# SQLite full-text index of every Wikipedia summary and Custom Search
+# result fetched so far; set to "" to disable it
+CORPUS_PATH = os.environ.get("CORPUS_PATH", ".cache/corpus.sqlite")
+CORPUS_MAX_DOCUMENTS = _get_int("CORPUS_MAX_DOCUMENTS", 100000)
+CORPUS_MAX_AGE = _get_float("CORPUS_MAX_AGE", 90 * 24 * 3600)
+
+# Stored search results that must contain every topic word of a question
+# before they stand in for a live Custom Search; 0 always searches live
+CORPUS_MIN_HITS = _get_int("CORPUS_MIN_HITS", 2)
+
+# -----------------------------
+# Answer cache in front of Gemini
+ANSWER_CACHE_ENABLED = os.environ.get("ANSWER_CACHE_ENABLED", "1") != "0"
+ANSWER_CACHE_SIZE = _get_int("ANSWER_CACHE_SIZE", 512)
+ANSWER_CACHE_PATH = os.environ.get("ANSWER_CACHE_PATH", ".cache/answers.sqlite")
+
+# Seconds a generated answer is served before Gemini is asked again
+ANSWER_CACHE_TTL = _get_float("ANSWER_CACHE_TTL", 6 * 3600)
+
+# Trigram similarity for reusing the answer to a near-identical question;
+# 0 (the default) only reuses answers to identical normalised questions
+ANSWER_CACHE_SIMILARITY = _get_float("ANSWER_CACHE_SIMILARITY", 0)
+
+# -----------------------------
+# Model ladder
+# Gemini models tried in order, comma-separated; the next one is asked
+# only when an answer is empty, not in Tamil, or says no accurate
+# information was found although sources were
+MODEL_LADDER = tuple(
+    name.strip() for name in os.environ.get("MODEL_LADDER", "gemini-1.5-flash,gemini-1.5-pro").split(",")
+    if name.strip()
+) or ("gemini-1.5-flash",)
+
+# Output tokens allowed per query class (see router.py)
+OUTPUT_TOKENS = {
+    'greeting': _get_int("OUTPUT_TOKENS_GREETING", 256),
+    'known_topic': _get_int("OUTPUT_TOKENS_KNOWN_TOPIC", 2048),
+    'english_entity': _get_int("OUTPUT_TOKENS_ENGLISH_ENTITY", 2048),
+    'long_tail': _get_int("OUTPUT_TOKENS_LONG_TAIL", 3000),
+}
+
+# Characters of an answer held back and checked before they are shown;
+# 0 checks only the first streamed chunk, so time to first token is
+# unchanged. A single model in MODEL_LADDER never escalates
+ESCALATION_PEEK_CHARS = _get_int("ESCALATION_PEEK_CHARS", 0)
+
+# -----------------------------
+# Prompt context
+# Estimated tokens of retrieved text sent to Gemini with each question
+CONTEXT_TOKEN_BUDGET = _get_int("CONTEXT_TOKEN_BUDGET", 1200)
+
+# Characters per ranked passage when splitting retrieved pages
+CONTEXT_PASSAGE_CHARS = _get_int("CONTEXT_PASSAGE_CHARS", 500)
+
+# Fetch the whole Wikipedia article instead of its introduction; the
+# passage ranking then picks the sections that match the question
+WIKI_FULL_PAGES = os.environ.get("WIKI_FULL_PAGES", "0") != "0"
+WIKI_PAGE_CHARS = _get_int("WIKI_PAGE_CHARS", 20000)
+
+# -----------------------------
+# Conversation memory
+# Recent turns sent verbatim with a question; older turns are folded
+# into a rolling summary of at most CONVERSATION_SUMMARY_CHARS
+CONVERSATION_TURNS = _get_int("CONVERSATION_TURNS", 4)
+CONVERSATION_SUMMARY_CHARS = _get_int("CONVERSATION_SUMMARY_CHARS", 1500)
+
+# Estimated tokens of conversation history added to a prompt
+HISTORY_TOKEN_BUDGET = _get_int("HISTORY_TOKEN_BUDGET", 600)
+
+# -----------------------------
+# Chat history
+# Append-only SQLite store of every session's messages; set to "" to
+# keep them in memory only
+HISTORY_PATH = os.environ.get("HISTORY_PATH", ".cache/history.sqlite")
+
+# Messages shown per page; "load earlier" adds another page
+HISTORY_PAGE_SIZE = _get_int("HISTORY_PAGE_SIZE", 20)
+
+# Seconds after its last message before a session is deleted
+HISTORY_MAX_AGE = _get_float("HISTORY_MAX_AGE", 30 * 24 * 3600)
+
+# -----------------------------
+# Response display
+# Render Gemini output chunk by chunk instead of waiting for the full answer
+STREAM_RESPONSES = os.environ.get("STREAM_RESPONSES", "1") != "0"
+
+# -----------------------------
+# HTTP API
+# Base URL of an api.py service such as http://localhost:8000; when set,
+# the Streamlit page sends questions there instead of answering them itself
+API_URL = os.environ.get("API_URL", "").rstrip("/")
+
+# Seconds the page waits for the service to connect and for each chunk
+API_TIMEOUT = _get_float("API_TIMEOUT", 60.0)
+
+# -----------------------------
+# Shared HTTP session for Wikipedia and Google
+# Keep-alive connections kept per host; size it for concurrent lookups
+HTTP_POOL_SIZE = _get_int("HTTP_POOL_SIZE", 20)
+
+# Retries for connection errors and 429/5xx responses, with exponential
+# backoff starting at HTTP_BACKOFF seconds plus up to that much jitter
+HTTP_RETRIES = _get_int("HTTP_RETRIES", 2)
+HTTP_BACKOFF = _get_float("HTTP_BACKOFF", 0.5)
+
+# -----------------------------
+# Upstream endpoints; point them at a local stand-in server for testing.
+# {lang} in WIKI_API_URL is replaced by the Wikipedia language code
+WIKI_API_URL = os.environ.get("WIKI_API_URL", "https://{lang}.wikipedia.org/w/api.php")
+GOOGLE_SEARCH_URL = os.environ.get("GOOGLE_SEARCH_URL", "https://www.googleapis.com/customsearch/v1")
+
+# Gemini API host such as http://localhost:8080; when set, Gemini is
+# called over REST instead of gRPC
+GEMINI_API_ENDPOINT = os.environ.get("GEMINI_API_ENDPOINT", "")
+
+# -----------------------------
+# Upstream protection
+# Calls per day before a source is skipped until the quota resets
+# (midnight in QUOTA_TIMEZONE); 0 means unlimited. Set
+# DAILY_QUOTA_GOOGLE=100 on the free Custom Search tier
+DAILY_QUOTAS = {
+    'wiki_ta': _get_int("DAILY_QUOTA_WIKI_TA", 0),
+    'wiki_en': _get_int("DAILY_QUOTA_WIKI_EN", 0),
+    'google': _get_int("DAILY_QUOTA_GOOGLE", 0),
+    'gemini': _get_int("DAILY_QUOTA_GEMINI", 0),
+}
+QUOTA_PATH = os.environ.get("QUOTA_PATH", ".cache/quota.sqlite")
+QUOTA_TIMEZONE = os.environ.get("QUOTA_TIMEZONE", "America/Los_Angeles")
+
+# Consecutive failures that open a source's circuit, and seconds before
+# a trial call is let through again
+BREAKER_FAILURES = _get_int("BREAKER_FAILURES", 5)
+BREAKER_RESET = _get_float("BREAKER_RESET", 30)
+
+# Retries of a Gemini request rejected with 429 or 5xx, with jittered
+# exponential backoff starting at GEMINI_BACKOFF seconds
+GEMINI_RETRIES = _get_int("GEMINI_RETRIES", 2)
+GEMINI_BACKOFF = _get_float("GEMINI_BACKOFF", 1.0)
+
+# -----------------------------
+# Offline Wikipedia
+# SQLite index built by wiki_dump.py; when set, Tamil Wikipedia lookups
+# are answered locally instead of through the MediaWiki API
+WIKI_DUMP_INDEX = os.environ.get("WIKI_DUMP_INDEX", "")
+# Index whose alias table (title and redirect spellings) adds candidate
+# titles to every Tamil lookup; also used with the live API
+WIKI_ALIAS_INDEX = os.environ.get("WIKI_ALIAS_INDEX", WIKI_DUMP_INDEX)
+
+# -----------------------------
+# Background warming
+# Questions offered as buttons on an empty chat; always kept warm
+QUICK_ACTIONS = (
+    "திருக்குறள் பற்றி",
+    "சங்க இலக்கியம்",
+    "சோழர் வரலாறு",
+    "தமிழ் எழுத்துகள்",
+    "சிலப்பதிகாரம்",
+    "பல்லவர் கட்டிடக்கலை",
+)
+
+# Topics kept answered in the cache besides the quick actions (comma separated)
+HOT_TOPICS = tuple(
+    topic.strip()
+    for topic in os.environ.get("HOT_TOPICS", "திருவள்ளுவர்,தொல்காப்பியம்,மணிமேகலை,பாண்டியர்,சேரர்").split(",")
+    if topic.strip()
+)
+
+# Seconds between warming rounds; answers that would expire before the
+# next round are regenerated. 0 disables the warmer
+WARM_INTERVAL = _get_float("WARM_INTERVAL", 1800)
+
+# Wikipedia pages linked from an answer's article that are fetched ahead
+# of the user's next question; 0 disables the prefetch
+PREFETCH_LINKS = _get_int("PREFETCH_LINKS", 5)
+
+# -----------------------------
+# Client-side rate limits in calls per second; 0 means unlimited
+RATE_LIMITS = {
+    'wiki_ta': _get_float("RATE_LIMIT_WIKI_TA", 0),
+    'wiki_en': _get_float("RATE_LIMIT_WIKI_EN", 0),
+    'google': _get_float("RATE_LIMIT_GOOGLE", 0),
+    'gemini': _get_float("RATE_LIMIT_GEMINI", 0),
+}
+
+# -----------------------------
+# Latency metrics
+# Recent samples kept per stage for the p50/p95 readout
+METRICS_WINDOW = _get_int("METRICS_WINDOW", 1000)
+
+# Optional sinks: a JSON line per timed stage, and a Prometheus
+# text-format file for a node exporter textfile collector
+METRICS_LOG = os.environ.get("METRICS_LOG", "")
+METRICS_PROM_FILE = os.environ.get("METRICS_PROM_FILE", "")
@@ -0,0 +1,190 @@
+"""
+Prompt context built from retrieved pages within a token budget.
+
+Retrieved text is split into passages, the passages are ranked against
+the question with BM25 over grapheme n-grams (Tamil words inflect too
+much for whole-word matching to work on short texts), and the best ones
+are kept until the budget is spent. Every cut falls on a grapheme
+boundary, so a vowel sign is never separated from its consonant.
+"""
+import math
+import re
+from collections import Counter
+from functools import lru_cache
+
+from tamil_text import graphemes, normalize_query, tokenize
+
+# Rough characters per Gemini token. Tamil script splits into more
+# tokens than English; the estimate is meant to err on the high side
+TAMIL_CHARS_PER_TOKEN = 3.0
+LATIN_CHARS_PER_TOKEN = 4.0
+
+# Fewer tokens than this left in the budget are not worth a cut passage
+MIN_PARTIAL_TOKENS = 40
+
+SENTENCE_END = re.compile(r'[.!?।]\s+')
+
+
+@lru_cache(maxsize=4096)
+def estimate_tokens(text):
+    """Approximate Gemini token count of a text without an API call"""
+    latin = sum(1 for ch in text if ord(ch) < 0x80)
+    other = len(text) - latin
+    return math.ceil(latin / LATIN_CHARS_PER_TOKEN + other / TAMIL_CHARS_PER_TOKEN)
+
+
+def truncate(text, max_chars):
+    """Cut text to at most max_chars, ending on a grapheme boundary.
+
+    A sentence or word end near the limit is preferred over a cut
+    inside a word.
+    """
+    if len(text) <= max_chars:
+        return text
+    kept, size = [], 0
+    for cluster in graphemes(text):
+        if size + len(cluster) > max_chars:
+            break
+        kept.append(cluster)
+        size += len(cluster)
+    cut = ''.join(kept)
+    for boundary in ('. ', '\n', ' '):
+        position = cut.rfind(boundary)
+        if position >= max_chars // 2:
+            return cut[:position + 1].rstrip()
+    return cut
+
+
+def truncate_tokens(text, max_tokens):
+    """Cut text so that its estimated token count fits max_tokens"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    # Shrink in proportion to the overshoot until the estimate fits
+    max_chars = len(text)
+    while max_chars > 0:
+        max_chars = int(max_chars * max_tokens / estimate_tokens(text[:max_chars])) - 1
+        candidate = truncate(text, max_chars)
+        if estimate_tokens(candidate) <= max_tokens:
+            return candidate
+    return ''
+
+
+def split_sentences(text):
+    """Split text after sentence-ending punctuation.
+
+    Dotted abbreviations such as கி.மு. and கி.பி. (a word with another
+    dot inside it) do not end a sentence.
+    """
+    sentences, start = [], 0
+    for match in SENTENCE_END.finditer(text):
+        words = text[start:match.start()].split()
+        if words and '.' in words[-1]:
+            continue
+        sentences.append(text[start:match.start() + 1])
+        start = match.end()
+    sentences.append(text[start:])
+    return [sentence for sentence in sentences if sentence]
+
+
+def split_passages(text, max_chars):
+    """Split text into passages of about max_chars along paragraph and sentence ends"""
+    max_chars = max(1, max_chars)
+    pieces = []
+    for paragraph in text.split('\n'):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) <= max_chars:
+            pieces.append((paragraph, '\n'))
+            continue
+        joiner = '\n'
+        for sentence in split_sentences(paragraph):
+            while len(sentence) > max_chars:
+                # A letter longer than the limit is kept whole
+                head = truncate(sentence, max_chars) or graphemes(sentence)[0]
+                pieces.append((head, joiner))
+                sentence = sentence[len(head):].lstrip()
+                joiner = ' '
+            if sentence:
+                pieces.append((sentence, joiner))
+            joiner = ' '
+
+    # Merge neighbouring short pieces back up to the passage size, keeping
+    # line breaks between what were separate lines
+    passages = []
+    for piece, joiner in pieces:
+        if passages and len(passages[-1]) + 1 + len(piece) <= max_chars:
+            passages[-1] += joiner + piece
+        else:
+            passages.append(piece)
+    return passages
+
+
+def ngram_terms(text, n=3):
+    """Grapheme n-grams of every word in text, with repeats"""
+    terms = []
+    for word in tokenize(text):
+        clusters = [' '] + graphemes(word) + [' ']
+        if len(clusters) <= n:
+            terms.append(''.join(clusters))
+        else:
+            terms.extend(''.join(clusters[i:i + n]) for i in range(len(clusters) - n + 1))
+    return terms
+
+
+def bm25_scores(query, passages, k1=1.2, b=0.75):
+    """BM25 score of every passage for the query, over grapheme n-grams"""
+    query_terms = set(ngram_terms(normalize_query(query)))
+    documents = [Counter(ngram_terms(passage)) for passage in passages]
+    if not documents or not query_terms:
+        return [0.0] * len(passages)
+
+    average_length = sum(sum(doc.values()) for doc in documents) / len(documents) or 1
+    frequencies = Counter(term for doc in documents for term in query_terms if term in doc)
+    scores = []
+    for doc in documents:
+        length = sum(doc.values())
+        score = 0.0
+        for term in query_terms:
+            count = doc.get(term)
+            if not count:
+                continue
+            idf = math.log(1 + (len(documents) - frequencies[term] + 0.5) / (frequencies[term] + 0.5))
+            score += idf * count * (k1 + 1) / (count + k1 * (1 - b + b * length / average_length))
+        scores.append(score)
+    return scores
+
+
+def select_passages(query, documents, budget, passage_chars):
+    """Choose the passages of each document that go into the prompt.
+
+    documents is a list of texts in priority order. The opening passage
+    of each document comes first (it names and defines the subject),
+    then the remaining passages by BM25 score, as long as the estimated
+    tokens stay within budget. Returns one text per document with its
+    chosen passages in their original order ('' when none fit).
+    """
+    passages = [(index, position, passage)
+                for index, text in enumerate(documents)
+                for position, passage in enumerate(split_passages(text or '', passage_chars))]
+    scores = bm25_scores(query, [passage for _, _, passage in passages])
+    ranked = sorted(
+        zip(passages, scores),
+        key=lambda item: (0, item[0][0]) if item[0][1] == 0 else (1, -item[1])
+    )
+
+    chosen, remaining = [], budget
+    for (index, position, passage), _ in ranked:
+        tokens = estimate_tokens(passage)
+        if tokens > remaining:
+            if remaining < MIN_PARTIAL_TOKENS:
+                continue
+            passage = truncate_tokens(passage, remaining)
+            if not passage:
+                continue
+            tokens = estimate_tokens(passage)
+        chosen.append((index, position, passage))
+        remaining -= tokens
+
+    chosen.sort()
+    return ['\n\n'.join(passage for i, _, passage in chosen if i == index) for index in range(len(documents))]
@@ -0,0 +1,148 @@
+"""
+Bounded memory of a chat session for follow-up questions.
+
+The last few turns are kept verbatim; older turns are folded into a
+rolling summary of one line each (the question and the first sentence of
+its answer), and the summary is trimmed from the front once it reaches
+its size limit, so a session's memory stays the same size however long
+it runs. Follow-ups that point back at the previous topic with a pronoun
+("அவருடைய காலம் என்ன?") and name no topic of their own are retrieved
+with the previous topic in place of the pronoun.
+"""
+import re
+from collections import deque
+
+from context import estimate_tokens, split_sentences, truncate, truncate_tokens
+from tamil_text import stem, tokenize, topic_words
+
+# Pronouns that refer back to an earlier subject. Bare demonstratives
+# ("இந்த ஆண்டு", "அந்த காலத்தில்", "it is") are left out: they rarely do
+ANAPHORA = {
+    'அவர்', 'அவருடைய', 'அவரது', 'அவரின்', 'அவருக்கு', 'அவரை', 'அவரால்',
+    'அவள்', 'அவளுடைய', 'அவளது', 'அவன்', 'அவனுடைய', 'அவனது',
+    'இவர்', 'இவருடைய', 'இவரது', 'இவரின்', 'இவருக்கு', 'இவரை',
+    'அவர்கள்', 'அவர்களுடைய', 'அவர்களது', 'அவர்களின்', 'இவர்கள்', 'இவர்களின்',
+    'அது', 'அதன்', 'அதனுடைய', 'அதை', 'அதற்கு', 'அதில்', 'அதனால்',
+    'இது', 'இதன்', 'இதனுடைய', 'இதை', 'இதற்கு', 'இதில்',
+    'அவை', 'அவற்றின்', 'இவை', 'இவற்றின்',
+    'he', 'she', 'they', 'his', 'her', 'their', 'him', 'them',
+}
+
+# Openers that continue the previous topic ("இன்னும் சொல்லுங்கள்")
+CONTINUATIONS = {'மேலும்', 'இன்னும்', 'வேறு', 'அடுத்து', 'more', 'also'}
+
+# Words that ask about an aspect of the subject rather than name a new
+# one; the subject's own article answers them ("அவர் பிறந்த ஊர் எது?")
+ASPECT_WORDS = {
+    'காலம்', 'வயது', 'பிறப்பு', 'பிறந்த', 'பிறந்தார்', 'இறப்பு', 'இறந்த', 'இறந்தார்', 'மரணம்',
+    'ஊர்', 'இடம்', 'பெயர்', 'வாழ்க்கை', 'குடும்பம்', 'வரலாறு', 'சிறப்பு', 'சிறப்புகள்',
+    'முக்கியத்துவம்', 'பங்களிப்பு', 'படைப்பு', 'படைப்புகள்', 'நூல்', 'நூல்கள்', 'எழுதிய',
+    'ஆசிரியர்', 'எழுதியவர்', 'தலைநகர்', 'தலைநகரம்', 'பொருள்', 'அர்த்தம்',
+    'author', 'capital', 'meaning',
+    'period', 'age', 'born', 'birth', 'died', 'death', 'life', 'family', 'history',
+    'works', 'wrote', 'written', 'famous', 'known', 'for', 'importance',
+}
+
+# Answers are stored at most this long before they are summarised
+TURN_ANSWER_CHARS = 600
+
+
+def first_sentence(text):
+    """First sentence of an answer's body, without markdown markup"""
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    # Headings only name the topic; use one only when nothing else is there
+    body = [line for line in lines if not line.startswith('#')] or lines
+    for line in body:
+        line = re.sub(r'^[#>*\-\s]+', '', line).replace('**', '').strip()
+        if line:
+            return split_sentences(line)[0]
+    return ''
+
+
+def own_words(words):
+    """Words of a question other than its pointers back to an earlier turn"""
+    return [word for word in words if word not in ANAPHORA and word not in CONTINUATIONS]
+
+
+class Conversation:
+    """Rolling summary plus the last `max_turns` question/answer pairs"""
+
+    def __init__(self, max_turns=4, summary_chars=1500):
+        self.summary_chars = summary_chars
+        self.turns = deque(maxlen=max_turns)
+        self.summary = deque()
+        self.topic = None
+        self.turn_count = 0
+
+    def is_followup(self, query):
+        """Whether a question points back at the previous topic and names
+        no topic of its own"""
+        if not self.topic:
+            return False
+        words = tokenize(query)
+        if not any(word in ANAPHORA for word in words) and not (words and words[0] in CONTINUATIONS):
+            return False
+        own = topic_words(' '.join(own_words(words)), fallback=False)
+        return not [word for word in own if word not in ASPECT_WORDS and stem(word) not in ASPECT_WORDS]
+
+    def standalone_query(self, query):
+        """The query to retrieve sources for: for a follow-up, the previous
+        topic with the question's own words other than aspects"""
+        if not self.is_followup(query):
+            return query
+        words = [word for word in own_words(tokenize(query))
+                 if word not in ASPECT_WORDS and stem(word) not in ASPECT_WORDS]
+        return ' '.join([self.topic] + words)
+
+    def add_turn(self, question, answer):
+        """Remember an answered question, summarising the oldest turn if full"""
+        if not self.is_followup(question):
+            self.topic = ' '.join(topic_words(question)) or None
+        if len(self.turns) == self.turns.maxlen:
+            old_question, old_answer = self.turns[0]
+            self.summary.append(f"- {old_question}: {first_sentence(old_answer)}")
+            self._trim_summary()
+        self.turns.append((question, truncate(answer, TURN_ANSWER_CHARS)))
+        self.turn_count += 1
+
+    def _trim_summary(self):
+        while self.summary and sum(len(line) + 1 for line in self.summary) > self.summary_chars:
+            self.summary.popleft()
+
+    def context_text(self, max_tokens):
+        """Summary and recent turns for the prompt, oldest parts cut first"""
+        parts = []
+        if self.summary:
+            parts.append("முந்தைய உரையாடல் சுருக்கம்:\n" + "\n".join(self.summary))
+        for question, answer in self.turns:
+            parts.append(f"கேள்வி: {question}\nபதில்: {answer}")
+        while len(parts) > 1 and estimate_tokens("\n\n".join(parts)) > max_tokens:
+            parts.pop(0)
+        return truncate_tokens("\n\n".join(parts), max_tokens)
+
+    def to_dict(self):
+        """JSON-serialisable state, for sending a conversation to the API"""
+        return {
+            'turns': [list(turn) for turn in self.turns],
+            'summary': list(self.summary),
+            'topic': self.topic,
+            'turn_count': self.turn_count,
+        }
+
+    @classmethod
+    def from_dict(cls, data, max_turns=4, summary_chars=1500):
+        """Rebuild a conversation from to_dict(), within this side's limits"""
+        conversation = cls(max_turns, summary_chars)
+        for question, answer in data.get('turns', [])[-max_turns:]:
+            conversation.turns.append((str(question), truncate(str(answer), TURN_ANSWER_CHARS)))
+        conversation.summary.extend(str(line) for line in data.get('summary', []))
+        conversation._trim_summary()
+        conversation.topic = data.get('topic') or None
+        conversation.turn_count = int(data.get('turn_count', len(conversation.turns)))
+        return conversation
+
+    def clear(self):
+        self.turns.clear()
+        self.summary.clear()
+        self.topic = None
+        self.turn_count = 0
@@ -0,0 +1,130 @@
+"""
+Local full-text corpus of everything the sources have returned.
+
+Every Wikipedia summary and every Custom Search result that is fetched
+is added to a SQLite FTS5 index (Tamil words kept whole by
+FTS_TOKENIZER), replacing the earlier copy of the same URL. A search
+requires the topic words of the question (see tamil_text.topic_words),
+not its question words or English function words. Tamil adds case and
+plural endings to a stem, so topic words are matched as prefixes:
+"சோழர்" finds "சோழர்களின்". Once the corpus holds enough
+documents on a topic, it answers the Google slot of a question without
+a paid Custom Search call.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+from tamil_text import FTS_TOKENIZER, FUNCTION_WORDS, graphemes, topic_words
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY, source TEXT NOT NULL, title TEXT NOT NULL,
+    url TEXT UNIQUE NOT NULL, text TEXT NOT NULL, fetched_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS documents_fetched ON documents (fetched_at);
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+    title, text, content='documents', content_rowid='id', tokenize="{FTS_TOKENIZER}"
+);
+CREATE TRIGGER IF NOT EXISTS documents_ai AFTER INSERT ON documents BEGIN
+    INSERT INTO documents_fts (rowid, title, text) VALUES (new.id, new.title, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS documents_ad AFTER DELETE ON documents BEGIN
+    INSERT INTO documents_fts (documents_fts, rowid, title, text) VALUES ('delete', old.id, old.title, old.text);
+END;
+"""
+
+# Words shorter than this (in letters) must match whole; longer ones
+# also match with any ending
+PREFIX_MIN_LETTERS = 3
+
+
+def match_expression(query):
+    """FTS5 expression requiring every topic word of query, or None"""
+    words = topic_words(query)
+    terms = []
+    for word in [word for word in words if word not in FUNCTION_WORDS] or words:
+        phrase = '"' + word.replace('"', '""') + '"'
+        terms.append(phrase + '*' if len(graphemes(word)) >= PREFIX_MIN_LETTERS else phrase)
+    return ' AND '.join(terms) or None
+
+
+class LocalCorpus:
+    """Incrementally updated search index over fetched documents.
+
+    Documents older than `max_age` seconds are not returned, and the
+    oldest are deleted once there are more than `max_documents`.
+    """
+
+    # Old documents are pruned every this many additions
+    PRUNE_INTERVAL = 500
+
+    def __init__(self, path, max_documents=100000, max_age=90 * 24 * 3600):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.max_documents = max_documents
+        self.max_age = max_age
+        self._added = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def add(self, source, documents):
+        """Index (title, url, text) documents from a source, newest copy per URL"""
+        rows = [
+            (source, title, url, text, time.time())
+            for title, url, text in documents
+            if url and text and text.strip()
+        ]
+        if not rows:
+            return
+        with self._lock:
+            # Deleting first lets the trigger drop the old copy from the index
+            self._conn.executemany("DELETE FROM documents WHERE url = ?", [(row[2],) for row in rows])
+            self._conn.executemany(
+                "INSERT INTO documents (source, title, url, text, fetched_at) VALUES (?, ?, ?, ?, ?)", rows
+            )
+            self._added += len(rows)
+            if self._added >= self.PRUNE_INTERVAL:
+                self._added = 0
+                self._prune()
+            self._conn.commit()
+
+    def search(self, query, limit=5, sources=None):
+        """Fresh documents containing every topic word of query, best first.
+
+        Returns dicts with 'source', 'title', 'url' and 'text'; `sources`
+        restricts the result to documents from those sources.
+        """
+        expression = match_expression(query)
+        if expression is None:
+            return []
+        sql = (
+            "SELECT documents.source, documents.title, documents.url, documents.text "
+            "FROM documents_fts JOIN documents ON documents.id = documents_fts.rowid "
+            "WHERE documents_fts MATCH ? AND documents.fetched_at > ?"
+        )
+        params = [expression, time.time() - self.max_age]
+        if sources:
+            sql += f" AND documents.source IN ({', '.join('?' * len(sources))})"
+            params.extend(sources)
+        sql += " ORDER BY bm25(documents_fts) LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [dict(zip(('source', 'title', 'url', 'text'), row)) for row in rows]
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def _prune(self):
+        self._conn.execute("DELETE FROM documents WHERE fetched_at <= ?", (time.time() - self.max_age,))
+        self._conn.execute(
+            "DELETE FROM documents WHERE id IN ("
+            "SELECT id FROM documents ORDER BY fetched_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_documents,)
+        )
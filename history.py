@@ -0,0 +1,88 @@
+"""
+Append-only chat history, stored outside the Streamlit session.
+
+Each session only keeps its ID and how many messages it shows; the
+messages themselves go to a SQLite table and the page reads back one
+page of the most recent ones per rerun. Rerun cost and server memory
+therefore stay flat however long a conversation gets, and "load
+earlier" pages further back on demand. Sessions idle for longer than
+`max_age` are deleted in passing.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY, session TEXT NOT NULL, role TEXT NOT NULL, content TEXT NOT NULL,
+    source_type TEXT, wiki_url TEXT, created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_session ON messages (session, id);
+CREATE INDEX IF NOT EXISTS messages_created ON messages (created_at);
+"""
+
+FIELDS = ('role', 'content', 'source_type', 'wiki_url')
+
+
+class ChatHistory:
+    """Messages of every chat session, newest last.
+
+    Messages are dicts with 'role' and 'content' and optionally
+    'source_type' and 'wiki_url', as the page renders them. An empty
+    path keeps the history in memory for the life of the process.
+    """
+
+    # Old sessions are pruned every this many appended messages
+    PRUNE_INTERVAL = 1000
+
+    def __init__(self, path, max_age=30 * 24 * 3600):
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        self.max_age = max_age
+        self._appended = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path or ':memory:', timeout=10, check_same_thread=False)
+        if path:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def append(self, session, message):
+        """Store a message at the end of a session; returns its ID"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO messages (session, role, content, source_type, wiki_url, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (session, *(message.get(field) for field in FIELDS), time.time())
+            )
+            self._appended += 1
+            if self._appended >= self.PRUNE_INTERVAL:
+                self._appended = 0
+                self._prune()
+            self._conn.commit()
+            return cursor.lastrowid
+
+    def count(self, session):
+        """Number of messages in a session"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM messages WHERE session = ?", (session,)).fetchone()[0]
+
+    def recent(self, session, limit):
+        """The last `limit` messages of a session, oldest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT role, content, source_type, wiki_url FROM messages WHERE session = ? "
+                "ORDER BY id DESC LIMIT ?",
+                (session, limit)
+            ).fetchall()
+        return [dict(zip(FIELDS, row)) for row in reversed(rows)]
+
+    def _prune(self):
+        """Delete sessions whose last message is older than max_age"""
+        self._conn.execute(
+            "DELETE FROM messages WHERE session IN ("
+            "SELECT session FROM messages GROUP BY session HAVING MAX(created_at) <= ?)",
+            (time.time() - self.max_age,)
+        )
@@ -0,0 +1,126 @@
+"""
+Latency spans for the stages of the answer pipeline.
+
+Durations are kept per stage in fixed-size windows for p50/p95 readouts
+and can be exported to a local sink: one JSON line per span
+(METRICS_LOG) and/or a Prometheus text-format file (METRICS_PROM_FILE)
+rewritten at most every few seconds.
+"""
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import config
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = math.ceil(q / 100 * len(sorted_values)) - 1
+    return sorted_values[max(0, min(rank, len(sorted_values) - 1))]
+
+
+class LatencyRecorder:
+    """Thread-safe per-stage latency windows with optional file sinks"""
+
+    # Minimum seconds between rewrites of the Prometheus file
+    PROM_INTERVAL = 5.0
+
+    def __init__(self, window=1000, log_path=None, prom_path=None):
+        self.window = window
+        self.log_path = log_path
+        self.prom_path = prom_path
+        self._samples = {}
+        self._totals = {}
+        self._lock = threading.Lock()
+        # Only serialises appends to the JSON log, so a slow disk never
+        # holds up threads that are just recording a sample
+        self._log_lock = threading.Lock()
+        self._prom_written = 0.0
+
+    def observe(self, stage, seconds):
+        """Record one duration for a stage"""
+        with self._lock:
+            self._samples.setdefault(stage, deque(maxlen=self.window)).append(seconds)
+            count, total = self._totals.get(stage, (0, 0.0))
+            self._totals[stage] = (count + 1, total + seconds)
+            if self.log_path:
+                line = json.dumps({'ts': round(time.time(), 3), 'stage': stage,
+                                   'seconds': round(seconds, 6)}) + '\n'
+            write_prom = self.prom_path and time.monotonic() - self._prom_written >= self.PROM_INTERVAL
+            if write_prom:
+                self._prom_written = time.monotonic()
+        if self.log_path:
+            with self._log_lock, open(self.log_path, 'a', encoding='utf-8') as f:
+                f.write(line)
+        if write_prom:
+            self.write_prometheus(self.prom_path)
+
+    @contextmanager
+    def span(self, stage):
+        """Time the body of a with-block as one sample of `stage`"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def summary(self):
+        """{stage: {'count', 'p50', 'p95', 'p99'}} over the current windows"""
+        with self._lock:
+            windows = {stage: sorted(samples) for stage, samples in self._samples.items()}
+            totals = dict(self._totals)
+        return {
+            stage: {
+                'count': totals[stage][0],
+                'p50': percentile(values, 50),
+                'p95': percentile(values, 95),
+                'p99': percentile(values, 99),
+            }
+            for stage, values in sorted(windows.items())
+        }
+
+    def prometheus_text(self):
+        """Current state in the Prometheus text exposition format"""
+        summary = self.summary()
+        with self._lock:
+            totals = dict(self._totals)
+        lines = [
+            "# HELP tamil_ai_stage_seconds Latency of answer pipeline stages",
+            "# TYPE tamil_ai_stage_seconds summary",
+        ]
+        for stage, stats in summary.items():
+            for q in ('p50', 'p95', 'p99'):
+                quantile = int(q[1:]) / 100
+                lines.append(f'tamil_ai_stage_seconds{{stage="{stage}",quantile="{quantile}"}} {stats[q]:.6f}')
+            count, total = totals[stage]
+            lines.append(f'tamil_ai_stage_seconds_sum{{stage="{stage}"}} {total:.6f}')
+            lines.append(f'tamil_ai_stage_seconds_count{{stage="{stage}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        """Atomically replace `path` with the Prometheus text"""
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._totals.clear()
+
+
+# Process-wide recorder used by the pipeline
+RECORDER = LatencyRecorder(
+    window=config.METRICS_WINDOW,
+    log_path=config.METRICS_LOG or None,
+    prom_path=config.METRICS_PROM_FILE or None
+)
+span = RECORDER.span
+observe = RECORDER.observe
@@ -0,0 +1,1192 @@
+"""
+Retrieval and answer generation for the Tamil AI assistant.
+
+Everything the chat needs between a question and Gemini's answer lives
+here without any Streamlit dependency, so the same pipeline serves the
+Streamlit page (app.py) and headless runs (batch.py). Shared resources
+are created once per process; errors are passed to the reporter set with
+set_error_reporter (st.error in the app, logging elsewhere).
+
+The Gemini SDK is imported and configured when the first answer needs
+it, not at import time: it takes most of a cold start, and the page can
+be drawn long before anyone asks a question.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+from functools import lru_cache
+from itertools import chain
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import config
+import metrics
+from cache import MISSING, AnswerCache, RetrievalCache, open_backend
+from context import select_passages, truncate
+from corpus import LocalCorpus
+from ratelimit import RateLimiter
+from resilience import CircuitBreaker, DailyQuota, UpstreamUnavailable, call_with_backoff
+from router import SourceRouter, classify
+from tamil_text import stem, topic_words
+from transliterate import is_latin
+from wiki_dump import WikiDumpIndex
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------
+# API keys, from the environment unless set_api_keys is called
+API_KEYS = {
+    'gemini_api_key': os.environ.get("GEMINI_API_KEY", ""),
+    'google_api_key': os.environ.get("GOOGLE_API_KEY", ""),
+    'google_cx': os.environ.get("GOOGLE_CX", "")
+}
+
+def set_api_keys(keys):
+    """Use these API keys for all later requests; empty values are ignored"""
+    API_KEYS.update({name: value for name, value in keys.items() if value})
+
+def missing_keys():
+    """Names of the API keys that are not set"""
+    return [name for name, value in API_KEYS.items() if not value]
+
+# -----------------------------
+# Error reporting
+_error_reporter = logger.error
+_thread_reporters = threading.local()
+
+def set_error_reporter(reporter, this_thread=False):
+    """Send user-facing error messages to reporter(message).
+
+    With this_thread, only errors raised in the calling thread go to
+    reporter; background threads use it to keep their failures out of
+    the chat.
+    """
+    global _error_reporter
+    if this_thread:
+        _thread_reporters.reporter = reporter
+    else:
+        _error_reporter = reporter
+
+def report_error(message):
+    """Pass an error message to the configured reporter"""
+    getattr(_thread_reporters, 'reporter', _error_reporter)(message)
+
+# -----------------------------
+# Per-source rate limits shared by all threads
+RATE_LIMITERS = {}
+
+def set_rate_limit(source, rate):
+    """Limit a source to `rate` calls per second; 0 removes the limit"""
+    if rate > 0:
+        RATE_LIMITERS[source] = RateLimiter(rate)
+    else:
+        RATE_LIMITERS.pop(source, None)
+
+def throttle(source):
+    """Block until the source's rate limit allows another call"""
+    limiter = RATE_LIMITERS.get(source)
+    if limiter is not None:
+        limiter.acquire()
+
+for _source, _rate in config.RATE_LIMITS.items():
+    set_rate_limit(_source, _rate)
+
+# -----------------------------
+# Circuit breakers and daily quotas shared by all sessions
+@lru_cache(maxsize=None)
+def get_breaker(source):
+    """Circuit breaker of one upstream source"""
+    return CircuitBreaker(source, config.BREAKER_FAILURES, config.BREAKER_RESET)
+
+@lru_cache(maxsize=None)
+def get_quota():
+    """Persisted daily call counts of the upstream sources"""
+    return DailyQuota(config.DAILY_QUOTAS, config.QUOTA_PATH or None, config.QUOTA_TIMEZONE)
+
+@contextmanager
+def guarded(source):
+    """Run one upstream call under the source's breaker, quota and rate limit.
+
+    Raises a subclass of UpstreamUnavailable without calling the source
+    when its circuit is open or its daily quota is spent.
+    """
+    breaker = get_breaker(source)
+    breaker.allow()
+    try:
+        get_quota().consume(source)
+    except UpstreamUnavailable:
+        breaker.release()
+        raise
+    throttle(source)
+    try:
+        yield
+    except Exception:
+        breaker.record_failure()
+        raise
+    breaker.record_success()
+
+# -----------------------------
+# Pooled HTTP session for Wikipedia and Google, shared by all sessions
+WIKI_API_URL = config.WIKI_API_URL
+WIKI_USER_AGENT = 'TamilAIAssistant/2.0 (streamlit.app)'
+
+@lru_cache(maxsize=None)
+def get_http_session():
+    """Initialize a keep-alive HTTP session with retries and backoff"""
+    retry = Retry(
+        total=config.HTTP_RETRIES,
+        backoff_factor=config.HTTP_BACKOFF,
+        backoff_jitter=config.HTTP_BACKOFF,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=("GET",)
+    )
+    adapter = HTTPAdapter(
+        pool_connections=config.HTTP_POOL_SIZE,
+        pool_maxsize=config.HTTP_POOL_SIZE,
+        max_retries=retry
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers['User-Agent'] = WIKI_USER_AGENT
+    return session
+
+def query_wiki_titles(lang, titles):
+    """Resolve several titles with one MediaWiki query.
+
+    Normalisation and redirects are followed, and the intro extract and
+    URL of every existing page come back in the same response. Returns
+    {requested title: page}; titles without a page are left out.
+    """
+    params = {
+        "action": "query",
+        "format": "json",
+        "formatversion": 2,
+        "titles": "|".join(titles),
+        "redirects": 1,
+        "prop": "extracts|info",
+        "exintro": 1,
+        "explaintext": 1,
+        "exlimit": "max",
+        "inprop": "url"
+    }
+    with guarded(f'wiki_{lang}'):
+        response = get_http_session().get(
+            WIKI_API_URL.format(lang=lang),
+            params=params,
+            timeout=10
+        )
+        response.raise_for_status()
+    
+    data = response.json().get('query', {})
+    
+    # Map every requested spelling to the title it finally resolves to
+    aliases = {}
+    for item in data.get('normalized', []) + data.get('redirects', []):
+        aliases[item['from']] = item['to']
+    
+    pages = {
+        page['title']: page
+        for page in data.get('pages', [])
+        if not page.get('missing') and not page.get('invalid')
+    }
+    
+    resolved = {}
+    for title in titles:
+        target, seen = title, set()
+        while target in aliases and target not in seen:
+            seen.add(target)
+            target = aliases[target]
+        if target in pages:
+            resolved[title] = pages[target]
+    
+    return resolved
+
+def fetch_wiki_page(lang, title):
+    """Plain text of a whole article (extracts only return one at a time)"""
+    params = {
+        "action": "query",
+        "format": "json",
+        "formatversion": 2,
+        "titles": title,
+        "prop": "extracts",
+        "explaintext": 1
+    }
+    with guarded(f'wiki_{lang}'):
+        response = get_http_session().get(
+            WIKI_API_URL.format(lang=lang),
+            params=params,
+            timeout=10
+        )
+        response.raise_for_status()
+    
+    pages = response.json().get('query', {}).get('pages', [])
+    return pages[0].get('extract', '') if pages else ''
+
+def query_wiki_links(lang, title, limit):
+    """Titles of up to `limit` articles linked from a page, most viewed first"""
+    params = {
+        "action": "query",
+        "format": "json",
+        "formatversion": 2,
+        "titles": title,
+        "redirects": 1,
+        "generator": "links",
+        "gplnamespace": 0,
+        # Page views are returned for at most 50 pages per request
+        "gpllimit": 50,
+        "prop": "pageviews",
+        "pvipdays": 7
+    }
+    with guarded(f'wiki_{lang}'):
+        response = get_http_session().get(
+            WIKI_API_URL.format(lang=lang),
+            params=params,
+            timeout=10
+        )
+        response.raise_for_status()
+    
+    pages = [
+        page for page in response.json().get('query', {}).get('pages', [])
+        if not page.get('missing') and not page.get('invalid')
+    ]
+    pages.sort(key=lambda page: -sum(views or 0 for views in (page.get('pageviews') or {}).values()))
+    return [page['title'] for page in pages[:limit]]
+
+def page_content(lang, page):
+    """Text of a resolved page: its introduction, or the whole article
+    when WIKI_FULL_PAGES is set"""
+    content = page.get('extract', '').strip()
+    if config.WIKI_FULL_PAGES:
+        with metrics.span(f'wiki_{lang}.api_page'):
+            content = fetch_wiki_page(lang, page['title']).strip() or content
+    return truncate(content, config.WIKI_PAGE_CHARS)
+
+# -----------------------------
+# System Instructions for Gemini AI (Enhanced)
+SYSTEM_INSTRUCTIONS = """
+நீங்கள் ஒரு மேம்பட்ட தமிழ் தகவல் மேலாண்மை உதவியாளர். உங்கள் பணி பயனருக்கு துல்லியமான, நம்பகமான மற்றும் விரிவான தகவல்களை வழங்குவதாகும்.
+
+முக்கிய விதிமுறைகள்:
+
+1. **மொழி**: எல்லா பதில்களையும் தூய தமிழில் மட்டுமே வழங்கவும். தேவைப்பட்டால் அடைப்புக்குறிக்குள் ஆங்கில சொற்களை குறிப்பிடலாம்.
+
+2. **தேடல் வரிசை**:
+   - முதலில் விக்கிப்பீடியா தேடல் செய்யவும்
+   - தகவல் போதுமானதாக இல்லாவிட்டால் கூகுள் தேடல் செய்யவும்
+   - இரண்டு ஆதாரங்களையும் ஒப்பிட்டு சிறந்த தகவலை தேர்வு செய்யவும்
+
+3. **பதில் அமைப்பு**:
+   - தெளிவான தலைப்பு
+   - விரிவான விளக்கம்
+   - முக்கிய அம்சங்கள் (bullet points)
+   - தகவல் ஆதாரம்
+
+4. **சிறப்பு கவனம்**:
+   - தமிழ் இலக்கியம், வரலாறு, பண்பாடு தொடர்பான கேள்விகளுக்கு விரிவான விளக்கம்
+   - சங்க இலக்கியம், பக்தி இலக்கியம், நவீன இலக்கியம் போன்றவற்றிற்கு காலக்கிரம விளக்கம்
+   - தமிழ் மன்னர்கள், போர்கள், வரலாற்று நிகழ்வுகளுக்கு தேதி மற்றும் இடம் குறிப்பிடவும்
+
+5. **வாழ்த்துகள் மற்றும் உரையாடல்**:
+   - பயனர் வணக்கம் சொன்னால் அன்புடன் பதில் வணக்கம் சொல்லவும்
+   - உரையாடலை இனிமையாகவும் மரியாதையுடனும் நடத்தவும்
+
+6. **துல்லியம்**:
+   - கிடைத்த தகவலை மட்டும் பயன்படுத்தவும்
+   - கற்பனை தகவலை (hallucination) தவிர்க்கவும்
+   - தெரியாத விஷயங்களுக்கு "துல்லியமான தகவல் கிடைக்கவில்லை" என குறிப்பிடவும்
+
+7. **முக்கிய தலைப்புகள்**:
+   - திருக்குறள் மற்றும் திருவள்ளுவர்
+   - சங்க இலக்கியம் (எட்டுத்தொகை, பத்துப்பாட்டு)
+   - சிலப்பதிகாரம், மணிமேகலை போன்ற காப்பியங்கள்
+   - பக்தி இலக்கிய ஆழ்வார்கள், நாயன்மார்கள்
+   - தமிழ் மன்னர்கள் (சோழர், பாண்டியர், பல்லவர், சேரர்)
+   - தமிழ் பண்பாடு மற்றும் பாரம்பரியம்
+"""
+
+# -----------------------------
+# Enhanced Wikipedia search with better error handling
+TAMIL_KEYWORDS = ['தமிழ்', 'இலக்கியம்', 'வரலாறு', 'பண்பாடு', 'கவிதை', 'சங்க இலக்கியம்']
+
+# Titles per MediaWiki query: prop=extracts with exintro returns at most
+# 20 extracts (exlimit=max), so further titles would come back without one
+MAX_TITLE_CANDIDATES = 20
+
+@lru_cache(maxsize=None)
+def get_wiki_dump_index():
+    """Open the offline Tamil Wikipedia index, if one is configured"""
+    if not config.WIKI_DUMP_INDEX:
+        return None
+    return WikiDumpIndex(config.WIKI_DUMP_INDEX)
+
+@lru_cache(maxsize=None)
+def get_alias_index():
+    """Open the index whose alias table maps spellings to Tamil titles, if any"""
+    if not config.WIKI_ALIAS_INDEX:
+        return None
+    if config.WIKI_ALIAS_INDEX == config.WIKI_DUMP_INDEX:
+        return get_wiki_dump_index()
+    return WikiDumpIndex(config.WIKI_ALIAS_INDEX)
+
+def topic_spellings(query):
+    """The topic of a question as typed and with its words stemmed; empty
+    when the question has no topic words"""
+    words = topic_words(query, fallback=False)
+    if not words:
+        return []
+    return list(dict.fromkeys([' '.join(words), ' '.join(stem(word) for word in words)]))
+
+def wiki_title_candidates(query):
+    """Tamil Wikipedia titles to try for a question, most likely first.
+
+    The question itself, its topic spellings and the articles the alias
+    index knows them by come before the keyword variants, so a
+    question that names its topic resolves in the first batch.
+
+    Keyword variants need the topic in Tamil script. Romanised input
+    only gets them, and only resolves at all, through the alias index,
+    which maps its phonetic key to a Tamil title; a question without
+    topic words (only punctuation or question words) gets none.
+    """
+    spellings = topic_spellings(query)
+    candidates = [query.strip()] + spellings
+    aliases = []
+    index = get_alias_index()
+    if index:
+        with metrics.span('wiki_ta.aliases'):
+            for spelling in spellings:
+                aliases += index.lookup_aliases(spelling, limit=3)
+    candidates += aliases
+    topic = spellings[0] if spellings and not is_latin(spellings[0]) else next(iter(aliases), None)
+    if topic:
+        candidates += [f"{topic} {keyword}" for keyword in TAMIL_KEYWORDS]
+    return list(dict.fromkeys(title for title in candidates if title.strip()))[:MAX_TITLE_CANDIDATES]
+
+def search_wikipedia_ta(query):
+    """Search Tamil Wikipedia by the question's topic, then with Tamil keywords appended"""
+    # Strategy 1 and 2: the topic spellings and every keyword variant are
+    # resolved together, then picked in the original priority order
+    candidates = wiki_title_candidates(query)
+    index = get_wiki_dump_index()
+    if index:
+        # Local dump index instead of the live API; pages whose title
+        # contains every topic word come after the exact candidates
+        with metrics.span('wiki_ta.dump_titles'):
+            found = index.query_titles(candidates)
+        with metrics.span('wiki_ta.dump_title_search'):
+            words = topic_words(query)
+            title_matches = []
+            # The words as typed first, then their stems
+            for spelling in dict.fromkeys([' '.join(words), ' '.join(stem(word) for word in words)]):
+                title_matches += index.search_titles(spelling)
+        pages = [found.get(title) for title in candidates] + title_matches
+    else:
+        with metrics.span('wiki_ta.api_titles'):
+            found = query_wiki_titles('ta', candidates)
+        pages = [found.get(title) for title in candidates]
+    
+    for page in pages:
+        if page:
+            summary = page.get('extract', '').strip()
+            if len(summary) > 100:
+                return {
+                    # The dump index only stores introductions
+                    'content': truncate(summary, config.WIKI_PAGE_CHARS) if index else page_content('ta', page),
+                    'title': page['title'],
+                    'url': page['fullurl'],
+                    'language': 'தமிழ்'
+                }
+    
+    return None
+
+def search_wikipedia_en(query):
+    """Search English Wikipedia as a fallback source"""
+    candidates = list(dict.fromkeys([query.strip(), ' '.join(topic_words(query))]))
+    with metrics.span('wiki_en.api_titles'):
+        found = query_wiki_titles('en', candidates)
+    eng_page = next((found[title] for title in candidates if title in found), None)
+    if eng_page:
+        summary = eng_page.get('extract', '').strip()
+        if len(summary) > 100:
+            return {
+                'content': page_content('en', eng_page),
+                'title': eng_page['title'],
+                'url': eng_page['fullurl'],
+                'language': 'ஆங்கிலம்'
+            }
+    
+    return None
+
+def get_wikipedia_content(query):
+    """Fetch Wikipedia content with enhanced search strategies"""
+    try:
+        # Tamil first, English Wikipedia as fallback
+        return cached_lookup('wiki_ta', query) or cached_lookup('wiki_en', query)
+        
+    except Exception as e:
+        report_source_error('wiki_ta', e)
+        return None
+
+# -----------------------------
+# Local corpus of fetched documents
+@lru_cache(maxsize=None)
+def get_corpus():
+    """Open the local search corpus, if one is configured"""
+    if not config.CORPUS_PATH:
+        return None
+    return LocalCorpus(config.CORPUS_PATH, config.CORPUS_MAX_DOCUMENTS, config.CORPUS_MAX_AGE)
+
+def remember(source, documents):
+    """Add (title, url, text) documents to the local corpus"""
+    corpus = get_corpus()
+    if corpus is None:
+        return
+    try:
+        corpus.add(source, documents)
+    except sqlite3.Error as e:
+        # The corpus only saves later calls; never fail a lookup over it
+        logger.warning("Could not add %s documents to the corpus: %s", source, e)
+
+def format_snippets(results):
+    """Combine search results into the text given to Gemini"""
+    return "\n\n".join([f"**{r['title']}**\n{r['snippet']}" for r in results]) or None
+
+def search_local_corpus(query):
+    """Stored search results for query, or None when too few cover it"""
+    corpus = get_corpus()
+    if corpus is None or not config.CORPUS_MIN_HITS:
+        return None
+    with metrics.span('google.corpus'):
+        documents = corpus.search(query, limit=3, sources=('google',))
+    if len(documents) < config.CORPUS_MIN_HITS:
+        return None
+    return format_snippets([{'title': doc['title'], 'snippet': doc['text']} for doc in documents])
+
+# -----------------------------
+# Enhanced Google Search with rate limiting
+def search_google(query):
+    """Combine the top search results, from the local corpus when it knows enough.
+
+    Otherwise the Custom Search API is queried, and every result it
+    returns goes into the corpus for later questions.
+    """
+    local = search_local_corpus(query)
+    if local:
+        return local
+    
+    if not API_KEYS['google_api_key'] or not API_KEYS['google_cx']:
+        return None
+        
+    url = config.GOOGLE_SEARCH_URL
+    params = {
+        "q": query + " தமிழ்",  # Add Tamil to prioritize Tamil results
+        "key": API_KEYS['google_api_key'],
+        "cx": API_KEYS['google_cx'],
+        "lr": "lang_ta",  # Tamil language preference
+        "num": 5  # Get top 5 results
+    }
+    
+    with guarded('google'), metrics.span('google.search'):
+        response = get_http_session().get(url, params=params, timeout=10)
+        response.raise_for_status()
+    
+    data = response.json()
+    
+    if "items" in data:
+        results = []
+        for item in data["items"]:
+            result = {
+                'title': item.get("title", ""),
+                'snippet': item.get("snippet", ""),
+                'link': item.get("link", "")
+            }
+            results.append(result)
+        
+        remember('google', [(r['title'], r['link'], r['snippet']) for r in results])
+        return format_snippets(results[:3])  # Use top 3 results
+    
+    return None
+
+def get_google_content(query):
+    """Fetch Google Search content with enhanced error handling"""
+    try:
+        return cached_lookup('google', query)
+    except Exception as e:
+        report_source_error('google', e)
+        return None
+
+def report_source_error(source, error):
+    """Report a lookup failure; called from the caller's thread, never a worker"""
+    if isinstance(error, UpstreamUnavailable):
+        # Expected while a breaker is open or a quota is spent; the answer
+        # simply goes without this source
+        logger.info("Skipped %s: %s", source, error)
+        return
+    if source == 'google':
+        if isinstance(error, requests.exceptions.RequestException):
+            report_error(f"கூகுள் தேடல் பிழை: {str(error)}")
+        else:
+            report_error(f"எதிர்பாராத பிழை: {str(error)}")
+    else:
+        report_error(f"விக்கிப்பீடியா பிழை: {str(error)}")
+
+# -----------------------------
+# Retrieval cache shared by all sessions
+SOURCE_LOOKUPS = {
+    'wiki_ta': search_wikipedia_ta,
+    'wiki_en': search_wikipedia_en,
+    'google': search_google,
+}
+
+@lru_cache(maxsize=None)
+def get_retrieval_cache():
+    """Initialize the in-memory and shared retrieval cache"""
+    return RetrievalCache(
+        ttls=config.RETRIEVAL_TTLS,
+        negative_ttl=config.RETRIEVAL_NEGATIVE_TTL,
+        max_entries=config.RETRIEVAL_CACHE_SIZE,
+        shared=open_backend(
+            config.CACHE_BACKEND,
+            path=config.RETRIEVAL_CACHE_PATH,
+            redis_url=config.REDIS_URL,
+            namespace='tamilai:retrieval:',
+            max_entries=config.RETRIEVAL_CACHE_DISK_ENTRIES
+        ),
+        lock_ttl=config.SINGLE_FLIGHT_TIMEOUT
+    )
+
+def fetch_source(source, query):
+    """Run a source lookup and store its result in the cache.
+
+    A lookup already running for the same query, in another session or
+    in another process sharing the cache backend, is waited for and its
+    cached result returned instead of calling the upstream again.
+    """
+    cache = get_retrieval_cache()
+    
+    def lookup():
+        value = SOURCE_LOOKUPS[source](query)
+        cache.set(source, query, value)
+        if value and source != 'google':
+            # Search results are added by search_google, one per result
+            remember(source, [(value['title'], value['url'], value['content'])])
+        return value
+    
+    return cache.flight.run(
+        cache.key(source, query),
+        lookup,
+        lambda: cache.get(source, query),
+        timeout=config.SINGLE_FLIGHT_TIMEOUT
+    )
+
+def cached_lookup(source, query):
+    """Return a cached lookup result, fetching it on a miss"""
+    value = get_retrieval_cache().get(source, query)
+    if value is MISSING:
+        value = fetch_source(source, query)
+    return value
+
+# -----------------------------
+# Concurrent retrieval across all sources
+@lru_cache(maxsize=None)
+def get_retrieval_pool():
+    """Thread pool shared by all sessions for source lookups"""
+    return ThreadPoolExecutor(max_workers=config.RETRIEVAL_WORKERS, thread_name_prefix="retrieval")
+
+@lru_cache(maxsize=None)
+def get_router():
+    """Query router shared by all sessions"""
+    return SourceRouter(
+        window=config.ROUTER_WINDOW,
+        min_samples=config.ROUTER_MIN_SAMPLES,
+        min_success=config.ROUTER_MIN_SUCCESS,
+        explore_every=config.ROUTER_EXPLORE_EVERY,
+        aliases=get_alias_index()
+    )
+
+def has_enough_wiki_content(wiki_data):
+    """Whether Wikipedia content is long enough to skip Google"""
+    return bool(wiki_data) and len(wiki_data.get('content', '')) >= config.MIN_WIKI_CONTENT
+
+def retrieve_sources(query):
+    """Start the routed source lookups together and pick results by priority.
+
+    The router decides which sources a query needs and in which order
+    (greetings need none). The first Wikipedia source in that order
+    that finds a page wins, and Google is only used when Wikipedia
+    content is missing or short. Each source gets its own deadline;
+    lookups whose result can no longer be used are cancelled. Cached
+    results are used without touching the pool, and every finished
+    lookup updates the router's statistics. Returns (wiki_data,
+    google_content).
+    """
+    pool = get_retrieval_pool()
+    cache = get_retrieval_cache()
+    router = get_router()
+    query_class, sources = router.route(query)
+    started = time.monotonic()
+    futures = {}
+    
+    def record(source, future):
+        # Lookups that finish after their result stopped mattering still
+        # count towards the router's statistics
+        if not future.cancelled() and future.exception() is None:
+            router.record(query_class, source, future.result())
+    
+    def start(*sources):
+        for source in sources:
+            value = cache.get(source, query)
+            if value is MISSING:
+                futures[source] = pool.submit(fetch_source, source, query)
+            else:
+                futures[source] = Future()
+                futures[source].set_result(value)
+            futures[source].add_done_callback(lambda future, source=source: record(source, future))
+    
+    def collect(source):
+        remaining = started + config.RETRIEVAL_DEADLINES[source] - time.monotonic()
+        try:
+            return futures[source].result(timeout=max(remaining, 0))
+        except FutureTimeoutError:
+            futures[source].cancel()
+            return None
+        except Exception as e:
+            report_source_error(source, e)
+            return None
+    
+    wiki_sources = [source for source in sources if source != 'google']
+    use_google = 'google' in sources
+    
+    # A cached first-choice page that is long enough needs no other source
+    if wiki_sources:
+        start(wiki_sources[0])
+        first = futures[wiki_sources[0]]
+        if first.done() and not first.exception() and has_enough_wiki_content(first.result()):
+            return collect(wiki_sources[0]), None
+    start(*wiki_sources[1:], *(['google'] if use_google else []))
+    
+    wiki_data = None
+    for source in wiki_sources:
+        if wiki_data:
+            futures[source].cancel()
+        else:
+            wiki_data = collect(source)
+    
+    google_content = None
+    if use_google:
+        if has_enough_wiki_content(wiki_data):
+            futures['google'].cancel()
+        else:
+            google_content = collect('google')
+    
+    return wiki_data, google_content
+
+# -----------------------------
+# Setup Gemini API with caching
+@lru_cache(maxsize=None)
+def setup_genai():
+    """Whether Gemini can be used; the SDK itself is set up on first use"""
+    return bool(API_KEYS['gemini_api_key'])
+
+def configure_genai():
+    """Import and configure the Gemini SDK; returns the genai module.
+
+    Configuration errors surface as a failed answer.
+    """
+    import google.generativeai as genai
+    
+    if config.GEMINI_API_ENDPOINT:
+        genai.configure(
+            api_key=API_KEYS['gemini_api_key'],
+            transport="rest",
+            client_options={"api_endpoint": config.GEMINI_API_ENDPOINT}
+        )
+    else:
+        genai.configure(api_key=API_KEYS['gemini_api_key'])
+    return genai
+
+@lru_cache(maxsize=None)
+def preload_genai():
+    """Import the Gemini SDK in a background thread, once per process, so
+    that the first answer does not wait for it"""
+    def load():
+        import google.generativeai  # noqa: F401
+        gemini_retryable()
+    
+    thread = threading.Thread(target=load, name="genai-preload", daemon=True)
+    thread.start()
+    return thread
+
+# -----------------------------
+# Answer cache shared by all sessions
+@lru_cache(maxsize=None)
+def get_answer_cache():
+    """Initialize the cache of generated answers"""
+    return AnswerCache(
+        ttl=config.ANSWER_CACHE_TTL,
+        max_entries=config.ANSWER_CACHE_SIZE,
+        shared=open_backend(
+            config.CACHE_BACKEND,
+            path=config.ANSWER_CACHE_PATH,
+            redis_url=config.REDIS_URL,
+            namespace='tamilai:answers:'
+        ),
+        min_similarity=config.ANSWER_CACHE_SIMILARITY or None,
+        lock_ttl=config.SINGLE_FLIGHT_TIMEOUT
+    )
+
+# -----------------------------
+# Gemini model configured once and shared by all sessions
+_model_client = None
+
+def set_model_client(model):
+    """Answer with `model` instead of Gemini; None restores Gemini.
+
+    Any object with a Gemini-style generate_content(prompt, stream=True,
+    generation_config=...) works, which lets benchmarks and tests run
+    without an API key. A dict {model name: client} stands in for each
+    model of MODEL_LADDER separately.
+    """
+    global _model_client
+    _model_client = model
+
+def get_model(model_name=None):
+    """Return the client that answers as `model_name` (the first model of the ladder by default)"""
+    model_name = model_name or config.MODEL_LADDER[0]
+    if isinstance(_model_client, dict):
+        return _model_client[model_name]
+    return _model_client if _model_client is not None else get_gemini_model(model_name)
+
+@lru_cache(maxsize=None)
+def get_gemini_model(model_name=None):
+    """Initialize a Gemini model with generation and safety settings"""
+    genai = configure_genai()
+    from google.generativeai.types import HarmCategory, HarmBlockThreshold
+    
+    # Safety settings
+    safety_settings = {
+        HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
+        HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
+        HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
+        HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
+    }
+    
+    return genai.GenerativeModel(
+        model_name=model_name or config.MODEL_LADDER[0],
+        generation_config={
+            "temperature": 0.3,
+            "top_p": 0.95,
+            "top_k": 40,
+            "max_output_tokens": 3000,
+        },
+        safety_settings=safety_settings,
+        # Sent once as the system turn instead of at the top of every prompt
+        system_instruction=SYSTEM_INSTRUCTIONS
+    )
+
+# -----------------------------
+# Model ladder: a fast model answers first, and a larger one only when
+# that answer fails the checks
+NO_INFORMATION = "துல்லியமான தகவல் கிடைக்கவில்லை"
+
+# Share of an answer's letters that must be Tamil
+MIN_TAMIL_SHARE = 0.5
+
+def tamil_share(text):
+    """Share of the letters in text that are Tamil"""
+    letters = [ch for ch in text if ch.isalpha()]
+    if not letters:
+        return 0.0
+    return sum('\u0b80' <= ch <= '\u0bff' for ch in letters) / len(letters)
+
+def answer_problem(text, complete, has_sources):
+    """Why an answer, or its first part, should go to the next model; None if it is fine.
+
+    Saying that no accurate information was found only counts when
+    retrieval did find sources, since a larger model cannot do better
+    without them.
+    """
+    if not text.strip():
+        return 'empty' if complete else None
+    if tamil_share(text) < MIN_TAMIL_SHARE:
+        return 'not_tamil'
+    if has_sources and NO_INFORMATION in text:
+        return 'no_information'
+    return None
+
+def start_generation(model_name, prompt, max_output_tokens):
+    """Send the prompt to one model of the ladder; returns (response, started)"""
+    with guarded('gemini'):
+        started = time.perf_counter()
+        response = call_with_backoff(
+            lambda: get_model(model_name).generate_content(
+                prompt,
+                stream=True,
+                generation_config={"max_output_tokens": max_output_tokens}
+            ),
+            gemini_retryable(),
+            config.GEMINI_RETRIES,
+            config.GEMINI_BACKOFF
+        )
+    return response, started
+
+def response_texts(response, started):
+    """Yield the text of a streamed Gemini response, timing the first token.
+
+    Closing the generator before the end stops the stream, so an answer
+    that is not read does not keep its connection.
+    """
+    first = True
+    try:
+        for chunk in response:
+            if chunk.parts:
+                if first:
+                    metrics.observe('gemini.first_token', time.perf_counter() - started)
+                    first = False
+                yield chunk.text
+    finally:
+        close_response(response)
+
+def close_response(response):
+    """Cancel a streamed response (REST or grpc) if it can be cancelled"""
+    # The SDK keeps the transport's stream in a private attribute
+    stream = getattr(response, '_iterator', response)
+    for name in ('cancel', 'close'):
+        method = getattr(stream, name, None)
+        if callable(method):
+            try:
+                method()
+            except Exception as e:
+                logger.debug("Closing a model response failed: %s", e)
+            return
+
+def hold_back(texts, limit):
+    """Read texts until `limit` characters (at least one text) or their end;
+    returns (held, complete)"""
+    held = []
+    for text in texts:
+        held.append(text)
+        if sum(map(len, held)) >= limit:
+            return held, False
+    return held, True
+
+def generate_answer(prompt, query_class, has_sources):
+    """Stream an answer from the model ladder; returns (texts, started, decision).
+
+    The output budget comes from the query class. Every model but the
+    last has the start of its answer checked: the first streamed chunk,
+    which is shown as soon as it arrives anyway, or more when
+    ESCALATION_PEEK_CHARS holds back that many characters. When
+    answer_problem finds one, the next model is asked instead. If that
+    model fails in any way, the held answer is used after all. Errors
+    from the first model are raised as from start_generation. The
+    decision is logged and returned as a dict.
+    """
+    ladder = config.MODEL_LADDER
+    budget = config.OUTPUT_TOKENS.get(query_class, config.OUTPUT_TOKENS['long_tail'])
+    decision = {'class': query_class, 'max_output_tokens': budget, 'escalations': []}
+    previous = None
+    for tier, model_name in enumerate(ladder):
+        try:
+            response, started = start_generation(model_name, prompt, budget)
+        except Exception as e:
+            if previous is None:
+                raise
+            logger.warning("Model %s failed, keeping the answer of %s: %s", model_name, previous[2], e)
+            held, texts, model_name, started = previous
+            return log_decision(decision, model_name, chain(held, texts), started)
+        texts = response_texts(response, started)
+        if tier == len(ladder) - 1:
+            if previous is not None:
+                previous[1].close()
+            return log_decision(decision, model_name, texts, started)
+        
+        try:
+            held, complete = hold_back(texts, config.ESCALATION_PEEK_CHARS)
+        except Exception as e:
+            get_breaker('gemini').record_failure()
+            held, complete, problem = [], True, f'error: {e}'
+        else:
+            problem = answer_problem("".join(held), complete, has_sources)
+        if problem is None:
+            if previous is not None:
+                previous[1].close()
+            return log_decision(decision, model_name, chain(held, texts), started)
+        decision['escalations'].append({'model': model_name, 'problem': problem})
+        # An answer that is merely weak beats none if the next model fails;
+        # every other stream is stopped before the next model is asked
+        if held and not problem.startswith('error'):
+            if previous is not None:
+                previous[1].close()
+            previous = (held, texts, model_name, started)
+        else:
+            texts.close()
+
+def log_decision(decision, model_name, texts, started):
+    """Record which model answers and return generate_answer's result"""
+    decision['model'] = model_name
+    logger.info("Model decision: %s", json.dumps(decision, ensure_ascii=False))
+    return texts, started, decision
+
+# -----------------------------
+# Enhanced response generation with better context
+def build_prompt(query, wiki_data, google_content, history=''):
+    """Build enhanced prompt from the question and retrieved content.
+
+    Only the passages that best match the question are included, up to
+    CONTEXT_TOKEN_BUDGET estimated tokens; the system instructions are
+    set on the model rather than repeated here. history is the earlier
+    conversation, placed before the question.
+    """
+    wiki_text, google_text = select_passages(
+        query,
+        [wiki_data['content'] if wiki_data else '', google_content or ''],
+        budget=config.CONTEXT_TOKEN_BUDGET,
+        passage_chars=config.CONTEXT_PASSAGE_CHARS
+    )
+    
+    full_prompt = ""
+    if history:
+        full_prompt += f"முந்தைய உரையாடல்:\n{history}\n\n"
+    full_prompt += f"பயனர் கேள்வி: {query}\n\n"
+    
+    if wiki_data and wiki_text:
+        full_prompt += f"விக்கிப்பீடியா தகவல் ({wiki_data['language']}):\n"
+        if wiki_data['language'] == 'ஆங்கிலம்':
+            full_prompt += "[தமிழ் விக்கிப்பீடியாவில் இல்லை. ஆங்கில விக்கிப்பீடியா:]\n"
+        full_prompt += f"தலைப்பு: {wiki_data['title']}\n"
+        full_prompt += f"{wiki_text}\n\n"
+    
+    if google_text:
+        full_prompt += f"கூகுள் தேடல் தகவல்:\n{google_text}\n\n"
+    
+    full_prompt += """
+    மேற்கண்ட தகவல்களை பயன்படுத்தி:
+    1. தெளிவான மற்றும் விரிவான பதிலை தமிழில் வழங்கவும்
+    2. முக்கிய அம்சங்களை புள்ளிகளாக (bullet points) குறிப்பிடவும்
+    3. தகவல் ஆதாரத்தை குறிப்பிடவும்
+    4. பயனருக்கு பயனுள்ள கூடுதல் தகவல்களையும் சேர்க்கவும்
+    """
+    return full_prompt
+
+@lru_cache(maxsize=None)
+def gemini_retryable():
+    """Gemini errors worth retrying: rate limiting (429, including
+    ResourceExhausted) and server-side failures"""
+    # google.api_core pulls in grpc, so it is imported with the first answer
+    from google.api_core import exceptions as google_exceptions
+    
+    return (
+        google_exceptions.TooManyRequests,
+        google_exceptions.InternalServerError,
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.DeadlineExceeded,
+    )
+
+# How an answer came about: from the model (or the cache), as retrieved
+# text while Gemini is unavailable, or as an apology
+ANSWERED = 'answered'
+DEGRADED = 'degraded'
+FAILED = 'failed'
+
+class AnswerStream:
+    """The text chunks of an answer, with its status.
+
+    `status` is ANSWERED, DEGRADED or FAILED. A model stream that breaks
+    off is reported, ends with the apology and turns FAILED as it is
+    read. Callbacks added with on_done run once, when the chunks are
+    exhausted or the stream is closed.
+    """
+    
+    def __init__(self, chunks, status=ANSWERED):
+        self._chunks = iter(chunks)
+        self.status = status
+        self._callbacks = []
+    
+    def __iter__(self):
+        return self
+    
+    def __next__(self):
+        try:
+            return next(self._chunks)
+        except StopIteration:
+            self.close()
+            raise
+        except Exception as e:
+            self.status = FAILED
+            self._chunks = iter([report_generation_error(e)])
+            return next(self._chunks)
+    
+    def on_done(self, callback):
+        self._callbacks.append(callback)
+    
+    def close(self):
+        """Stop the underlying stream and run the done callbacks"""
+        callbacks, self._callbacks = self._callbacks, []
+        try:
+            getattr(self._chunks, 'close', lambda: None)()
+        finally:
+            for callback in callbacks:
+                callback()
+
+
+def stream_response(query, bypass_cache=False, conversation=None):
+    """Start answering a query and return (chunks, source_used, wiki_url).
+
+    Retrieval runs up front so the sources are known immediately; chunks
+    then yields the answer text as Gemini streams it, and the complete
+    text goes into the answer cache once the stream is exhausted. A cached
+    answer to the same (normalised) question is returned as a single chunk
+    without calling Gemini; bypass_cache forces a fresh answer. When the
+    same question is already being answered for someone else, that answer
+    is waited for and served from the cache.
+
+    With a Conversation, a follow-up question (a pronoun and no topic of
+    its own) is retrieved with the earlier topic and answered with the
+    recent history in its prompt; follow-ups depend on that history, so
+    they bypass the answer cache.
+    Other questions are answered without the history, so their cached
+    answers suit anyone asking them.
+
+    chunks is an AnswerStream; its status tells a model's answer from a
+    fallback or an apology. A caller that stops reading before the end
+    must close it, so that others asking the same question stop waiting.
+    """
+    try:
+        retrieval_query = conversation.standalone_query(query) if conversation else query
+        followup = retrieval_query != query
+        if not config.ANSWER_CACHE_ENABLED or bypass_cache or followup:
+            return answer_from_sources(query, retrieval_query, conversation)
+
+        cache = get_answer_cache()
+        cached = cache.get(query)
+        if cached is MISSING:
+            key = cache.key(query)
+            if cache.flight.acquire(key):
+                chunks, source_used, wiki_url = answer_from_sources(query, retrieval_query, conversation)
+                # Let the next caller waiting on key go ahead once this answer is done
+                chunks.on_done(lambda: cache.flight.release(key))
+                return chunks, source_used, wiki_url
+            cache.flight.wait(key, config.SINGLE_FLIGHT_TIMEOUT)
+            cached = cache.get(query)
+            if cached is MISSING:
+                return answer_from_sources(query, retrieval_query, conversation)
+        response_text, source_used, wiki_url = cached
+        return AnswerStream([response_text]), source_used, wiki_url
+
+    except Exception as e:
+        return AnswerStream([report_generation_error(e)], FAILED), None, None
+
+
+def answer_from_sources(query, retrieval_query, conversation):
+    """Retrieve sources for retrieval_query and stream Gemini's answer to query"""
+    followup = retrieval_query != query
+    try:
+        # Fetch content from all sources concurrently
+        with metrics.span('retrieval'):
+            wiki_data, google_content = retrieve_sources(retrieval_query)
+        
+        with metrics.span('prompt'):
+            # Only follow-ups see the history; other answers are cached
+            history = conversation.context_text(config.HISTORY_TOKEN_BUDGET) if followup else ''
+            full_prompt = build_prompt(query, wiki_data, google_content, history)
+        
+        # Generate response from the model ladder; retried with backoff on
+        # 429/5xx, and answered from what is already at hand while Gemini
+        # is unavailable
+        try:
+            texts, started, _ = generate_answer(
+                full_prompt, classify(retrieval_query, get_alias_index()), bool(wiki_data or google_content)
+            )
+        except (UpstreamUnavailable, *gemini_retryable()) as e:
+            logger.warning("Gemini unavailable, answering without it: %s", e)
+            return fallback_answer(None if followup else query, wiki_data, google_content)
+        
+        # Determine sources used
+        sources = []
+        if wiki_data:
+            sources.append(f"விக்கிப்பீடியா ({wiki_data['language']})")
+        if google_content:
+            sources.append("கூகுள் தேடல்")
+        
+        source_used = " மற்றும் ".join(sources) if sources else "தகவல் ஆதாரம் இல்லை"
+        
+        # Add wiki URL if available
+        wiki_url = wiki_data['url'] if wiki_data else None
+        
+        chunks = stream_chunks(None if followup else query, texts, source_used, wiki_url, started)
+        return AnswerStream(chunks), source_used, wiki_url
+        
+    except Exception as e:
+        return AnswerStream([report_generation_error(e)], FAILED), None, None
+
+def fallback_answer(query, wiki_data, google_content):
+    """Answer without Gemini: a cached answer, else the retrieved text itself.
+
+    query is None when the answer cache must not be used. Returns the
+    same (chunks, source_used, wiki_url) as stream_response.
+    """
+    if config.ANSWER_CACHE_ENABLED and query is not None:
+        cached = get_answer_cache().get(query)
+        if cached is not MISSING:
+            response_text, source_used, wiki_url = cached
+            return AnswerStream([response_text]), source_used, wiki_url
+    
+    notice = "⚠️ AI சேவை தற்காலிகமாக கிடைக்கவில்லை. கிடைத்த தகவல் கீழே:\n\n"
+    if wiki_data:
+        text = f"### {wiki_data['title']}\n\n{truncate(wiki_data['content'], 1500)}"
+        return AnswerStream([notice + text], DEGRADED), f"விக்கிப்பீடியா ({wiki_data['language']})", wiki_data['url']
+    if google_content:
+        return AnswerStream([notice + google_content], DEGRADED), "கூகுள் தேடல்", None
+    apology = "மன்னிக்கவும், AI சேவை தற்காலிகமாக கிடைக்கவில்லை. சிறிது நேரம் கழித்து மீண்டும் முயற்சிக்கவும்."
+    return AnswerStream([apology], FAILED), None, None
+
+def stream_chunks(query, texts, source_used, wiki_url, started):
+    """Yield the answer text as it is generated and cache the whole answer
+
+    `started` is the perf_counter reading taken just before the request,
+    used for the total generation span. Nothing is cached when query is
+    None, or when the stream breaks off; that error is raised on to the
+    AnswerStream reading these chunks.
+    """
+    parts = []
+    try:
+        for text in texts:
+            parts.append(text)
+            yield text
+    except Exception:
+        get_breaker('gemini').record_failure()
+        raise
+    metrics.observe('gemini.total', time.perf_counter() - started)
+    
+    response_text = "".join(parts)
+    if config.ANSWER_CACHE_ENABLED and query is not None and response_text.strip():
+        get_answer_cache().set(query, (response_text, source_used, wiki_url))
+
+def generate_response(query, bypass_cache=False, conversation=None):
+    """Generate response using Gemini AI with enhanced context and error handling"""
+    chunks, source_used, wiki_url = stream_response(query, bypass_cache, conversation)
+    return "".join(chunks), source_used, wiki_url
+
+def report_generation_error(error):
+    """Report a generation failure and return the apology used as the answer"""
+    error_msg = f"பதில் உருவாக்குவதில் பிழை: {str(error)}"
+    report_error(error_msg)
+    return "மன்னிக்கவும், பதில் உருவாக்குவதில் பிழை ஏற்பட்டது. மீண்டும் முயற்சிக்கவும்."
+
+# -----------------------------
+# Process-wide counters for status pages
+def stats():
+    """Retrieval cache hits/misses and per-stage latency of this process"""
+    return {
+        'cache': get_retrieval_cache().stats(),
+        'stages': metrics.RECORDER.summary()
+    }
@@ -0,0 +1,36 @@
+"""
+Client-side rate limiting for upstream APIs.
+"""
+import threading
+import time
+
+
+class RateLimiter:
+    """Token bucket allowing `rate` calls per second with bursts of `burst`.
+
+    acquire() blocks the calling thread until a token is free, so one
+    limiter can be shared by every worker that talks to the same upstream.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """Wait for and take one token"""
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
@@ -0,0 +1,195 @@
+"""
+Protection for upstream APIs: daily quotas, circuit breakers and backoff.
+
+DailyQuota counts calls per source and day in SQLite, so the count
+survives restarts and is shared by every process on the host, and
+refuses calls once a source's daily limit is spent. CircuitBreaker stops
+calling an upstream after repeated failures and lets a single trial call
+through once it has cooled down. Both raise quickly instead of waiting
+on an upstream that is known to be unavailable, so callers can fall back
+to what they already have.
+"""
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:  # Python < 3.9
+    ZoneInfo = None
+
+logger = logging.getLogger(__name__)
+
+
+class UpstreamUnavailable(Exception):
+    """An upstream was not called because it is known to be unavailable"""
+
+
+class CircuitOpenError(UpstreamUnavailable):
+    """The upstream's circuit breaker is open"""
+
+
+class QuotaExceededError(UpstreamUnavailable):
+    """The upstream's daily quota is spent"""
+
+
+class CircuitBreaker:
+    """Fail fast after `failure_threshold` consecutive failures.
+
+    While open, calls are refused for `reset_timeout` seconds; after that
+    one trial call is let through (half-open), and its outcome closes the
+    circuit again or reopens it for another timeout.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return 'open'
+            return 'half-open'
+
+    def allow(self):
+        """Raise CircuitOpenError unless a call may go ahead now"""
+        with self._lock:
+            if self._opened_at is None:
+                return
+            cooled_down = time.monotonic() - self._opened_at >= self.reset_timeout
+            if cooled_down and not self._trial_running:
+                self._trial_running = True
+                return
+        raise CircuitOpenError(f"{self.name} circuit is open")
+
+    def release(self):
+        """Give back a trial call that allow() granted but was never made"""
+        with self._lock:
+            self._trial_running = False
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info("%s circuit closed", self.name)
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._trial_running:
+                    logger.warning("%s circuit opened after %d failures", self.name, self._failures)
+                self._opened_at = time.monotonic()
+                self._trial_running = False
+
+
+class DailyQuota:
+    """Per-source call counts for the current day, persisted in SQLite.
+
+    `limits` maps a source to its calls per day; sources without a
+    positive limit are not counted. Days follow `tz` (Google's quotas
+    reset at midnight Pacific time). Without a path the counts live in
+    memory only. The first refused call of a source each day is logged
+    as a warning.
+    """
+
+    def __init__(self, limits, path=None, tz='America/Los_Angeles'):
+        self.limits = {source: limit for source, limit in limits.items() if limit > 0}
+        self.tz = self._timezone(tz)
+        if path:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(path or ':memory:', check_same_thread=False, timeout=10)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS quota ("
+            "day TEXT, source TEXT, count INTEGER, PRIMARY KEY (day, source))"
+        )
+        self._conn.commit()
+        self._lock = threading.Lock()
+        self._spent = {}  # source -> day its exhaustion was logged
+
+    @staticmethod
+    def _timezone(name):
+        if ZoneInfo is not None:
+            try:
+                return ZoneInfo(name)
+            except Exception:
+                logger.warning("Unknown time zone %r, counting quota days in UTC", name)
+        return timezone.utc
+
+    def _today(self):
+        return datetime.now(self.tz).date().isoformat()
+
+    def used(self, source):
+        """Calls counted for source today"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT count FROM quota WHERE day = ? AND source = ?", (self._today(), source)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def consume(self, source):
+        """Count one call, or raise QuotaExceededError if none are left today"""
+        limit = self.limits.get(source)
+        if limit is None:
+            return
+        day = self._today()
+        with self._lock:
+            # BEGIN IMMEDIATE keeps check-and-increment atomic across processes
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT count FROM quota WHERE day = ? AND source = ?", (day, source)
+                ).fetchone()
+                used = row[0] if row else 0
+                if used >= limit:
+                    if self._spent.get(source) != day:
+                        self._spent[source] = day
+                        logger.warning(
+                            "%s daily quota of %d calls is spent; skipping it until the day ends (%s)",
+                            source, limit, self.tz
+                        )
+                    raise QuotaExceededError(f"{source} daily quota of {limit} calls is spent")
+                self._conn.execute(
+                    "INSERT INTO quota (day, source, count) VALUES (?, ?, 1) "
+                    "ON CONFLICT (day, source) DO UPDATE SET count = count + 1",
+                    (day, source)
+                )
+                self._conn.execute("DELETE FROM quota WHERE day < ?", (day,))
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+
+    def remaining(self):
+        """{source: calls left today} for every limited source"""
+        return {source: max(0, limit - self.used(source)) for source, limit in self.limits.items()}
+
+
+def backoff_delays(retries, base, cap=30.0):
+    """Exponential backoff with full jitter: one delay per retry"""
+    return [random.uniform(0, min(cap, base * 2 ** attempt)) for attempt in range(retries)]
+
+
+def call_with_backoff(fn, retryable, retries, base):
+    """Call fn(), retrying exceptions of the `retryable` types with backoff"""
+    for delay in backoff_delays(retries, base) + [None]:
+        try:
+            return fn()
+        except retryable:
+            if delay is None:
+                raise
+            time.sleep(delay)
@@ -0,0 +1,111 @@
+"""
+Minimal client for the Redis serialization protocol (RESP2).
+
+Only what the cache needs: commands are sent as arrays of bulk strings,
+replies are parsed into Python values, and several commands can be sent
+in one round trip. It works with Redis, Valkey, KeyDB and anything else
+that speaks the protocol, without a client library dependency.
+"""
+import socket
+import threading
+from urllib.parse import unquote, urlsplit
+
+
+class RespError(Exception):
+    """An error reply from the server"""
+
+
+def encode_command(*args):
+    """Encode a command as a RESP array of bulk strings"""
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if not isinstance(arg, bytes):
+            arg = str(arg).encode('utf-8')
+        parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(parts)
+
+
+def read_reply(stream):
+    """Read one reply from a buffered binary stream"""
+    line = stream.readline()
+    if not line.endswith(b"\r\n"):
+        raise ConnectionError("connection closed by server")
+    kind, payload = line[:1], line[1:-2]
+    if kind == b"+":
+        return payload.decode('utf-8')
+    if kind == b"-":
+        return RespError(payload.decode('utf-8'))
+    if kind == b":":
+        return int(payload)
+    if kind == b"$":
+        length = int(payload)
+        if length < 0:
+            return None
+        data = stream.read(length + 2)
+        if len(data) != length + 2:
+            raise ConnectionError("connection closed by server")
+        return data[:-2]
+    if kind == b"*":
+        length = int(payload)
+        if length < 0:
+            return None
+        return [read_reply(stream) for _ in range(length)]
+    raise ConnectionError(f"unexpected reply type {kind!r}")
+
+
+class RespClient:
+    """Connection to a RESP server from a redis:// URL.
+
+    Each thread gets its own connection, opened on first use and dropped
+    after a network error so the next command reconnects.
+    """
+
+    def __init__(self, url, timeout=2.0):
+        parts = urlsplit(url)
+        if parts.scheme != 'redis':
+            raise ValueError(f"unsupported cache URL {url!r}")
+        self.host = parts.hostname or 'localhost'
+        self.port = parts.port or 6379
+        self.password = unquote(parts.password) if parts.password else None
+        self.db = int(parts.path.lstrip('/') or 0)
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        conn = (sock, sock.makefile('rb'))
+        self._local.conn = conn
+        setup = []
+        if self.password:
+            setup.append(('AUTH', self.password))
+        if self.db:
+            setup.append(('SELECT', self.db))
+        if setup:
+            self.pipeline(setup)
+        return conn
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        self._local.conn = None
+        if conn is not None:
+            conn[1].close()
+            conn[0].close()
+
+    def pipeline(self, commands):
+        """Send several commands in one round trip and return their replies"""
+        sock, stream = getattr(self._local, 'conn', None) or self._connect()
+        try:
+            sock.sendall(b"".join(encode_command(*command) for command in commands))
+            replies = [read_reply(stream) for _ in commands]
+        except (OSError, ValueError):
+            self.close()
+            raise
+        for reply in replies:
+            if isinstance(reply, RespError):
+                raise reply
+        return replies
+
+    def execute(self, *args):
+        """Send one command and return its reply"""
+        return self.pipeline([args])[0]
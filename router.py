@@ -0,0 +1,134 @@
+"""
+Query routing: which sources to search for a question, and in what order.
+
+Questions are put in a class with cheap local checks (greeting or chit-chat,
+short known topic, English named entity, long-tail question). Each class
+has a source order, and the router keeps the recent outcome of every
+source per class. A source that almost never returns anything for a
+class is skipped for it; every few queries it is tried again so that it
+can earn its place back.
+"""
+import threading
+from collections import deque
+
+from tamil_text import QUESTION_WORDS, normalize_query, tokenize, topic_words
+
+GREETING = 'greeting'
+KNOWN_TOPIC = 'known_topic'
+ENGLISH_ENTITY = 'english_entity'
+LONG_TAIL = 'long_tail'
+
+# Source order per class, best first; greetings need no retrieval
+ROUTES = {
+    GREETING: (),
+    KNOWN_TOPIC: ('wiki_ta', 'wiki_en', 'google'),
+    ENGLISH_ENTITY: ('wiki_en', 'wiki_ta', 'google'),
+    LONG_TAIL: ('wiki_ta', 'wiki_en', 'google'),
+}
+
+# Words a greeting or small talk is made of
+CHIT_CHAT = {
+    'வணக்கம்', 'நன்றி', 'மிக்க', 'வாழ்த்துகள்', 'வாழ்த்துக்கள்', 'நல்வரவு', 'இனிய',
+    'காலை', 'மாலை', 'இரவு', 'சரி', 'நல்லது', 'நீங்கள்', 'நீ', 'எப்படி',
+    'இருக்கிறீர்கள்', 'இருக்கீங்க', 'நலமா', 'நலம்', 'போய்', 'வருகிறேன்',
+    'hello', 'hi', 'hey', 'thanks', 'thank', 'you', 'ok', 'okay', 'bye',
+    'good', 'morning', 'evening', 'night', 'how', 'are',
+}
+
+# Romanised Tamil filler and question words ("thirukkural pathi
+# sollunga"); a query in Latin letters with one of them is Tamil
+ROMANISED_TAMIL_WORDS = {
+    'pathi', 'patri', 'paththi', 'sollunga', 'sollungal', 'sollu', 'kooravum',
+    'enna', 'yaar', 'yaaru', 'yen', 'eppo', 'enge', 'eppadi', 'ethu',
+    'endral', 'enral', 'enbathu',
+}
+
+# Topic words up to which a query is treated as a bare topic
+KNOWN_TOPIC_WORDS = 3
+
+
+def classify(query, aliases=None):
+    """Put a query in one of the routing classes.
+
+    A query mostly in Latin letters is an English name unless it reads
+    as romanised Tamil: it has a romanised Tamil filler or question
+    word, or `aliases` (an index with lookup_aliases) maps its topic or
+    one of its words to a Tamil title. Romanised Tamil is routed like
+    Tamil.
+    """
+    words = tokenize(query)
+    if words and all(word in CHIT_CHAT for word in words):
+        return GREETING
+    letters = [ch for ch in query if ch.isalpha()]
+    latin = sum(1 for ch in letters if ch.isascii())
+    if letters and latin / len(letters) > 0.5 and not is_romanised_tamil(words, aliases):
+        return ENGLISH_ENTITY
+    topic = normalize_query(query).split()
+    if len(topic) <= KNOWN_TOPIC_WORDS and not QUESTION_WORDS & set(words):
+        return KNOWN_TOPIC
+    return LONG_TAIL
+
+
+def is_romanised_tamil(words, aliases=None):
+    """Whether Latin-script words are Tamil typed in Latin letters"""
+    if ROMANISED_TAMIL_WORDS & set(words):
+        return True
+    if not aliases:
+        return False
+    topic = topic_words(' '.join(words), fallback=False)
+    # The whole topic, then each of its words ("cholar history")
+    spellings = dict.fromkeys([' '.join(topic)] + topic) if topic else []
+    return any(aliases.lookup_aliases(spelling, limit=1) for spelling in spellings)
+
+
+class SourceRouter:
+    """Per-class source success rates, used to skip dead-end lookups.
+
+    A source is skipped for a class once at least `min_samples` of its
+    last `window` lookups exist and fewer than `min_success` of them
+    found anything. Every `explore_every`-th query of the class still
+    uses the full route. `aliases` is passed on to classify().
+    """
+
+    def __init__(self, window=200, min_samples=20, min_success=0.05, explore_every=10, aliases=None):
+        self.window = window
+        self.aliases = aliases
+        self.min_samples = min_samples
+        self.min_success = min_success
+        self.explore_every = explore_every
+        self._outcomes = {}
+        self._queries = {}
+        self._lock = threading.Lock()
+
+    def _skipped(self, query_class, source):
+        outcomes = self._outcomes.get((query_class, source))
+        if not outcomes or len(outcomes) < self.min_samples:
+            return False
+        return sum(outcomes) / len(outcomes) < self.min_success
+
+    def route(self, query):
+        """(query class, sources to use in priority order)"""
+        query_class = classify(query, self.aliases)
+        route = ROUTES[query_class]
+        with self._lock:
+            count = self._queries[query_class] = self._queries.get(query_class, 0) + 1
+            if self.explore_every and count % self.explore_every == 0:
+                return query_class, route
+            sources = tuple(source for source in route if not self._skipped(query_class, source))
+        # Skipping everything saves nothing worth the missing answer
+        return query_class, sources or route
+
+    def record(self, query_class, source, found):
+        """Remember whether a lookup (cached or live) returned anything"""
+        with self._lock:
+            outcomes = self._outcomes.setdefault((query_class, source), deque(maxlen=self.window))
+            outcomes.append(bool(found))
+
+    def stats(self):
+        """{(class, source): (success rate, samples)} over the current windows"""
+        with self._lock:
+            return {
+                key: (sum(outcomes) / len(outcomes), len(outcomes))
+                for key, outcomes in sorted(self._outcomes.items())
+                if outcomes
+            }
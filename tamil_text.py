@@ -0,0 +1,160 @@
+"""
+Text helpers for Tamil queries.
+
+Python's \\w does not match Tamil vowel signs or the virama (they are
+combining marks), so tokenising here works on Unicode categories and
+grapheme clusters instead of regular expression word classes.
+"""
+import re
+import unicodedata
+
+# Words that make a request polite or point at a topic without changing
+# what is being asked ("திருக்குறள் பற்றி சொல்லுங்கள்" -> "திருக்குறள்")
+POLITENESS_WORDS = {
+    'பற்றி', 'பற்றிய', 'குறித்து', 'குறித்த',
+    'சொல்லுங்கள்', 'சொல்லுங்க', 'சொல்', 'சொல்லு', 'சொல்லவும்',
+    'கூறுங்கள்', 'கூறவும்', 'விளக்குங்கள்', 'விளக்கவும்',
+    'தயவுசெய்து', 'தயவு', 'செய்து', 'தகவல்', 'தகவல்கள்', 'விவரம்',
+    'please', 'tell', 'me', 'about',
+    'pathi', 'patri', 'paththi', 'sollunga', 'sollungal', 'sollu', 'kooravum',
+}
+
+# Question words mark a specific question rather than a bare topic
+QUESTION_WORDS = {
+    'என்ன', 'எது', 'எவை', 'யார்', 'ஏன்', 'எப்போது', 'எங்கே', 'எங்கு',
+    'எப்படி', 'எத்தனை', 'எவ்வளவு', 'எந்த',
+    'what', 'who', 'why', 'when', 'where', 'how', 'which',
+    'enna', 'yaar', 'yaaru', 'yen', 'eppo', 'enge', 'eppadi', 'ethu',
+}
+
+# Words that frame a definition question ("திருக்குறள் என்றால் என்ன")
+# and are never part of an article title
+FRAMING_WORDS = {
+    'என்றால்', 'என்பது', 'என்பவர்', 'என்பவர்கள்', 'என்பவை', 'எனப்படுவது',
+    'யாவர்', 'யாவை', 'ஆவார்', 'ஆகும்', 'endral', 'enral', 'enbathu',
+    'is', 'was', 'were', 'are',
+}
+
+# English words too common to narrow a full-text search; unlike the sets
+# above they can be part of a title ("History of the Cholas")
+FUNCTION_WORDS = {
+    'the', 'a', 'an', 'of', 'in', 'on', 'at', 'to', 'for', 'from', 'and', 'or', 'by', 'with',
+    'do', 'does', 'did', 'be', 'been', 'it', 'its', 'this', 'that',
+}
+
+# Invisible characters some keyboards and copied text insert inside words
+ZERO_WIDTH = dict.fromkeys(map(ord, '\u200b\u200c\u200d\u2060\ufeff'))
+
+# Spellings Unicode treats as different but readers do not
+VARIANT_SPELLINGS = {'ஶ்ரீ': 'ஸ்ரீ'}
+
+
+def strip_punctuation(text):
+    """Replace punctuation and symbols with spaces"""
+    return ''.join(' ' if unicodedata.category(ch)[0] in 'PS' else ch for ch in text)
+
+
+def clean(text):
+    """NFC-normalise text, drop zero-width characters and unify variant spellings"""
+    text = unicodedata.normalize('NFC', text).translate(ZERO_WIDTH)
+    for variant, spelling in VARIANT_SPELLINGS.items():
+        text = text.replace(variant, spelling)
+    return text
+
+
+def tokenize(text):
+    """Split text into words, keeping Tamil vowel signs attached"""
+    return strip_punctuation(clean(text)).casefold().split()
+
+
+def normalize_query(text):
+    """Reduce a question to the words that identify its topic"""
+    words = tokenize(text)
+    kept = [word for word in words if word not in POLITENESS_WORDS]
+    # A query made only of filler words keeps them rather than vanishing
+    return ' '.join(kept or words)
+
+
+def topic_words(text, fallback=True):
+    """Words of a question that can be part of an article title.
+
+    A question made only of question and filler words keeps them all,
+    unless fallback is False; then it has no topic words.
+    """
+    words = tokenize(text)
+    skipped = POLITENESS_WORDS | QUESTION_WORDS | FRAMING_WORDS
+    kept = [word for word in words if word not in skipped]
+    return kept or (words if fallback else [])
+
+
+# Case and plural endings with what replaces them, longest first within
+# each group: -அம் nouns take -த்த- before a case ending (சங்கத்தின் ->
+# சங்கம்), words ending in a vowel take -ய- (மதுரையின் -> மதுரை), and
+# otherwise the ending's vowel sign sits on the stem's last consonant
+# (சோழரின் -> சோழர்). A bare final ை or ா is not stripped: too many
+# dictionary forms end in them (மதுரை, கலை, இந்தியா, அம்மா).
+SUFFIXES = [
+    ('த்திற்கு', 'ம்'), ('த்துக்கு', 'ம்'), ('த்துடன்', 'ம்'), ('த்தோடு', 'ம்'),
+    ('த்தின்', 'ம்'), ('த்தில்', 'ம்'), ('த்தால்', 'ம்'), ('த்தை', 'ம்'),
+    ('களுக்கு', ''), ('களுடைய', ''), ('களின்', ''), ('களில்', ''), ('களால்', ''),
+    ('களை', ''), ('கள்', ''),
+    ('யுடைய', ''), ('யின்', ''), ('யில்', ''), ('யால்', ''), ('யை', ''),
+    ('ுக்கு', '்'), ('ிற்கு', '்'), ('ுடைய', '்'), ('ுடன்', '்'), ('ோடு', '்'),
+    ('ின்', '்'), ('ில்', '்'), ('ால்', '்'), ('ும்', '்'),
+]
+
+# Tamil words do not end in these; one there is the sandhi doubling of
+# the next word's first letter (தைப் பொங்கல்)
+SANDHI_CONSONANT = re.compile('(?<=[\u0B80-\u0BFF])[கசதப]்$')
+
+# Stems shorter than this many letters are too ambiguous to look up
+MIN_STEM_LETTERS = 2
+
+
+def stem(word):
+    """Best guess at the dictionary form of an inflected Tamil word"""
+    word = SANDHI_CONSONANT.sub('', word)
+    for suffix, replacement in SUFFIXES:
+        if word.endswith(suffix):
+            candidate = word[:-len(suffix)] + replacement
+            if len(graphemes(candidate)) >= MIN_STEM_LETTERS:
+                return candidate
+    return word
+
+
+def graphemes(text):
+    """Split text into grapheme clusters (a letter plus its combining marks)"""
+    clusters = []
+    for ch in text:
+        if clusters and unicodedata.category(ch).startswith('M'):
+            clusters[-1] += ch
+        else:
+            clusters.append(ch)
+    return clusters
+
+
+def char_ngrams(text, n=3):
+    """Set of grapheme n-grams of a normalised query, padded at the ends"""
+    clusters = [' '] + graphemes(text) + [' ']
+    if len(clusters) <= n:
+        return {''.join(clusters)}
+    return {''.join(clusters[i:i + n]) for i in range(len(clusters) - n + 1)}
+
+
+def similarity(a, b):
+    """Jaccard similarity of two n-gram sets"""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+# Tamil vowel signs, virama and other combining marks (U+0B80-U+0BFF)
+TAMIL_MARKS = ''.join(
+    chr(code) for code in range(0x0B80, 0x0C00)
+    if unicodedata.category(chr(code)).startswith('M')
+)
+
+# SQLite FTS5 tokenizer that keeps Tamil words whole: unicode61 would
+# otherwise split words at every combining mark and strip them as
+# diacritics
+FTS_TOKENIZER = f"unicode61 remove_diacritics 0 tokenchars '{TAMIL_MARKS}'"
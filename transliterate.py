@@ -0,0 +1,164 @@
+"""
+Latin-script Tamil: transliteration and script-independent phonetic keys.
+
+Users often type Tamil names in Latin letters ("thirukkural", "cholar",
+"silappathikaram"), and there is no single romanisation: "l" can be ல,
+ள or ழ, "n" any of ந, ன and ண, "oo" either ஊ or ஓ. transliterate()
+makes one best guess in Tamil script. phonetic_key() instead reduces
+both scripts to the same coarse sound classes (vowel length, doubled
+consonants and those lookalike consonants merged), so "thirukkural" and
+"திருக்குறள்" get the same key and a title index keyed by it matches
+romanised and misspelt input alike.
+"""
+import re
+import unicodedata
+
+VIRAMA = '்'
+
+# -----------------------------
+# Latin to Tamil
+# Latin letter groups, longest first, and their Tamil consonants
+LATIN_CONSONANTS = [
+    ('ksh', 'க்ஷ'), ('ng', 'ங்க'), ('nj', 'ஞ்ச'), ('ch', 'ச'), ('sh', 'ஷ'), ('zh', 'ழ'),
+    ('th', 'த'), ('dh', 'த'), ('kh', 'க'), ('gh', 'க'), ('bh', 'ப'), ('ph', 'ப'),
+    ('k', 'க'), ('g', 'க'), ('q', 'க'), ('c', 'ச'), ('j', 'ஜ'), ('s', 'ச'),
+    ('t', 'ட'), ('d', 'ட'), ('n', 'ன'), ('p', 'ப'), ('b', 'ப'), ('m', 'ம'),
+    ('y', 'ய'), ('r', 'ர'), ('l', 'ல'), ('v', 'வ'), ('w', 'வ'), ('z', 'ழ'),
+    ('h', 'ஹ'), ('f', 'ஃப'), ('x', 'க்ஸ'),
+]
+
+# Latin vowel groups, longest first: (independent letter, vowel sign)
+LATIN_VOWELS = [
+    ('aa', 'ஆ', 'ா'), ('ai', 'ஐ', 'ை'), ('au', 'ஔ', 'ௌ'),
+    ('ee', 'ஈ', 'ீ'), ('ii', 'ஈ', 'ீ'), ('oo', 'ஊ', 'ூ'), ('uu', 'ஊ', 'ூ'),
+    ('ae', 'ஏ', 'ே'), ('oa', 'ஓ', 'ோ'),
+    ('a', 'அ', ''), ('i', 'இ', 'ி'), ('u', 'உ', 'ு'), ('e', 'எ', 'ெ'), ('o', 'ஒ', 'ொ'),
+]
+
+# "n" before these is the nasal of their row rather than ன
+NASAL_BEFORE = {'த': 'ந', 'க': 'ங', 'ச': 'ஞ', 'ஜ': 'ஞ', 'ட': 'ண'}
+
+
+def _match(table, word, i):
+    for entry in table:
+        if word.startswith(entry[0], i):
+            return entry
+    return None
+
+
+def transliterate_word(word):
+    """Best-guess Tamil spelling of one romanised word"""
+    out = []
+    pending = None  # consonant still waiting for its vowel
+    i = 0
+    while i < len(word):
+        vowel = _match(LATIN_VOWELS, word, i)
+        if vowel:
+            latin, letter, sign = vowel
+            out.append(pending + sign if pending else letter)
+            pending = None
+            i += len(latin)
+            continue
+        consonant = _match(LATIN_CONSONANTS, word, i)
+        if not consonant:
+            i += 1
+            continue
+        latin, letter = consonant
+        if pending:
+            out.append(pending + VIRAMA)
+        if not out and pending is None:
+            # Tamil words start with ந and த, hardly ever with ன or ட
+            letter = {'ன': 'ந', 'ட': 'த'}.get(letter, letter)
+        pending = letter
+        i += len(latin)
+        if letter in ('ன', 'ந'):
+            following = _match(LATIN_CONSONANTS, word, i)
+            if following and following[1] in NASAL_BEFORE:
+                pending = NASAL_BEFORE[following[1]]
+    if pending:
+        out.append(pending + VIRAMA)
+    return ''.join(out)
+
+
+def transliterate(text):
+    """Tamil spelling of romanised text, word by word; other text is kept"""
+    return re.sub(r'[A-Za-z]+', lambda m: transliterate_word(m.group(0).lower()), text)
+
+
+def is_latin(text):
+    """Whether the letters of text are mostly Latin"""
+    letters = [ch for ch in text if ch.isalpha()]
+    return bool(letters) and sum(ch.isascii() for ch in letters) / len(letters) > 0.5
+
+
+# -----------------------------
+# Phonetic keys
+# Sound class of each Tamil consonant
+TAMIL_CLASSES = {
+    'க': 'K', 'ங': 'N', 'ச': 'S', 'ஜ': 'S', 'ஞ': 'N', 'ட': 'T', 'ண': 'N',
+    'த': 'T', 'ந': 'N', 'ப': 'P', 'ம': 'M', 'ய': 'Y', 'ர': 'R', 'ல': 'L',
+    'வ': 'V', 'ழ': 'L', 'ள': 'L', 'ற': 'R', 'ன': 'N', 'ஶ': 'S', 'ஷ': 'S',
+    'ஸ': 'S', 'ஹ': 'H',
+}
+
+# Tamil vowels and vowel signs; long and short vowels share a class
+TAMIL_VOWEL_CLASSES = {
+    'அ': 'A', 'ஆ': 'A', 'ா': 'A', 'இ': 'I', 'ஈ': 'I', 'ி': 'I', 'ீ': 'I',
+    'உ': 'U', 'ஊ': 'U', 'ு': 'U', 'ூ': 'U', 'எ': 'E', 'ஏ': 'E', 'ெ': 'E',
+    'ே': 'E', 'ஐ': 'AI', 'ை': 'AI', 'ஒ': 'O', 'ஓ': 'O', 'ொ': 'O', 'ோ': 'O',
+    'ஔ': 'AU', 'ௌ': 'AU',
+}
+
+# Latin groups, longest first, and their sound classes
+LATIN_CLASSES = [
+    ('ksh', 'KS'), ('zh', 'L'), ('ch', 'S'), ('sh', 'S'), ('th', 'T'), ('dh', 'T'),
+    ('kh', 'K'), ('gh', 'K'), ('bh', 'P'), ('ph', 'P'),
+    ('aa', 'A'), ('ai', 'AI'), ('au', 'AU'), ('ee', 'I'), ('ii', 'I'),
+    ('oo', 'U'), ('uu', 'U'), ('ae', 'E'), ('oa', 'O'),
+    ('a', 'A'), ('i', 'I'), ('u', 'U'), ('e', 'E'), ('o', 'O'),
+    ('k', 'K'), ('g', 'K'), ('q', 'K'), ('c', 'S'), ('j', 'S'), ('s', 'S'), ('z', 'L'),
+    ('t', 'T'), ('d', 'T'), ('n', 'N'), ('p', 'P'), ('b', 'P'), ('f', 'P'), ('m', 'M'),
+    ('y', 'Y'), ('r', 'R'), ('l', 'L'), ('v', 'V'), ('w', 'V'), ('h', 'H'), ('x', 'KS'),
+]
+
+
+def _tamil_classes(text):
+    classes = []
+    for i, ch in enumerate(text):
+        if ch in TAMIL_CLASSES:
+            classes.append(TAMIL_CLASSES[ch])
+            following = text[i + 1] if i + 1 < len(text) else ''
+            # A consonant without a vowel sign or virama carries the inherent a
+            if following not in TAMIL_VOWEL_CLASSES and following != VIRAMA:
+                classes.append('A')
+        elif ch in TAMIL_VOWEL_CLASSES:
+            classes.append(TAMIL_VOWEL_CLASSES[ch])
+    return classes
+
+
+def _latin_classes(text):
+    classes = []
+    i = 0
+    while i < len(text):
+        entry = _match(LATIN_CLASSES, text, i)
+        if entry:
+            classes.append(entry[1])
+            i += len(entry[0])
+        else:
+            i += 1
+    return classes
+
+
+def phonetic_key(text):
+    """Script-independent sound key of a title or query (spaces ignored)"""
+    text = unicodedata.normalize('NFC', text).casefold()
+    classes = []
+    for chunk in re.findall(r'[a-z]+|[஀-௿]+', text):
+        chunk_classes = _latin_classes(chunk) if chunk.isascii() else _tamil_classes(chunk)
+        # Tamil spells a word-initial r or l with a leading இ (இராமன், இலங்கை)
+        if chunk_classes[:1] == ['I'] and chunk_classes[1:2] in (['R'], ['L']):
+            chunk_classes = chunk_classes[1:]
+        classes.extend(chunk_classes)
+    key = ''.join(classes)
+    # Doubled consonants and lengthened vowels collapse to one
+    return re.sub(r'(.)\1+', r'\1', key)
@@ -0,0 +1,124 @@
+"""
+Background warming of popular topics and speculative prefetch.
+
+A daemon thread keeps answers to the quick actions and HOT_TOPICS in the
+answer cache, regenerating each one shortly before it expires, so the
+quick-action buttons are answered from cache. Every process starts one,
+but a lock in the shared cache lets only one of them warm per interval.
+After an answer is shown,
+the Tamil Wikipedia pages its article links to (most viewed first) are
+looked up in the background, so a follow-up question about one of them
+skips the live search.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import config
+import pipeline
+from cache import MISSING
+
+logger = logging.getLogger(__name__)
+
+# Shared-cache lock held by the process warming the current interval
+WARM_LOCK = 'warmer:round'
+
+
+def warm_topic(topic):
+    """Make sure a fresh answer to topic is cached; returns True if one was cached"""
+    if not config.ANSWER_CACHE_ENABLED:
+        # Without an answer cache only the retrieval results can be kept warm
+        pipeline.retrieve_sources(topic)
+        return False
+    cache = pipeline.get_answer_cache()
+    expires_at = cache.expires_at(topic)
+    if expires_at is not None and expires_at - time.time() > config.WARM_INTERVAL:
+        return False
+    pipeline.generate_response(topic, bypass_cache=True)
+    # Fallback answers and apologies are not cached, so only a new
+    # expiry means the topic was warmed
+    refreshed = cache.expires_at(topic)
+    return refreshed is not None and refreshed != expires_at
+
+
+def warm_topics(topics):
+    """One warming round over topics; returns how many answers were regenerated"""
+    warmed = 0
+    for topic in topics:
+        try:
+            warmed += warm_topic(topic)
+        except Exception:
+            logger.exception("Warming %r failed", topic)
+    return warmed
+
+
+def claim_round():
+    """Whether this process warms the current interval.
+
+    The lock lives in the retrieval cache's shared tier and expires by
+    itself after WARM_INTERVAL, so the processes of a host (or every
+    replica, with Redis) take turns. Without a shared tier every
+    process warms for itself.
+    """
+    shared = pipeline.get_retrieval_cache().shared
+    return shared is None or shared.try_lock(WARM_LOCK, config.WARM_INTERVAL)
+
+
+@lru_cache(maxsize=None)
+def start_warmer(topics):
+    """Warm topics now and every WARM_INTERVAL seconds; starts once per process"""
+    def run():
+        pipeline.set_error_reporter(logger.warning, this_thread=True)
+        while True:
+            if claim_round():
+                warmed = warm_topics(topics)
+                logger.info("Warmed %d of %d topics", warmed, len(topics))
+            else:
+                logger.debug("Another process is warming this interval")
+            time.sleep(config.WARM_INTERVAL)
+
+    thread = threading.Thread(target=run, name="warmer", daemon=True)
+    thread.start()
+    return thread
+
+
+# -----------------------------
+# Speculative prefetch of linked pages
+@lru_cache(maxsize=None)
+def get_prefetch_pool():
+    """Small pool so prefetching never competes with live retrieval"""
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="prefetch")
+
+
+_prefetched = set()
+_prefetched_lock = threading.Lock()
+
+
+def prefetch_links(title):
+    """Look up the most viewed pages linked from a Tamil Wikipedia article"""
+    cache = pipeline.get_retrieval_cache()
+    try:
+        for linked in pipeline.query_wiki_links('ta', title, config.PREFETCH_LINKS):
+            if cache.get('wiki_ta', linked) is MISSING:
+                pipeline.fetch_source('wiki_ta', linked)
+    except Exception:
+        logger.exception("Prefetching links of %r failed", title)
+
+
+def prefetch_related(query):
+    """Queue a prefetch of the pages linked from the article that answered query"""
+    if not config.PREFETCH_LINKS or pipeline.get_wiki_dump_index():
+        # The local dump index answers lookups without a network round trip
+        return
+    wiki_data = pipeline.get_retrieval_cache().get('wiki_ta', query)
+    if wiki_data is MISSING or not wiki_data:
+        return
+    with _prefetched_lock:
+        if wiki_data['title'] in _prefetched:
+            return
+        if len(_prefetched) >= config.RETRIEVAL_CACHE_SIZE:
+            _prefetched.clear()
+        _prefetched.add(wiki_data['title'])
+    get_prefetch_pool().submit(prefetch_links, wiki_data['title'])
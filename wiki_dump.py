@@ -0,0 +1,294 @@
+"""
+Offline Tamil Wikipedia index built from a pages-articles dump.
+
+    python wiki_dump.py tawiki-latest-pages-articles.xml.bz2 .cache/tawiki.sqlite
+
+The dump is streamed with iterparse and every page element is cleared
+as soon as it has been read, so memory stays bounded whatever the dump
+size. The index keeps the plain-text intro of each article, the redirect
+table and an FTS5 full-text index over titles and intros; point
+WIKI_DUMP_INDEX at the file to answer Tamil Wikipedia lookups from it.
+
+It also keeps an alias table: the phonetic key (see transliterate.py) of
+every title and every redirect, mapped to the article it leads to, so
+that romanised, misspelt and differently inflected spellings of a title
+still find the article. Indexes built before the table existed get it
+with
+
+    python wiki_dump.py --rebuild-aliases .cache/tawiki.sqlite
+"""
+import argparse
+import bz2
+import re
+import sqlite3
+import sys
+import threading
+import xml.etree.ElementTree as ET
+from urllib.parse import quote
+
+from tamil_text import FTS_TOKENIZER, tokenize
+from transliterate import phonetic_key
+
+PAGE_URL = "https://{lang}.wikipedia.org/wiki/{title}"
+
+# Rows written per transaction while ingesting
+BATCH_SIZE = 1000
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS pages (id INTEGER PRIMARY KEY, title TEXT UNIQUE NOT NULL, intro TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS redirects (title TEXT PRIMARY KEY, target TEXT NOT NULL);
+CREATE VIRTUAL TABLE IF NOT EXISTS pages_fts USING fts5(
+    title, intro, content='pages', content_rowid='id', tokenize="{FTS_TOKENIZER}"
+);
+CREATE TABLE IF NOT EXISTS aliases (
+    key TEXT NOT NULL, title TEXT NOT NULL, redirect INTEGER NOT NULL, PRIMARY KEY (key, title)
+) WITHOUT ROWID;
+"""
+
+# Disambiguation suffix of a title: "சோழர் (அரசமரபு)"
+_QUALIFIER = re.compile(r'\s*\([^()]*\)$')
+
+
+# -----------------------------
+# Wikitext to plain text
+_COMMENT = re.compile(r'<!--.*?-->', re.S)
+_REF = re.compile(r'<ref[^>/]*/>|<ref[^>]*>.*?</ref>', re.S | re.I)
+_TEMPLATE = re.compile(r'\{\{[^{}]*\}\}')
+_TABLE = re.compile(r'\{\|.*?\|\}', re.S)
+_TAG = re.compile(r'<[^>]+>')
+_FILE_LINK = re.compile(r'\[\[(?:File|Image|படிமம்|கோப்பு|Category|பகுப்பு):[^\[\]]*(?:\[\[[^\[\]]*\]\][^\[\]]*)*\]\]', re.I)
+_LINK = re.compile(r'\[\[(?:[^\[\]|]*\|)?([^\[\]]*)\]\]')
+_EXTERNAL_LINK = re.compile(r'\[https?://\S+\s*([^\]]*)\]')
+_EMPHASIS = re.compile(r"'{2,}")
+
+
+def wikitext_intro(text):
+    """Plain text of the lead section of an article's wikitext"""
+    lead = re.split(r'\n==', text, maxsplit=1)[0]
+    lead = _COMMENT.sub('', lead)
+    lead = _REF.sub('', lead)
+    # Templates nest, so strip the innermost ones until none are left
+    while True:
+        stripped = _TEMPLATE.sub('', lead)
+        if stripped == lead:
+            break
+        lead = stripped
+    lead = _TABLE.sub('', lead)
+    lead = _FILE_LINK.sub('', lead)
+    lead = _LINK.sub(r'\1', lead)
+    lead = _EXTERNAL_LINK.sub(r'\1', lead)
+    lead = _EMPHASIS.sub('', lead)
+    lead = _TAG.sub('', lead)
+    lines = [re.sub(r'[ \t]+', ' ', line).strip() for line in lead.splitlines()]
+    return '\n'.join(line for line in lines if line)
+
+
+# -----------------------------
+# Dump ingestion
+def iter_pages(stream):
+    """Yield (title, redirect target or None, wikitext) for main namespace pages"""
+    context = ET.iterparse(stream, events=('start', 'end'))
+    _, root = next(context)
+    for event, elem in context:
+        if event != 'end' or elem.tag.rsplit('}', 1)[-1] != 'page':
+            continue
+        fields = {}
+        for child in elem.iter():
+            name = child.tag.rsplit('}', 1)[-1]
+            if name == 'redirect':
+                fields['redirect'] = child.get('title')
+            elif name in ('title', 'ns', 'text') and name not in fields:
+                fields[name] = child.text or ''
+        if fields.get('ns') == '0':
+            yield fields.get('title', ''), fields.get('redirect'), fields.get('text', '')
+        # Drop the parsed page and its reference from the root element
+        root.clear()
+
+
+def build_index(dump_path, db_path, progress=None):
+    """Stream a pages-articles dump into a SQLite index; returns (pages, redirects)"""
+    opener = bz2.open if dump_path.endswith('.bz2') else open
+    conn = sqlite3.connect(db_path)
+    conn.executescript(SCHEMA)
+    pages, redirects = [], []
+    counts = [0, 0]
+
+    def flush():
+        conn.executemany("INSERT OR REPLACE INTO pages (title, intro) VALUES (?, ?)", pages)
+        conn.executemany("INSERT OR REPLACE INTO redirects (title, target) VALUES (?, ?)", redirects)
+        conn.commit()
+        counts[0] += len(pages)
+        counts[1] += len(redirects)
+        pages.clear()
+        redirects.clear()
+        if progress:
+            progress(*counts)
+
+    with opener(dump_path, 'rb') as stream:
+        for title, target, text in iter_pages(stream):
+            if target:
+                redirects.append((title, target))
+            else:
+                intro = wikitext_intro(text)
+                if intro:
+                    pages.append((title, intro))
+            if len(pages) + len(redirects) >= BATCH_SIZE:
+                flush()
+    flush()
+
+    conn.execute("INSERT INTO pages_fts (pages_fts) VALUES ('rebuild')")
+    conn.commit()
+    build_aliases(conn)
+    conn.close()
+    return tuple(counts)
+
+
+def build_aliases(conn):
+    """Fill the alias table from the pages and redirects; returns its row count.
+
+    Every title, the same title without its disambiguation suffix, and
+    every redirect whose chain ends at an article get a row keyed by
+    their phonetic key.
+    """
+    conn.executescript(SCHEMA)
+    titles = {row[0] for row in conn.execute("SELECT title FROM pages")}
+    redirects = dict(conn.execute("SELECT title, target FROM redirects"))
+
+    def resolve(title):
+        for _ in range(5):
+            if title not in redirects:
+                break
+            title = redirects[title].split('#', 1)[0].strip()
+        return title if title in titles else None
+
+    rows = set()
+    for title in titles:
+        for spelling in {title, _QUALIFIER.sub('', title)}:
+            rows.add((phonetic_key(spelling), title, 0))
+    for alias in redirects:
+        target = resolve(alias)
+        if target:
+            rows.add((phonetic_key(alias), target, 1))
+    conn.execute("DELETE FROM aliases")
+    conn.executemany("INSERT OR IGNORE INTO aliases (key, title, redirect) VALUES (?, ?, ?)",
+                     (row for row in rows if row[0]))
+    conn.commit()
+    return conn.execute("SELECT COUNT(*) FROM aliases").fetchone()[0]
+
+
+# -----------------------------
+# Lookups
+class WikiDumpIndex:
+    """Read-only lookups against an index built by build_index.
+
+    query_titles returns pages in the same shape as the MediaWiki API
+    helper in app.py ('title', 'extract', 'fullurl'), so either can serve
+    the Tamil Wikipedia strategies.
+    """
+
+    def __init__(self, db_path, lang='ta'):
+        self.lang = lang
+        self._conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+
+    def _page(self, title):
+        row = self._conn.execute("SELECT title, intro FROM pages WHERE title = ?", (title,)).fetchone()
+        if row is None:
+            return None
+        return {
+            'title': row[0],
+            'extract': row[1],
+            'fullurl': PAGE_URL.format(lang=self.lang, title=quote(row[0].replace(' ', '_')))
+        }
+
+    def _resolve(self, title):
+        """Follow redirects (at most a few hops) to the final title"""
+        title = re.sub(r'[\s_]+', ' ', title).strip()
+        for _ in range(5):
+            row = self._conn.execute("SELECT target FROM redirects WHERE title = ?", (title,)).fetchone()
+            if row is None:
+                break
+            title = row[0].split('#', 1)[0]
+        return title
+
+    def query_titles(self, titles):
+        """Resolve titles locally; returns {requested title: page}"""
+        resolved = {}
+        with self._lock:
+            for title in titles:
+                page = self._page(self._resolve(title))
+                if page:
+                    resolved[title] = page
+        return resolved
+
+    def _match(self, expression, limit):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT pages.title FROM pages_fts JOIN pages ON pages.id = pages_fts.rowid "
+                "WHERE pages_fts MATCH ? ORDER BY bm25(pages_fts) LIMIT ?",
+                (expression, limit)
+            ).fetchall()
+            return [self._page(row[0]) for row in rows]
+
+    def lookup_aliases(self, text, limit=5):
+        """Titles of articles whose title or a redirect sounds like text.
+
+        Article titles come before redirects and shorter titles first.
+        Indexes built without an alias table return nothing.
+        """
+        key = phonetic_key(text)
+        if not key:
+            return []
+        with self._lock:
+            try:
+                rows = self._conn.execute(
+                    "SELECT title FROM aliases WHERE key = ? "
+                    "GROUP BY title ORDER BY MIN(redirect), length(title) LIMIT ?",
+                    (key, limit)
+                ).fetchall()
+            except sqlite3.OperationalError:
+                return []
+        return [row[0] for row in rows]
+
+    def search_titles(self, query, limit=5):
+        """Pages whose title contains every word of the query, best first"""
+        words = [_fts_phrase(word) for word in tokenize(query)]
+        return self._match('title: (' + ' '.join(words) + ')', limit) if words else []
+
+    def search(self, query, limit=5):
+        """Full-text search over titles and intros, best first"""
+        words = [_fts_phrase(word) for word in tokenize(query)]
+        return self._match(' OR '.join(words), limit) if words else []
+
+
+def _fts_phrase(word):
+    """Quote a word as an FTS5 string so it is never read as syntax"""
+    return '"' + word.replace('"', '""') + '"'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build an offline index from a Tamil Wikipedia dump")
+    parser.add_argument("dump", nargs='?', help="pages-articles XML dump (.xml or .xml.bz2)")
+    parser.add_argument("index", nargs='?', help="SQLite file to write")
+    parser.add_argument("--rebuild-aliases", metavar="INDEX",
+                        help="only rebuild the alias table of an existing index")
+    args = parser.parse_args(argv)
+
+    if args.rebuild_aliases:
+        conn = sqlite3.connect(args.rebuild_aliases)
+        aliases = build_aliases(conn)
+        conn.close()
+        print(f"Indexed {aliases} aliases into {args.rebuild_aliases}", file=sys.stderr)
+        return
+    if not args.index:
+        parser.error("the dump and index paths are required")
+
+    def progress(pages, redirects):
+        print(f"\r{pages} pages, {redirects} redirects", end='', file=sys.stderr, flush=True)
+
+    pages, redirects = build_index(args.dump, args.index, progress)
+    print(f"\nIndexed {pages} pages and {redirects} redirects into {args.index}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()